@@ -0,0 +1,24 @@
+"""
+Benchmarks behind the performance numbers quoted in commit messages.
+
+Run one with ``python -m backend.bench.<name> [--help]`` from the repo root.
+Importing this package points the app settings at a throwaway directory
+(database, snapshot, outbox, e-bills) and clears SMTP / Gemini credentials,
+so a benchmark never touches ``data/app.db`` or sends anything. Figures
+depend on the machine; the ones in the history came from a 1-core box.
+"""
+import os
+import tempfile
+
+SCRATCH_DIR = tempfile.mkdtemp(prefix="sba-bench-")
+
+os.environ.update(
+    SQLITE_PATH=os.path.join(SCRATCH_DIR, "app.db"),
+    SNAPSHOT_DIR=os.path.join(SCRATCH_DIR, "snapshot"),
+    OUTBOX_DIR=os.path.join(SCRATCH_DIR, "outbox"),
+    EBILL_DIR=os.path.join(SCRATCH_DIR, "ebills"),
+    SMTP_USERNAME="",
+    SMTP_PASSWORD="",
+    GEMINI_API_KEY="",
+    FAVICON_URL="",
+)
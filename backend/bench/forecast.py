@@ -0,0 +1,94 @@
+"""
+Inventory forecast refresh over a synthetic catalogue.
+
+    python -m backend.bench.forecast [--items 50000] [--orders-per-day 2000]
+
+Every order has ``--lines`` random items and was placed within the forecast
+window, so the GROUP BY sees the full items x days matrix.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from . import SCRATCH_DIR  # noqa: F401  (scratch settings before the app)
+from .. import models
+from ..database import Base, SessionLocal, engine
+from ..settings import settings
+from ..utils_forecast import refresh_inventory_forecast
+
+
+def seed(items: int, orders_per_day: int, lines: int) -> int:
+    rng = random.Random(1)
+    now = datetime.utcnow()
+    days = settings.forecast_window_days
+    with engine.begin() as conn:
+        conn.execute(
+            insert(models.Item),
+            [
+                {"name": f"sku{i}", "price": 10.0, "stock_quantity": rng.randint(0, 500)}
+                for i in range(items)
+            ],
+        )
+        conn.execute(insert(models.Customer), [{"name": "bench", "email": "bench@example.com"}])
+        orders = [
+            {
+                "customer_id": 1,
+                "status": models.OrderStatus.placed,
+                "total_amount": 10.0 * lines,
+                "created_at": now - timedelta(days=d, minutes=rng.randint(0, 1439)),
+            }
+            for d in range(days)
+            for _ in range(orders_per_day)
+        ]
+        conn.execute(insert(models.Order), orders)
+        conn.execute(
+            insert(models.OrderItem),
+            [
+                {
+                    "order_id": order_id,
+                    "item_id": rng.randint(1, items),
+                    "quantity": rng.randint(1, 3),
+                    "price_at_purchase": 10.0,
+                }
+                for order_id in range(1, len(orders) + 1)
+                for _ in range(lines)
+            ],
+        )
+    return len(orders)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m backend.bench.forecast")
+    parser.add_argument("--items", type=int, default=50_000)
+    parser.add_argument("--orders-per-day", type=int, default=2000)
+    parser.add_argument("--lines", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    started = time.perf_counter()
+    orders = seed(args.items, args.orders_per_day, args.lines)
+    print(
+        f"seeded {args.items} items, {orders} orders x {args.lines} lines "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+    timings = []
+    for _ in range(args.repeat):
+        db = SessionLocal()
+        try:
+            started = time.perf_counter()
+            result = refresh_inventory_forecast(db)
+            timings.append(time.perf_counter() - started)
+        finally:
+            db.close()
+    print(
+        f"refresh: best {min(timings):.2f}s, worst {max(timings):.2f}s "
+        f"({result['items']} items, {result['needs_reorder']} to reorder)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Gazetteer load and address lookup over a synthetic India Post directory.
+
+    python -m backend.bench.geocoding [--offices 150000] [--addresses 5000]
+
+Writes a compacted directory of ``--offices`` post offices (about eight per
+PIN, 200 per district, coordinates inside India) to the scratch directory,
+then times ``load_gazetteer`` on it, cold ``geocode`` calls over distinct
+addresses (no PIN, so every call scans for names), the same addresses again
+from the memo (keep ``--addresses`` under ``geocode_cache_size``), and
+``delivery_days`` on addresses with a PIN.
+"""
+import argparse
+import csv
+import gzip
+import os
+import random
+import time
+
+from . import SCRATCH_DIR
+from ..utils_geocoding import DIRECTORY_COLUMNS, delivery_days, geocode, load_gazetteer
+
+STREETS = ["MG Road", "Station Road", "Delhi Road", "Nehru Marg", "Civil Lines", "Gandhi Chowk"]
+
+
+def write_directory(path: str, offices: int) -> tuple[list[str], list[str]]:
+    rng = random.Random(1)
+    pins = [str(rng.randint(110000, 855999)) for _ in range(offices // 8)]
+    districts = [f"District {i} Nagar" for i in range(max(1, offices // 200))]
+    with gzip.open(path, "wt", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(DIRECTORY_COLUMNS)
+        for n in range(offices):
+            writer.writerow([
+                pins[n % len(pins)],
+                districts[n % len(districts)],
+                "Uttar Pradesh",
+                f"{rng.uniform(8.0, 34.0):.4f}",
+                f"{rng.uniform(69.0, 96.0):.4f}",
+            ])
+    return pins, districts
+
+
+def per_call(fn, args: list[str]) -> float:
+    started = time.perf_counter()
+    for arg in args:
+        fn(arg)
+    return (time.perf_counter() - started) / len(args)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m backend.bench.geocoding",
+        description="Time gazetteer loading and address lookups.",
+    )
+    parser.add_argument("--offices", type=int, default=150000)
+    parser.add_argument("--addresses", type=int, default=5000)
+    args = parser.parse_args()
+
+    path = os.path.join(SCRATCH_DIR, "india_post.csv.gz")
+    pins, districts = write_directory(path, args.offices)
+    rng = random.Random(2)
+
+    started = time.perf_counter()
+    gazetteer = load_gazetteer(path)
+    print(f"  load            {time.perf_counter() - started:8.2f} s   ({len(gazetteer.places)} places)")
+
+    named = [
+        f"{n} {rng.choice(STREETS)}, {rng.choice(districts)}, Uttar Pradesh"
+        for n in range(args.addresses)
+    ]
+    with_pin = [f"{n} {rng.choice(STREETS)}, {rng.choice(pins)}" for n in range(args.addresses)]
+    print(f"  geocode cold    {per_call(geocode, named) * 1e6:8.1f} us/address")
+    print(f"  geocode cached  {per_call(geocode, named) * 1e6:8.1f} us/address")
+    print(f"  delivery_days   {per_call(delivery_days, with_pin) * 1e6:8.1f} us/address (PIN)")
+
+
+if __name__ == "__main__":
+    main()
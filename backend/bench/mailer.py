@@ -0,0 +1,160 @@
+"""
+SMTP throughput: one connection per message against the pooled dispatcher.
+
+    python -m backend.bench.mailer [--messages 300] [--pool-size 3] [--plain]
+
+Starts a local aiosmtpd sink that requires STARTTLS and AUTH (like Gmail),
+with a throwaway self-signed certificate made by the ``openssl`` command
+line tool, then sends ``--messages`` emails twice: once with
+``aiosmtplib.send`` per message, as ``utils_email`` does without the
+dispatcher, and once through ``MailDispatcher``. ``--plain`` skips TLS (for
+machines without ``openssl``), which understates the handshake cost.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import ssl
+import subprocess
+import time
+from email.message import EmailMessage
+
+import aiosmtplib
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+
+from . import SCRATCH_DIR
+from ..utils_mailer import MailDispatcher
+
+USERNAME = "bench"
+PASSWORD = "bench-password"
+
+
+class Sink:
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return "250 OK"
+
+
+def _authenticate(server, session, envelope, mechanism, auth_data):
+    ok = auth_data.login == USERNAME.encode() and auth_data.password == PASSWORD.encode()
+    return AuthResult(success=ok)
+
+
+def _server_tls() -> ssl.SSLContext:
+    cert = os.path.join(SCRATCH_DIR, "smtp.pem")
+    key = os.path.join(SCRATCH_DIR, "smtp.key")
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+            "-keyout", key, "-out", cert, "-days", "1", "-subj", "/CN=localhost",
+        ],
+        check=True,
+        capture_output=True,
+    )
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert, key)
+    return context
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _client_tls() -> ssl.SSLContext:
+    # Self-signed sink certificate, as _smtp_kwargs does for the real server
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def _message(i: int) -> EmailMessage:
+    msg = EmailMessage()
+    msg["From"] = "shop@example.com"
+    msg["To"] = f"customer{i}@example.com"
+    msg["Subject"] = f"Order #{i} update"
+    msg.set_content("Your order is on its way.\n" * 20)
+    return msg
+
+
+async def per_message(n: int, kwargs: dict) -> float:
+    started = time.perf_counter()
+    for i in range(n):
+        await aiosmtplib.send(_message(i), **kwargs)
+    return time.perf_counter() - started
+
+
+def pooled(n: int, kwargs: dict, pool_size: int) -> tuple[float, dict]:
+    dispatcher = MailDispatcher(lambda: kwargs, pool_size=pool_size)
+    dispatcher.start()
+    try:
+        started = time.perf_counter()
+        futures = [dispatcher.submit(_message(i)) for i in range(n)]
+        for future in futures:
+            future.result()
+        return time.perf_counter() - started, dispatcher.stats()
+    finally:
+        dispatcher.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m backend.bench.mailer",
+        description="Compare per-message SMTP sends with the pooled dispatcher.",
+    )
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--pool-size", type=int, default=3)
+    parser.add_argument("--plain", action="store_true", help="no STARTTLS")
+    args = parser.parse_args()
+    # aiosmtpd's AUTH handler logs a deprecation warning for every login
+    logging.getLogger("mail.log").setLevel(logging.ERROR)
+
+    sink = Sink()
+    tls = None if args.plain else _server_tls()
+    port = _free_port()
+    controller = Controller(
+        sink,
+        hostname="127.0.0.1",
+        port=port,
+        tls_context=tls,
+        require_starttls=tls is not None,
+        authenticator=_authenticate,
+        auth_required=True,
+        auth_require_tls=tls is not None,
+    )
+    controller.start()
+    try:
+        kwargs = {
+            "hostname": "127.0.0.1",
+            "port": port,
+            "username": USERNAME,
+            "password": PASSWORD,
+            "start_tls": tls is not None,
+            "tls_context": _client_tls() if tls is not None else None,
+            "timeout": 30,
+        }
+        n = args.messages
+        print(f"{n} message(s), {'plain SMTP' if tls is None else 'STARTTLS'} + AUTH")
+
+        elapsed = asyncio.run(per_message(n, kwargs))
+        print(f"  aiosmtplib.send per message: {elapsed:6.2f}s  {n / elapsed:7.1f} msg/s  ({n} connects)")
+
+        elapsed, stats = pooled(n, kwargs, args.pool_size)
+        print(
+            f"  MailDispatcher (pool {args.pool_size}):    {elapsed:6.2f}s  "
+            f"{n / elapsed:7.1f} msg/s  ({stats['connects']} connects, {stats['failed']} failed)"
+        )
+        print(f"  sink received {sink.received}")
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    main()
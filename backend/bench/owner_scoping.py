@@ -0,0 +1,97 @@
+"""
+Per-tenant quarter revenue as the number of tenants grows.
+
+    python -m backend.bench.owner_scoping [--orders-per-owner 200]
+
+Each step adds tenants with ``--orders-per-owner`` orders spread over the
+quarter, then times ``crud.revenue_between`` for one owner and prints the
+query plan, which should search ix_orders_owner_created as a covering index.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select, text
+
+from . import SCRATCH_DIR  # noqa: F401  (scratch settings before the app)
+from .. import crud, models
+from ..database import Base, SessionLocal, engine
+from ..migrations import migrate_add_owner_scoping
+
+START = datetime(2026, 7, 1)
+END = datetime(2026, 10, 1)
+
+
+def grow(db, tenants: int, per_owner: int, rng: random.Random) -> None:
+    have = db.execute(select(func.count(models.Owner.id))).scalar_one()
+    if have >= tenants:
+        return
+    db.execute(
+        insert(models.Owner),
+        [
+            {
+                "name": "bench",
+                "email": f"owner{i}@example.com",
+                "password_hash": "x",
+                "pan_card": f"P{i:09d}",
+                "contact": "9876543210",
+            }
+            for i in range(have, tenants)
+        ],
+    )
+    if have == 0:
+        db.execute(insert(models.Customer), [{"name": "bench", "email": "bench@example.com"}])
+    span = int((END - START).total_seconds() // 60)
+    db.execute(
+        insert(models.Order),
+        [
+            {
+                "owner_id": i + 1,
+                "customer_id": 1,
+                "status": models.OrderStatus.placed,
+                "total_amount": 10.0,
+                "created_at": START + timedelta(minutes=rng.randint(0, span)),
+            }
+            for i in range(have, tenants)
+            for _ in range(per_owner)
+        ],
+    )
+    db.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m backend.bench.owner_scoping")
+    parser.add_argument("--tenants", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--orders-per-owner", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    migrate_add_owner_scoping()
+    rng = random.Random(1)
+    db = SessionLocal()
+    try:
+        for tenants in args.tenants:
+            grow(db, tenants, args.orders_per_owner, rng)
+            orders = db.execute(select(func.count(models.Order.id))).scalar_one()
+            started = time.perf_counter()
+            for _ in range(args.queries):
+                crud.revenue_between(db, START, END, owner_id=5)
+            per_query = (time.perf_counter() - started) / args.queries
+            print(f"{tenants:>6} tenants {orders:>8} orders  {per_query * 1e6:7.0f} us/query")
+        plan = db.execute(
+            text(
+                "EXPLAIN QUERY PLAN SELECT sum(total_amount) FROM orders "
+                "WHERE owner_id = 5 AND created_at >= :s AND created_at < :e "
+                "AND status != 'cancelled'"
+            ),
+            {"s": START, "e": END},
+        ).all()
+        print("plan:", "; ".join(row[-1] for row in plan))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
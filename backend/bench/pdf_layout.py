@@ -0,0 +1,56 @@
+"""
+Render time and size of one e-bill or revenue report, in-process.
+
+    python -m backend.bench.pdf_layout [--renders 200] [--repeat 3]
+
+Times ``--renders`` consecutive renders of each document, best of
+``--repeat``, after one warm-up render that imports reportlab and fills
+the layout fragment cache (as a worker process has done by its second
+invoice). Compare runs across revisions to see what a layout change costs.
+"""
+import argparse
+import time
+
+from . import SCRATCH_DIR  # noqa: F401  (scratch settings before the app)
+from .render_pool import sample_order
+from ..utils_pdf import generate_ebill_pdf, generate_revenue_report_pdf
+
+
+def _report_details(n: int) -> list[tuple[str, float]]:
+    return [(f"Week {i + 1}", 12500.0 + 317.5 * i) for i in range(n)]
+
+
+DOCUMENTS = {
+    "e-bill 8 items": lambda: generate_ebill_pdf(sample_order(1, lines=8)),
+    "e-bill 96 items": lambda: generate_ebill_pdf(sample_order(2, lines=96)),
+    "revenue report": lambda: generate_revenue_report_pdf("Q3 2026", 412345.5, _report_details(13)),
+}
+
+
+def measure(render, renders: int, repeat: int) -> tuple[float, int]:
+    size = len(render())
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(renders):
+            render()
+        best = min(best, (time.perf_counter() - started) / renders)
+    return best, size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m backend.bench.pdf_layout",
+        description="Time e-bill and revenue report rendering.",
+    )
+    parser.add_argument("--renders", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for name, render in DOCUMENTS.items():
+        seconds, size = measure(render, args.renders, args.repeat)
+        print(f"  {name:<16} {seconds * 1000:6.2f} ms  {size:6d} B")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+E-bill throughput: rendering inline against the PDF worker pool.
+
+    python -m backend.bench.render_pool [--ebills 1000] [--workers 1,2,4,8]
+
+Renders ``--ebills`` distinct e-bills (8 lines each) into the scratch
+e-bill store, first in the calling thread as the order routes used to,
+then through ``PdfRenderer`` with each worker count. Pool timings exclude
+spawning the workers (``start``), as the app does that at startup. On one
+core the pool cannot be faster; what the numbers show there is the
+per-invoice IPC cost and that oversubscribing does not collapse
+throughput.
+"""
+import argparse
+import os
+import time
+
+from . import SCRATCH_DIR
+from ..utils_render import PdfRenderer, _render_ebill_to
+
+
+def sample_order(order_id: int, lines: int = 8) -> dict:
+    """An e-bill order dict shaped like ``utils_ebill.ebill_order_dict``'s."""
+    items = [
+        {
+            "id": order_id * 100 + n,
+            "item_id": n + 1,
+            "quantity": 1 + n % 3,
+            "price_at_purchase": 99.0 + 10 * n,
+            "item": {"name": f"Item {n + 1} of the catalogue", "discount_percent": 5.0 * (n % 2)},
+        }
+        for n in range(lines)
+    ]
+    total = sum(i["quantity"] * i["price_at_purchase"] for i in items)
+    return {
+        "id": order_id,
+        "status": "placed",
+        "total_amount": round(total, 2),
+        "created_at": "2026-10-01 10:30:00",
+        "customer": {
+            "name": "Asha Kulkarni",
+            "email": "asha@example.com",
+            "address": "12 MG Road, Pune 411001",
+            "phone": "9876543210",
+        },
+        "items": items,
+        "tax_lines": [
+            {
+                "rate_percent": 10.0,
+                "taxable_amount": i["quantity"] * i["price_at_purchase"],
+                "cgst_amount": i["quantity"] * i["price_at_purchase"] * 0.05,
+                "sgst_amount": i["quantity"] * i["price_at_purchase"] * 0.05,
+            }
+            for i in items
+        ],
+    }
+
+
+def _targets(run: str, n: int) -> list[tuple[dict, str]]:
+    out = os.path.join(SCRATCH_DIR, "ebills", run)
+    return [(sample_order(i + 1), os.path.join(out, f"{i + 1}.pdf")) for i in range(n)]
+
+
+def inline(n: int) -> float:
+    targets = _targets("inline", n)
+    started = time.perf_counter()
+    for order, path in targets:
+        _render_ebill_to(order, path)
+    return time.perf_counter() - started
+
+
+def pooled(n: int, workers: int) -> float:
+    renderer = PdfRenderer(workers=workers, max_queue=64)
+    renderer.start()
+    try:
+        targets = _targets(f"pool{workers}", n)
+        started = time.perf_counter()
+        futures = [renderer.submit_ebill(order, path) for order, path in targets]
+        for future in futures:
+            future.result()
+        return time.perf_counter() - started
+    finally:
+        renderer.shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m backend.bench.render_pool",
+        description="Compare inline e-bill rendering with the worker pool.",
+    )
+    parser.add_argument("--ebills", type=int, default=1000)
+    parser.add_argument("--workers", default="1,2,4,8")
+    args = parser.parse_args()
+    n = args.ebills
+
+    print(f"{n} e-bills, {os.cpu_count()} core(s)")
+    elapsed = inline(n)
+    print(f"  inline in the calling thread  {n / elapsed:6.0f}/s")
+    for workers in (int(w) for w in args.workers.split(",")):
+        elapsed = pooled(n, workers)
+        print(f"  pool workers={workers:<2}               {n / elapsed:6.0f}/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,32 @@
-from sqlalchemy.orm import Session, selectinload
-from sqlalchemy import select, func
+from sqlalchemy.orm import Session, aliased, selectinload
+from sqlalchemy import and_, bindparam, or_, select, func
 from datetime import datetime
+from typing import Iterator
 from . import models, schemas
+from .settings import settings
+from .utils_cache import bump_generation, read_generation, report_cache
+from .utils_events import stage as stage_event
+
+
+def _scoped(q, column, owner_id: int | None):
+    """Restrict ``q`` to one tenant; ``None`` means platform-wide."""
+    if owner_id is None:
+        return q
+    return q.where(column == owner_id)
 
 
 def create_or_get_customer(
-    db: Session, data: schemas.CustomerCreate
+    db: Session, data: schemas.CustomerCreate, owner_id: int | None = None
 ) -> models.Customer:
+    owner_match = (
+        models.Customer.owner_id.is_(None)
+        if owner_id is None
+        else models.Customer.owner_id == owner_id
+    )
     existing = db.execute(
-        select(models.Customer).where(models.Customer.email == data.email)
+        select(models.Customer)
+        .where(owner_match, models.Customer.email == data.email)
+        .limit(1)
     ).scalar_one_or_none()
     if existing:
         # Update basic fields if changed
@@ -19,6 +37,7 @@ def create_or_get_customer(
         db.flush()
         return existing
     customer = models.Customer(
+        owner_id=owner_id,
         name=data.name,
         email=data.email,
         address=data.address,
@@ -29,17 +48,22 @@ def create_or_get_customer(
     return customer
 
 
-def create_item(db: Session, data: schemas.ItemCreate) -> models.Item:
-    item = models.Item(**data.model_dump())
+def create_item(
+    db: Session, data: schemas.ItemCreate, owner_id: int | None = None
+) -> models.Item:
+    item = models.Item(**data.model_dump(), owner_id=owner_id)
     db.add(item)
     db.flush()
     return item
 
 
 def update_item(
-    db: Session, item_id: int, data: schemas.ItemUpdate
+    db: Session,
+    item_id: int,
+    data: schemas.ItemUpdate,
+    owner_id: int | None = None,
 ) -> models.Item | None:
-    item = db.get(models.Item, item_id)
+    item = get_item(db, item_id, owner_id)
     if not item:
         return None
     for k, v in data.model_dump(exclude_unset=True).items():
@@ -49,26 +73,49 @@ def update_item(
     return item
 
 
-def list_items(db: Session) -> list[models.Item]:
-    return list(
-        db.execute(select(models.Item).order_by(models.Item.name)).scalars()
-    )
+def list_items(db: Session, owner_id: int | None = None) -> list[models.Item]:
+    q = _scoped(select(models.Item), models.Item.owner_id, owner_id)
+    return list(db.execute(q.order_by(models.Item.name)).scalars())
+
 
+def get_item(
+    db: Session, item_id: int, owner_id: int | None = None
+) -> models.Item | None:
+    item = db.get(models.Item, item_id)
+    if item and owner_id is not None and item.owner_id != owner_id:
+        return None
+    return item
 
-def get_item(db: Session, item_id: int) -> models.Item | None:
-    return db.get(models.Item, item_id)
 
+def place_order(
+    db: Session, data: schemas.OrderCreate, owner_id: int | None = None
+) -> models.Order:
+    items = {
+        item.id: item
+        for item in db.execute(
+            select(models.Item).where(
+                models.Item.id.in_([oi.item_id for oi in data.items])
+            )
+        ).scalars()
+    }
+    # The order belongs to the shop whose items are being bought
+    owners = {item.owner_id for item in items.values()}
+    if len(owners) > 1 or (owner_id is not None and owners - {owner_id}):
+        raise ValueError("Invalid item in order")
+    if owner_id is None and owners:
+        owner_id = owners.pop()
 
-def place_order(db: Session, data: schemas.OrderCreate) -> models.Order:
-    customer = create_or_get_customer(db, data.customer)
+    customer = create_or_get_customer(db, data.customer, owner_id)
     order = models.Order(
-        customer_id=customer.id, status=models.OrderStatus.placed
+        owner_id=owner_id,
+        customer_id=customer.id,
+        status=models.OrderStatus.placed,
     )
     db.add(order)
     db.flush()
     total = 0.0
     for oi in data.items:
-        item = db.get(models.Item, oi.item_id)
+        item = items.get(oi.item_id)
         if not item or not item.is_active:
             raise ValueError("Invalid item in order")
         if item.stock_quantity < oi.quantity:
@@ -78,56 +125,335 @@ def place_order(db: Session, data: schemas.OrderCreate) -> models.Order:
         # reduce stock
         item.stock_quantity -= oi.quantity
         db.add(item)
-        db.flush()
-        db.add(
-            models.OrderItem(
-                order_id=order.id,
-                item_id=item.id,
-                quantity=oi.quantity,
-                price_at_purchase=price,
-            )
+        order_item = models.OrderItem(
+            order_id=order.id,
+            item_id=item.id,
+            quantity=oi.quantity,
+            price_at_purchase=price,
         )
+        db.add(order_item)
+        db.flush()
+        db.add(_tax_line(order, order_item.id, price * oi.quantity))
     order.total_amount = round(total, 2)
     db.add(order)
     db.flush()
     db.refresh(order)
+    stage_event(db, "order.created", order)
     return order
 
 
-def update_order_status(
-    db: Session, order_id: int, status: models.OrderStatus
+def _tax_line(
+    order: models.Order,
+    order_item_id: int,
+    taxable: float,
+    rate: float | None = None,
+    kind: str = "sale",
+) -> models.TaxLine:
+    """
+    Ledger row for one order line; CGST and SGST split the rate evenly.
+    Dated at the order's creation, like revenue (see ``revenue_between``).
+    """
+    rate = settings.total_tax_rate_percent if rate is None else rate
+    taxable = round(taxable, 2)
+    half = round(taxable * rate / 200.0, 2)
+    return models.TaxLine(
+        order_id=order.id,
+        order_item_id=order_item_id,
+        owner_id=order.owner_id,
+        kind=kind,
+        taxable_amount=taxable,
+        rate_percent=rate,
+        cgst_amount=half,
+        sgst_amount=half,
+        tax_amount=round(half * 2, 2),
+        created_at=order.created_at,
+    )
+
+
+def _post_tax_status_change(db: Session, order: models.Order) -> None:
+    """
+    Keep the ledger net of an order in line with its status: cancelling
+    adds reversal rows, un-cancelling re-posts the original sale lines.
+    Both are dated at the order's creation, so the period whose revenue
+    loses a cancelled order also loses its tax.
+    """
+    lines = list(
+        db.execute(
+            select(models.TaxLine)
+            .where(models.TaxLine.order_id == order.id)
+            .order_by(models.TaxLine.id)
+        ).scalars()
+    )
+    if not lines:
+        return
+    net_taxable = round(sum(line.taxable_amount for line in lines), 2)
+    cancelled = order.status == models.OrderStatus.cancelled
+    if cancelled and net_taxable != 0:
+        sign, kind = -1, "reversal"
+    elif not cancelled and net_taxable == 0:
+        sign, kind = 1, "sale"
+    else:
+        return
+    originals = {}
+    for line in lines:
+        if line.kind == "sale":
+            originals.setdefault(line.order_item_id, line)
+    for line in originals.values():
+        db.add(
+            _tax_line(
+                order,
+                line.order_item_id,
+                sign * line.taxable_amount,
+                line.rate_percent,
+                kind,
+            )
+        )
+
+
+def order_tax_lines(db: Session, order_id: int) -> list[models.TaxLine]:
+    """The sale line of each order item, as printed on the e-bill."""
+    lines: dict[int, models.TaxLine] = {}
+    for line in db.execute(
+        select(models.TaxLine)
+        .where(
+            models.TaxLine.order_id == order_id,
+            models.TaxLine.kind == "sale",
+        )
+        .order_by(models.TaxLine.id)
+    ).scalars():
+        lines.setdefault(line.order_item_id, line)
+    return list(lines.values())
+
+
+def tax_lines_for_orders(
+    db: Session, order_ids: list[int]
+) -> dict[int, list[models.TaxLine]]:
+    """``order_tax_lines`` for many orders in one query."""
+    by_order: dict[int, dict[int, models.TaxLine]] = {i: {} for i in order_ids}
+    for line in db.execute(
+        select(models.TaxLine)
+        .where(
+            models.TaxLine.order_id.in_(order_ids),
+            models.TaxLine.kind == "sale",
+        )
+        .order_by(models.TaxLine.id)
+    ).scalars():
+        by_order[line.order_id].setdefault(line.order_item_id, line)
+    return {i: list(lines.values()) for i, lines in by_order.items()}
+
+
+def get_order(
+    db: Session, order_id: int, owner_id: int | None = None
 ) -> models.Order | None:
     order = db.get(models.Order, order_id)
+    if order and owner_id is not None and order.owner_id != owner_id:
+        return None
+    return order
+
+
+def update_order_status(
+    db: Session,
+    order_id: int,
+    status: models.OrderStatus,
+    owner_id: int | None = None,
+) -> models.Order | None:
+    order = get_order(db, order_id, owner_id)
     if not order:
         return None
+    was_cancelled = order.status == models.OrderStatus.cancelled
     order.status = status
     db.add(order)
+    _post_tax_status_change(db, order)
+    if was_cancelled != (status == models.OrderStatus.cancelled):
+        # Revenue and tax of past periods change: every worker's report
+        # cache is dropped once this commits
+        bump_generation(db)
     db.flush()
     db.refresh(order)
+    stage_event(db, "order.status", order)
     return order
 
 
 def revenue_between(
-    db: Session, start_dt: datetime, end_dt: datetime
+    db: Session,
+    start_dt: datetime,
+    end_dt: datetime,
+    owner_id: int | None = None,
 ) -> float:
+    """
+    Revenue of orders placed in ``[start_dt, end_dt)``; a cancelled order
+    drops out of the period it was placed in.
+    """
     q = select(func.coalesce(func.sum(models.Order.total_amount), 0.0)).where(
         models.Order.created_at >= start_dt,
         models.Order.created_at < end_dt,
         models.Order.status != models.OrderStatus.cancelled,
     )
+    q = _scoped(q, models.Order.owner_id, owner_id)
     return float(db.execute(q).scalar_one() or 0.0)
 
 
-def orders_between(
+def iter_order_ids_between(
+    db: Session,
+    start_dt: datetime,
+    end_dt: datetime,
+    owner_id: int | None = None,
+    batch_size: int = 200,
+) -> Iterator[list[int]]:
+    """
+    Ids of orders placed in ``[start_dt, end_dt)``, oldest first, in batches.
+    Each batch is its own keyset query, read in full before it is yielded,
+    so no cursor (and no SQLite read lock) stays open while the caller
+    works through a batch.
+    """
+    after: tuple[datetime, int] | None = None
+    while True:
+        q = (
+            select(models.Order.id, models.Order.created_at)
+            .where(
+                models.Order.created_at >= start_dt,
+                models.Order.created_at < end_dt,
+            )
+            .order_by(models.Order.created_at, models.Order.id)
+            .limit(batch_size)
+        )
+        if after is not None:
+            q = q.where(
+                or_(
+                    models.Order.created_at > after[0],
+                    and_(models.Order.created_at == after[0], models.Order.id > after[1]),
+                )
+            )
+        q = _scoped(q, models.Order.owner_id, owner_id)
+        rows = db.execute(q).all()
+        if not rows:
+            return
+        after = (rows[-1].created_at, rows[-1].id)
+        yield [row.id for row in rows]
+        if len(rows) < batch_size:
+            return
+
+
+def revenue_by_owner(
     db: Session, start_dt: datetime, end_dt: datetime
+) -> dict[int | None, float]:
+    """Revenue of every tenant in one grouped scan of the owner index."""
+    q = (
+        select(
+            models.Order.owner_id,
+            func.coalesce(func.sum(models.Order.total_amount), 0.0),
+        )
+        .where(
+            models.Order.created_at >= start_dt,
+            models.Order.created_at < end_dt,
+            models.Order.status != models.OrderStatus.cancelled,
+        )
+        .group_by(models.Order.owner_id)
+    )
+    return {owner_id: float(total or 0.0) for owner_id, total in db.execute(q)}
+
+
+def cached_revenue_between(
+    db: Session,
+    start_dt: datetime,
+    end_dt: datetime,
+    owner_id: int | None = None,
+) -> float:
+    """``revenue_between`` through the shared report cache."""
+    return report_cache.get_or_compute(
+        ("revenue", owner_id, start_dt, end_dt),
+        start_dt,
+        end_dt,
+        lambda: revenue_between(db, start_dt, end_dt, owner_id),
+        generation=read_generation(db),
+    )
+
+
+def tax_between(
+    db: Session,
+    start_dt: datetime,
+    end_dt: datetime,
+    owner_id: int | None = None,
+) -> dict[str, float]:
+    """Indexed sums of the tax ledger over a period."""
+    q = select(
+        func.coalesce(func.sum(models.TaxLine.taxable_amount), 0.0),
+        func.coalesce(func.sum(models.TaxLine.cgst_amount), 0.0),
+        func.coalesce(func.sum(models.TaxLine.sgst_amount), 0.0),
+        func.coalesce(func.sum(models.TaxLine.tax_amount), 0.0),
+    ).where(
+        models.TaxLine.created_at >= start_dt,
+        models.TaxLine.created_at < end_dt,
+    )
+    q = _scoped(q, models.TaxLine.owner_id, owner_id)
+    taxable, cgst, sgst, tax = db.execute(q).one()
+    return {
+        "taxable": round(float(taxable), 2),
+        "cgst": round(float(cgst), 2),
+        "sgst": round(float(sgst), 2),
+        "tax": round(float(tax), 2),
+    }
+
+
+def tax_by_owner(
+    db: Session, start_dt: datetime, end_dt: datetime
+) -> dict[int | None, dict[str, float]]:
+    """``tax_between`` for every tenant in one grouped query."""
+    q = (
+        select(
+            models.TaxLine.owner_id,
+            func.sum(models.TaxLine.taxable_amount),
+            func.sum(models.TaxLine.cgst_amount),
+            func.sum(models.TaxLine.sgst_amount),
+            func.sum(models.TaxLine.tax_amount),
+        )
+        .where(
+            models.TaxLine.created_at >= start_dt,
+            models.TaxLine.created_at < end_dt,
+        )
+        .group_by(models.TaxLine.owner_id)
+    )
+    return {
+        owner_id: {
+            "taxable": round(float(taxable or 0.0), 2),
+            "cgst": round(float(cgst or 0.0), 2),
+            "sgst": round(float(sgst or 0.0), 2),
+            "tax": round(float(tax or 0.0), 2),
+        }
+        for owner_id, taxable, cgst, sgst, tax in db.execute(q)
+    }
+
+
+def cached_tax_between(
+    db: Session,
+    start_dt: datetime,
+    end_dt: datetime,
+    owner_id: int | None = None,
+) -> dict[str, float]:
+    """``tax_between`` through the shared report cache."""
+    return report_cache.get_or_compute(
+        ("tax", owner_id, start_dt, end_dt),
+        start_dt,
+        end_dt,
+        lambda: tax_between(db, start_dt, end_dt, owner_id),
+        generation=read_generation(db),
+    )
+
+
+def orders_between(
+    db: Session,
+    start_dt: datetime,
+    end_dt: datetime,
+    owner_id: int | None = None,
 ) -> list[models.Order]:
     q = select(models.Order).where(
         models.Order.created_at >= start_dt, models.Order.created_at < end_dt
     )
+    q = _scoped(q, models.Order.owner_id, owner_id)
     return list(db.execute(q).scalars())
 
 
-def list_orders(db: Session) -> list[models.Order]:
+def list_orders(db: Session, owner_id: int | None = None) -> list[models.Order]:
     q = (
         select(models.Order)
         .options(
@@ -138,10 +464,13 @@ def list_orders(db: Session) -> list[models.Order]:
         )
         .order_by(models.Order.created_at.desc())
     )
+    q = _scoped(q, models.Order.owner_id, owner_id)
     return list(db.execute(q).scalars())
 
 
-def get_order_with_details(db: Session, order_id: int) -> models.Order | None:
+def get_order_with_details(
+    db: Session, order_id: int, owner_id: int | None = None
+) -> models.Order | None:
     q = (
         select(models.Order)
         .options(
@@ -152,4 +481,85 @@ def get_order_with_details(db: Session, order_id: int) -> models.Order | None:
         )
         .where(models.Order.id == order_id)
     )
+    q = _scoped(q, models.Order.owner_id, owner_id)
     return db.execute(q).scalar_one_or_none()
+
+
+def get_orders_with_details(
+    db: Session, order_ids: list[int], owner_id: int | None = None
+) -> list[models.Order]:
+    q = (
+        select(models.Order)
+        .options(
+            selectinload(models.Order.customer),
+            selectinload(models.Order.items).selectinload(
+                models.OrderItem.item
+            ),
+        )
+        .where(models.Order.id.in_(order_ids))
+        .order_by(models.Order.id)
+    )
+    q = _scoped(q, models.Order.owner_id, owner_id)
+    return list(db.execute(q).scalars())
+
+
+def tracking_id_taken(
+    db: Session, tracking_id: str, except_order_id: int | None = None
+) -> bool:
+    q = select(models.Order.id).where(models.Order.tracking_id == tracking_id)
+    if except_order_id is not None:
+        q = q.where(models.Order.id != except_order_id)
+    return db.execute(q.limit(1)).first() is not None
+
+
+def _tracking_by_code_query():
+    Order, Event = models.Order, models.TrackingEvent
+    latest = aliased(Event)
+    latest_id = (
+        select(latest.id)
+        .where(latest.order_id == Order.id)
+        .order_by(latest.ts.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    return (
+        select(
+            Order.id,
+            Order.tracking_id,
+            Order.status,
+            Order.expected_delivery_date,
+            Order.tracking_url,
+            Event.lat,
+            Event.lng,
+            Event.ts,
+        )
+        .outerjoin(Event, Event.id == latest_id)
+        .where(Order.tracking_id == bindparam("tracking_id"))
+        .order_by(Order.id.desc())
+        .limit(2)
+    )
+
+
+# Built once: constructing the aliased subquery costs more than running it
+_TRACKING_BY_CODE = _tracking_by_code_query()
+
+
+def get_tracking_by_code(db: Session, tracking_id: str) -> list:
+    """
+    Order id, status, ETA, link and latest ping for a tracking code, in one
+    query over ix_orders_tracking_id and ix_tracking_events_order_ts. Two
+    rows mean the code is shared by several orders (a database whose index
+    is not unique yet, see ``migrate_add_tracking_id_index``).
+    """
+    return db.execute(_TRACKING_BY_CODE, {"tracking_id": tracking_id}).all()
+
+
+def existing_order_ids(
+    db: Session, order_ids: set[int], owner_id: int | None = None
+) -> set[int]:
+    """The subset of ``order_ids`` that exist (and belong to ``owner_id``)."""
+    if not order_ids:
+        return set()
+    q = select(models.Order.id).where(models.Order.id.in_(order_ids))
+    q = _scoped(q, models.Order.owner_id, owner_id)
+    return set(db.execute(q).scalars())
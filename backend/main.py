@@ -1,4 +1,6 @@
-from fastapi import FastAPI, Response
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, HTTPException, Response
 import httpx
 from fastapi.middleware.cors import CORSMiddleware
 from .database import Base, engine
@@ -9,15 +11,62 @@ from .routers_reports import router as reports_router
 from .routers_tracking import router as tracking_router
 from .routers_catalogue import router as catalogue_router
 from .routers_taxes import router as taxes_router
-from .routers_auth import router as auth_router
-from .migrations import migrate_add_expected_delivery_date
+from .routers_auth import router as auth_router, require_admin
+from .routers_events import router as events_router
+from .utils_scheduler import scheduler, register_default_jobs, job_stats
+from .utils_email import mailer
+from .utils_templates import load_templates
+from .utils_geocoding import load_gazetteer
+from .utils_gemini import gemini_client
+from .utils_render import pdf_renderer
+from .utils_tracking import ping_buffer
+from .utils_events import event_hub
+from .utils_outbox import outbox_worker, outbox_stats, list_dead_letters, requeue_dead_letter
+from .migrations import (
+    migrate_add_expected_delivery_date,
+    migrate_add_owner_scoping,
+    migrate_backfill_tax_lines,
+    migrate_add_outbox_attachment_path,
+    migrate_add_outbox_order_columns,
+    migrate_add_tracking_id_index,
+)
 
 
 def create_app() -> FastAPI:
     Base.metadata.create_all(bind=engine)
     # Run migrations
     migrate_add_expected_delivery_date()
-    app = FastAPI(title=settings.app_name)
+    migrate_add_owner_scoping()
+    migrate_backfill_tax_lines()
+    migrate_add_outbox_attachment_path()
+    migrate_add_outbox_order_columns()
+    migrate_add_tracking_id_index()
+    load_templates()
+    load_gazetteer()
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        if settings.scheduler_enabled:
+            register_default_jobs(scheduler)
+            scheduler.start()
+        if settings.mail_dispatcher_enabled:
+            mailer.start()
+        if settings.outbox_enabled:
+            outbox_worker.start()
+        gemini_client.start()
+        ping_buffer.start()
+        event_hub.start()
+        await asyncio.to_thread(pdf_renderer.start)
+        yield
+        await event_hub.stop()
+        await asyncio.to_thread(pdf_renderer.shutdown)
+        await asyncio.to_thread(ping_buffer.stop)
+        await gemini_client.stop()
+        await outbox_worker.stop()
+        await scheduler.stop()
+        await asyncio.to_thread(mailer.stop)
+
+    app = FastAPI(title=settings.app_name, lifespan=lifespan)
     app.add_middleware(
         CORSMiddleware,
         allow_origins=settings.cors_origins,
@@ -33,11 +82,43 @@ def create_app() -> FastAPI:
     app.include_router(tracking_router)
     app.include_router(catalogue_router)
     app.include_router(taxes_router)
+    app.include_router(events_router)
 
     @app.get("/")
     def root():
         return {"ok": True, "service": settings.app_name}
 
+    @app.get("/scheduler/jobs", dependencies=[Depends(require_admin)])
+    def scheduler_jobs():
+        return job_stats()
+
+    @app.get("/mail/stats", dependencies=[Depends(require_admin)])
+    def mail_stats():
+        return mailer.stats()
+
+    @app.get("/gemini/stats", dependencies=[Depends(require_admin)])
+    def gemini_stats():
+        return gemini_client.stats()
+
+    @app.get("/pdf/stats", dependencies=[Depends(require_admin)])
+    def pdf_stats():
+        return pdf_renderer.stats()
+
+    @app.get("/mail/outbox", dependencies=[Depends(require_admin)])
+    def mail_outbox():
+        return outbox_stats()
+
+    @app.get("/mail/outbox/dead", dependencies=[Depends(require_admin)])
+    def mail_outbox_dead(limit: int = 100):
+        return list_dead_letters(limit)
+
+    @app.post("/mail/outbox/{outbox_id}/retry", dependencies=[Depends(require_admin)])
+    def mail_outbox_retry(outbox_id: int):
+        if not requeue_dead_letter(outbox_id):
+            raise HTTPException(status_code=404, detail="Dead-lettered email not found")
+        outbox_worker.wake()
+        return {"requeued": outbox_id}
+
     # Prevent browser 404 requests for favicon
     @app.get("/favicon.ico")
     async def favicon():
@@ -1,8 +1,19 @@
 """
 Database migration utilities.
+
+Rows created before owner scoping have no owner. On the upgrade they go to
+the only registered owner; with several owners (or none yet) they stay
+visible to the admin token only until claimed::
+
+    python -m backend.migrations assign-legacy-rows --owner N
 """
+import argparse
+from datetime import datetime
+
 from sqlalchemy import text, inspect
 from .database import engine
+from .settings import settings
+from .utils_cache import bump_generation
 
 
 def migrate_add_expected_delivery_date():
@@ -25,3 +36,325 @@ def migrate_add_expected_delivery_date():
         else:
             print("✓ expected_delivery_date column already exists")
 
+
+def migrate_add_outbox_attachment_path():
+    """Add attachment_path to email_outbox (attachments referenced by path)."""
+    inspector = inspect(engine)
+    columns = [col["name"] for col in inspector.get_columns("email_outbox")]
+    if "attachment_path" in columns:
+        return
+    with engine.connect() as conn:
+        try:
+            conn.execute(
+                text("ALTER TABLE email_outbox ADD COLUMN attachment_path VARCHAR(500)")
+            )
+            conn.commit()
+            print("✓ Added attachment_path column to email_outbox table")
+        except Exception as e:
+            print(f"⚠ Migration error: {e}")
+            conn.rollback()
+
+
+def migrate_add_outbox_order_columns():
+    """Add order_id/order_status to email_outbox (order emails composed at send time)."""
+    inspector = inspect(engine)
+    columns = [col["name"] for col in inspector.get_columns("email_outbox")]
+    added = {
+        "order_id": "INTEGER",
+        "order_status": "VARCHAR(20)",
+    }
+    with engine.connect() as conn:
+        for name, sql_type in added.items():
+            if name in columns:
+                continue
+            try:
+                conn.execute(text(f"ALTER TABLE email_outbox ADD COLUMN {name} {sql_type}"))
+                conn.commit()
+                print(f"✓ Added {name} column to email_outbox table")
+            except Exception as e:
+                print(f"⚠ Migration error: {e}")
+                conn.rollback()
+
+
+def migrate_add_tracking_id_index():
+    """
+    Unique index on orders.tracking_id. While some tracking ids are shared
+    by several orders it is created non-unique (lookups are still indexed)
+    and made unique on a later start once they have been fixed.
+    """
+    inspector = inspect(engine)
+    index = next(
+        (ix for ix in inspector.get_indexes("orders") if ix["name"] == "ix_orders_tracking_id"),
+        None,
+    )
+    if index is not None and index["unique"]:
+        return
+    with engine.connect() as conn:
+        try:
+            shared = conn.execute(
+                text(
+                    "SELECT COUNT(*) FROM (SELECT tracking_id FROM orders "
+                    "WHERE tracking_id IS NOT NULL "
+                    "GROUP BY tracking_id HAVING COUNT(*) > 1)"
+                )
+            ).scalar_one()
+            if shared:
+                conn.execute(
+                    text("CREATE INDEX IF NOT EXISTS ix_orders_tracking_id ON orders (tracking_id)")
+                )
+                print(
+                    f"⚠ {shared} tracking id(s) are shared by several orders; "
+                    "ix_orders_tracking_id stays non-unique until they are reassigned"
+                )
+            else:
+                conn.execute(text("DROP INDEX IF EXISTS ix_orders_tracking_id"))
+                conn.execute(
+                    text("CREATE UNIQUE INDEX ix_orders_tracking_id ON orders (tracking_id)")
+                )
+                print("✓ Added unique index on orders.tracking_id")
+            conn.commit()
+        except Exception as e:
+            print(f"⚠ Migration error: {e}")
+            conn.rollback()
+
+
+# (index name, table, columns, unique)
+OWNER_SCOPED_INDEXES = [
+    ("ix_items_owner_name", "items", "owner_id, name", True),
+    ("ix_customers_owner_email", "customers", "owner_id, email", False),
+    (
+        "ix_orders_owner_created",
+        "orders",
+        "owner_id, created_at, status, total_amount",
+        False,
+    ),
+    ("ix_order_items_order_id", "order_items", "order_id", False),
+]
+
+
+def migrate_add_owner_scoping():
+    """
+    Add owner_id to items/customers/orders and owner-prefixed indexes. When
+    the columns are added, the existing rows go to the sole registered
+    owner, if there is exactly one.
+    """
+    inspector = inspect(engine)
+    upgraded = False
+    with engine.connect() as conn:
+        try:
+            for table in LEGACY_TABLES:
+                columns = [col["name"] for col in inspector.get_columns(table)]
+                if "owner_id" not in columns:
+                    upgraded = True
+                    conn.execute(
+                        text(
+                            f"ALTER TABLE {table} ADD COLUMN owner_id INTEGER "
+                            "REFERENCES owners(id)"
+                        )
+                    )
+                    print(f"✓ Added owner_id column to {table} table")
+            # Item names were globally unique; they are now unique per owner
+            conn.execute(text("DROP INDEX IF EXISTS ix_items_name"))
+            for name, table, columns, unique in OWNER_SCOPED_INDEXES:
+                conn.execute(
+                    text(
+                        f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS "
+                        f"{name} ON {table} ({columns})"
+                    )
+                )
+            conn.commit()
+        except Exception as e:
+            print(f"⚠ Migration error: {e}")
+            conn.rollback()
+            return
+    if upgraded:
+        _assign_legacy_rows_to_sole_owner()
+    migrate_add_platform_item_name_index()
+
+
+# Tables that gained owner_id with owner scoping
+LEGACY_TABLES = ("items", "customers", "orders")
+
+
+def _legacy_row_count(conn) -> int:
+    return sum(
+        conn.execute(text(f"SELECT COUNT(*) FROM {table} WHERE owner_id IS NULL")).scalar_one()
+        for table in LEGACY_TABLES
+    )
+
+
+def _assign_legacy_rows_to_sole_owner():
+    with engine.connect() as conn:
+        legacy = _legacy_row_count(conn)
+        owners = conn.execute(text("SELECT id FROM owners ORDER BY id LIMIT 2")).scalars().all()
+    if not legacy:
+        return
+    if len(owners) != 1:
+        print(
+            f"⚠ {legacy} item/customer/order row(s) have no owner and are only visible "
+            "to ADMIN_TOKEN; assign them with "
+            "`python -m backend.migrations assign-legacy-rows --owner <owner id>`"
+        )
+        return
+    try:
+        assigned = assign_legacy_rows(owners[0])
+    except Exception as e:
+        print(f"⚠ Migration error: {e}")
+        return
+    print(f"✓ Assigned rows without an owner to owner {owners[0]}: {assigned}")
+
+
+def assign_legacy_rows(owner_id: int) -> dict[str, int]:
+    """
+    Give ``owner_id`` every item, customer and order without an owner (rows
+    from before owner scoping, and items the admin token created), with the
+    tax lines of those orders, in one transaction. Returns the rows updated
+    per table.
+    """
+    with engine.begin() as conn:
+        if conn.execute(text("SELECT 1 FROM owners WHERE id = :owner"), {"owner": owner_id}).first() is None:
+            raise ValueError(f"No owner with id {owner_id}")
+        assigned = {}
+        for table in ("items", "customers"):
+            assigned[table] = conn.execute(
+                text(f"UPDATE {table} SET owner_id = :owner WHERE owner_id IS NULL"),
+                {"owner": owner_id},
+            ).rowcount
+        # updated_at moves so the analytics snapshot picks up the new owner
+        assigned["orders"] = conn.execute(
+            text("UPDATE orders SET owner_id = :owner, updated_at = :now WHERE owner_id IS NULL"),
+            {"owner": owner_id, "now": datetime.utcnow()},
+        ).rowcount
+        assigned["tax_lines"] = conn.execute(
+            text(
+                "UPDATE tax_lines SET owner_id = :owner WHERE owner_id IS NULL "
+                "AND order_id IN (SELECT id FROM orders WHERE owner_id = :owner)"
+            ),
+            {"owner": owner_id},
+        ).rowcount
+        if any(assigned.values()):
+            # Cached reports of every worker were computed without these rows
+            bump_generation(conn)
+    return assigned
+
+
+def migrate_add_platform_item_name_index():
+    """
+    Unique names among items without an owner: NULL owner ids are distinct
+    in ix_items_owner_name, so it does not cover them.
+    """
+    with engine.connect() as conn:
+        shared = conn.execute(
+            text(
+                "SELECT COUNT(*) FROM (SELECT name FROM items WHERE owner_id IS NULL "
+                "GROUP BY name HAVING COUNT(*) > 1)"
+            )
+        ).scalar_one()
+        if shared:
+            print(
+                f"⚠ {shared} item name(s) are used by several items without an owner; "
+                "ix_items_platform_name is not created until they are renamed"
+            )
+            return
+        try:
+            conn.execute(
+                text(
+                    "CREATE UNIQUE INDEX IF NOT EXISTS ix_items_platform_name "
+                    "ON items (name) WHERE owner_id IS NULL"
+                )
+            )
+            conn.commit()
+        except Exception as e:
+            print(f"⚠ Migration error: {e}")
+            conn.rollback()
+
+
+def migrate_backfill_tax_lines():
+    """
+    Post tax lines for orders placed before the tax ledger existed: a sale
+    line per order item, plus a reversal for orders that are cancelled, so
+    un-cancelling one later re-posts its sale like for any other order.
+    """
+    rate = settings.total_tax_rate_percent
+    with engine.connect() as conn:
+        try:
+            sales = conn.execute(
+                text(
+                    """
+                    INSERT INTO tax_lines (
+                        order_id, order_item_id, owner_id, kind, taxable_amount,
+                        rate_percent, cgst_amount, sgst_amount, tax_amount, created_at
+                    )
+                    SELECT o.id, oi.id, o.owner_id, 'sale',
+                           ROUND(oi.price_at_purchase * oi.quantity, 2), :rate,
+                           ROUND(oi.price_at_purchase * oi.quantity * :rate / 200.0, 2),
+                           ROUND(oi.price_at_purchase * oi.quantity * :rate / 200.0, 2),
+                           2 * ROUND(oi.price_at_purchase * oi.quantity * :rate / 200.0, 2),
+                           o.created_at
+                    FROM order_items oi
+                    JOIN orders o ON o.id = oi.order_id
+                    WHERE NOT EXISTS (SELECT 1 FROM tax_lines t WHERE t.order_id = o.id)
+                    """
+                ),
+                {"rate": rate},
+            )
+            # Orders cancelled through the app always have a reversal; a
+            # cancelled order without one only has the sale posted above
+            reversals = conn.execute(
+                text(
+                    """
+                    INSERT INTO tax_lines (
+                        order_id, order_item_id, owner_id, kind, taxable_amount,
+                        rate_percent, cgst_amount, sgst_amount, tax_amount, created_at
+                    )
+                    SELECT t.order_id, t.order_item_id, t.owner_id, 'reversal',
+                           -t.taxable_amount, t.rate_percent, -t.cgst_amount,
+                           -t.sgst_amount, -t.tax_amount, t.created_at
+                    FROM tax_lines t
+                    JOIN orders o ON o.id = t.order_id
+                    WHERE o.status = 'cancelled'
+                      AND t.kind = 'sale'
+                      AND NOT EXISTS (
+                          SELECT 1 FROM tax_lines r
+                          WHERE r.order_id = o.id AND r.kind = 'reversal'
+                      )
+                    """
+                )
+            )
+            # Reversals and re-posted sales used to be dated when the
+            # status changed; date them like the order, as revenue is
+            redated = conn.execute(
+                text(
+                    """
+                    UPDATE tax_lines
+                    SET created_at = (SELECT o.created_at FROM orders o WHERE o.id = tax_lines.order_id)
+                    WHERE created_at != (SELECT o.created_at FROM orders o WHERE o.id = tax_lines.order_id)
+                    """
+                )
+            )
+            conn.commit()
+            if sales.rowcount:
+                print(f"✓ Backfilled {sales.rowcount} tax line(s) at {rate:g}%")
+            if reversals.rowcount:
+                print(f"✓ Backfilled {reversals.rowcount} reversal(s) of cancelled orders")
+            if redated.rowcount:
+                print(f"✓ Dated {redated.rowcount} tax line(s) at their order's creation")
+        except Exception as e:
+            print(f"⚠ Migration error: {e}")
+            conn.rollback()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python -m backend.migrations",
+        description="One-off data maintenance.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    claim = commands.add_parser(
+        "assign-legacy-rows",
+        help="give an owner the items, customers and orders that have none",
+    )
+    claim.add_argument("--owner", type=int, required=True, help="owner id")
+    args = parser.parse_args()
+
+    print(assign_legacy_rows(args.owner))
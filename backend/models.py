@@ -9,6 +9,9 @@ from sqlalchemy import (
     ForeignKey,
     Enum as SAEnum,
     Boolean,
+    Index,
+    UniqueConstraint,
+    text,
 )
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from .database import Base
@@ -24,8 +27,23 @@ class OrderStatus(str, Enum):
 
 class Item(Base):
     __tablename__ = "items"
+    __table_args__ = (
+        # Item names are unique per shop, not across the platform
+        Index("ix_items_owner_name", "owner_id", "name", unique=True),
+        # NULLs are distinct in a unique index, so platform items (no
+        # owner) need their own
+        Index(
+            "ix_items_platform_name",
+            "name",
+            unique=True,
+            sqlite_where=text("owner_id IS NULL"),
+        ),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
-    name: Mapped[str] = mapped_column(String(200), unique=True, index=True)
+    owner_id: Mapped[int | None] = mapped_column(
+        ForeignKey("owners.id"), default=None
+    )
+    name: Mapped[str] = mapped_column(String(200))
     description: Mapped[str | None] = mapped_column(Text, default=None)
     price: Mapped[float] = mapped_column(Float, nullable=False)
     discount_percent: Mapped[float] = mapped_column(Float, default=0.0)
@@ -46,7 +64,13 @@ class Item(Base):
 
 class Customer(Base):
     __tablename__ = "customers"
+    __table_args__ = (
+        Index("ix_customers_owner_email", "owner_id", "email"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    owner_id: Mapped[int | None] = mapped_column(
+        ForeignKey("owners.id"), default=None
+    )
     name: Mapped[str] = mapped_column(String(200))
     email: Mapped[str] = mapped_column(String(320), index=True)
     address: Mapped[str | None] = mapped_column(Text, default=None)
@@ -62,7 +86,22 @@ class Customer(Base):
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        # Covers per-tenant revenue sums without touching the table rows
+        Index(
+            "ix_orders_owner_created",
+            "owner_id",
+            "created_at",
+            "status",
+            "total_amount",
+        ),
+        # Public lookups by tracking code (carrier AWB number)
+        Index("ix_orders_tracking_id", "tracking_id", unique=True),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    owner_id: Mapped[int | None] = mapped_column(
+        ForeignKey("owners.id"), default=None
+    )
     customer_id: Mapped[int] = mapped_column(ForeignKey("customers.id"))
     status: Mapped[OrderStatus] = mapped_column(
         SAEnum(OrderStatus), default=OrderStatus.placed
@@ -90,7 +129,7 @@ class Order(Base):
 class OrderItem(Base):
     __tablename__ = "order_items"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    order_id: Mapped[int] = mapped_column(ForeignKey("orders.id"))
+    order_id: Mapped[int] = mapped_column(ForeignKey("orders.id"), index=True)
     item_id: Mapped[int] = mapped_column(ForeignKey("items.id"))
     quantity: Mapped[int] = mapped_column(Integer, default=1)
     price_at_purchase: Mapped[float] = mapped_column(Float, default=0.0)
@@ -120,3 +159,216 @@ class Owner(Base):
     updated_at: Mapped[datetime] = mapped_column(
         DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
     )
+
+
+class CustomerScore(Base):
+    __tablename__ = "customer_scores"
+    customer_id: Mapped[int] = mapped_column(
+        ForeignKey("customers.id"), primary_key=True
+    )
+    last_order_at: Mapped[datetime] = mapped_column(DateTime)
+    first_order_at: Mapped[datetime] = mapped_column(DateTime)
+    frequency: Mapped[int] = mapped_column(Integer, default=0)
+    monetary: Mapped[float] = mapped_column(Float, default=0.0)
+    recency_score: Mapped[int] = mapped_column(Integer, default=1)
+    frequency_score: Mapped[int] = mapped_column(Integer, default=1)
+    monetary_score: Mapped[int] = mapped_column(Integer, default=1)
+    segment: Mapped[str] = mapped_column(String(3), index=True)
+    ltv: Mapped[float] = mapped_column(Float, default=0.0)
+    computed_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, index=True
+    )
+
+    customer: Mapped[Customer] = relationship("Customer")
+
+
+class InventoryForecast(Base):
+    __tablename__ = "inventory_forecasts"
+    item_id: Mapped[int] = mapped_column(
+        ForeignKey("items.id"), primary_key=True
+    )
+    stock_quantity: Mapped[int] = mapped_column(Integer, default=0)
+    velocity_7d: Mapped[float] = mapped_column(Float, default=0.0)
+    velocity_window: Mapped[float] = mapped_column(Float, default=0.0)
+    daily_std: Mapped[float] = mapped_column(Float, default=0.0)
+    days_of_cover: Mapped[float | None] = mapped_column(Float, default=None)
+    reorder_point: Mapped[int] = mapped_column(Integer, default=0)
+    needs_reorder: Mapped[bool] = mapped_column(Boolean, default=False, index=True)
+    computed_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow
+    )
+
+
+class SentAlert(Base):
+    """Ledger of tax alerts; one row per owner, quarter and alert kind."""
+    __tablename__ = "sent_alerts"
+    __table_args__ = (
+        UniqueConstraint(
+            "owner_id", "quarter", "alert_kind", name="uq_sent_alerts_key"
+        ),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    owner_id: Mapped[int] = mapped_column(ForeignKey("owners.id"))
+    quarter: Mapped[str] = mapped_column(String(10))
+    alert_kind: Mapped[str] = mapped_column(String(20))
+    run_id: Mapped[str] = mapped_column(String(32))
+    sent_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow
+    )
+
+
+class JobLease(Base):
+    """Schedule and cross-worker lease of one periodic job."""
+    __tablename__ = "job_leases"
+    name: Mapped[str] = mapped_column(String(100), primary_key=True)
+    next_run_at: Mapped[datetime] = mapped_column(DateTime)
+    holder: Mapped[str | None] = mapped_column(String(200), default=None)
+    lease_until: Mapped[datetime | None] = mapped_column(DateTime, default=None)
+    last_started_at: Mapped[datetime | None] = mapped_column(DateTime, default=None)
+    last_finished_at: Mapped[datetime | None] = mapped_column(DateTime, default=None)
+    last_duration_ms: Mapped[float | None] = mapped_column(Float, default=None)
+    last_error: Mapped[str | None] = mapped_column(Text, default=None)
+    run_count: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class CacheGeneration(Base):
+    """
+    Shared version of an in-process cache; writers bump it in the
+    transaction that changes cached data, readers drop entries of an older
+    generation.
+    """
+    __tablename__ = "cache_generations"
+    name: Mapped[str] = mapped_column(String(100), primary_key=True)
+    generation: Mapped[int] = mapped_column(Integer, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class BackfillCheckpoint(Base):
+    """Progress of a resumable backfill: orders up to ``last_id`` are done."""
+    __tablename__ = "backfill_checkpoints"
+    name: Mapped[str] = mapped_column(String(100), primary_key=True)
+    last_id: Mapped[int] = mapped_column(Integer, default=0)
+    total: Mapped[int] = mapped_column(Integer, default=0)
+    processed: Mapped[int] = mapped_column(Integer, default=0)
+    updated: Mapped[int] = mapped_column(Integer, default=0)
+    started_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, default=None)
+    last_error: Mapped[str | None] = mapped_column(Text, default=None)
+
+
+class TrackingEvent(Base):
+    """GPS ping from a delivery rider's phone."""
+    __tablename__ = "tracking_events"
+    __table_args__ = (
+        Index("ix_tracking_events_order_ts", "order_id", "ts"),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    order_id: Mapped[int] = mapped_column(ForeignKey("orders.id"))
+    lat: Mapped[float] = mapped_column(Float)
+    lng: Mapped[float] = mapped_column(Float)
+    ts: Mapped[datetime] = mapped_column(DateTime)
+    received_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class TaxLine(Base):
+    """
+    Tax captured per order line at purchase time. Cancellations add
+    reversal rows with negated amounts, so period sums stay additive.
+    Every row is dated at the order's creation, the date revenue reports
+    use, so a cancelled order drops out of the same period in both.
+    """
+    __tablename__ = "tax_lines"
+    __table_args__ = (
+        # Covers per-tenant period sums of the ledger
+        Index(
+            "ix_tax_lines_owner_created",
+            "owner_id",
+            "created_at",
+            "taxable_amount",
+            "tax_amount",
+            "cgst_amount",
+            "sgst_amount",
+        ),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    order_id: Mapped[int] = mapped_column(ForeignKey("orders.id"), index=True)
+    order_item_id: Mapped[int] = mapped_column(ForeignKey("order_items.id"))
+    owner_id: Mapped[int | None] = mapped_column(
+        ForeignKey("owners.id"), default=None
+    )
+    kind: Mapped[str] = mapped_column(String(20), default="sale")  # sale|reversal
+    taxable_amount: Mapped[float] = mapped_column(Float, default=0.0)
+    rate_percent: Mapped[float] = mapped_column(Float, default=0.0)
+    cgst_amount: Mapped[float] = mapped_column(Float, default=0.0)
+    sgst_amount: Mapped[float] = mapped_column(Float, default=0.0)
+    tax_amount: Mapped[float] = mapped_column(Float, default=0.0)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow
+    )
+
+
+class EmailOutbox(Base):
+    """
+    Durable email queue. Rows are written in the same transaction as the
+    change they announce and drained by the outbox worker; attachments are
+    referenced by path or by content digest in the outbox directory, not
+    stored inline. Rows with an ``order_id`` are order status emails whose
+    body and e-bill are composed when they are sent.
+    """
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        # The worker's claim scans due rows by status and time
+        Index("ix_email_outbox_due", "status", "next_attempt_at"),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    to_email: Mapped[str] = mapped_column(String(200))
+    subject: Mapped[str] = mapped_column(String(500))
+    body_html: Mapped[str] = mapped_column(Text)
+    body_text: Mapped[str | None] = mapped_column(Text, default=None)
+    attachment_digest: Mapped[str | None] = mapped_column(String(64), default=None)
+    attachment_path: Mapped[str | None] = mapped_column(String(500), default=None)
+    attachment_filename: Mapped[str | None] = mapped_column(String(200), default=None)
+    # Order status emails: body and e-bill are composed at send time
+    order_id: Mapped[int | None] = mapped_column(Integer, default=None)
+    order_status: Mapped[str | None] = mapped_column(String(20), default=None)
+    status: Mapped[str] = mapped_column(String(20), default="pending")  # pending|sending|sent|dead
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    claim_id: Mapped[str | None] = mapped_column(String(32), default=None)
+    claimed_until: Mapped[datetime | None] = mapped_column(DateTime, default=None)
+    last_error: Mapped[str | None] = mapped_column(Text, default=None)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    sent_at: Mapped[datetime | None] = mapped_column(DateTime, default=None)
+
+
+class OwnerEvent(Base):
+    """Owner-facing event waiting to be summarized in a notification digest."""
+    __tablename__ = "owner_events"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    owner_id: Mapped[int | None] = mapped_column(ForeignKey("owners.id"), default=None)
+    to_email: Mapped[str] = mapped_column(String(200))
+    kind: Mapped[str] = mapped_column(String(50))  # new_order|out_of_stock|order_cancelled
+    summary: Mapped[str] = mapped_column(String(500))
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    digested_at: Mapped[datetime | None] = mapped_column(
+        DateTime, default=None, index=True
+    )
+
+
+class EmailCopyTemplate(Base):
+    """Generated order-email copy with ``[[field]]`` placeholders, cached per key."""
+    __tablename__ = "email_copy_templates"
+    __table_args__ = (
+        UniqueConstraint(
+            "status", "tone", "locale", "version", name="uq_email_copy_templates_key"
+        ),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    status: Mapped[str] = mapped_column(String(20))
+    tone: Mapped[str] = mapped_column(String(100))
+    locale: Mapped[str] = mapped_column(String(20))
+    version: Mapped[int] = mapped_column(Integer)
+    body: Mapped[str] = mapped_column(Text)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    expires_at: Mapped[datetime] = mapped_column(DateTime)
@@ -1,3 +1,5 @@
+import hmac
+
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
@@ -5,9 +7,11 @@ from sqlalchemy import select
 from .database import get_db
 from . import models, schemas
 from .utils_auth import hash_password, verify_password, create_access_token, decode_access_token
+from .settings import settings
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 
 def get_current_owner(
@@ -37,6 +41,64 @@ def get_current_owner(
     return owner
 
 
+def is_admin_token(token: str) -> bool:
+    """Whether ``token`` is the configured platform admin token."""
+    return bool(settings.admin_token) and hmac.compare_digest(
+        token.encode(), settings.admin_token.encode()
+    )
+
+
+def _not_authenticated() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Not authenticated",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def get_optional_owner(
+    credentials: HTTPAuthorizationCredentials | None = Depends(optional_security),
+    db: Session = Depends(get_db),
+) -> models.Owner | None:
+    """
+    Owner whose bearer token was sent, for endpoints that also serve
+    anonymous callers (storefront checkout). A token that is sent must
+    still be valid.
+    """
+    if credentials is None or is_admin_token(credentials.credentials):
+        return None
+    return get_current_owner(credentials, db)
+
+
+def get_owner_scope(
+    credentials: HTTPAuthorizationCredentials | None = Depends(optional_security),
+    db: Session = Depends(get_db),
+) -> int | None:
+    """
+    Tenant id to scope queries by. An owner token scopes to that owner;
+    only the admin token gives platform-wide access (``None``). Requests
+    without a token are rejected.
+    """
+    if credentials is None:
+        raise _not_authenticated()
+    if is_admin_token(credentials.credentials):
+        return None
+    return get_current_owner(credentials, db).id
+
+
+def require_admin(
+    credentials: HTTPAuthorizationCredentials | None = Depends(optional_security),
+) -> None:
+    """Platform maintenance endpoints: the admin token is required."""
+    if credentials is None:
+        raise _not_authenticated()
+    if not is_admin_token(credentials.credentials):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin token required",
+        )
+
+
 @router.post("/register", response_model=schemas.TokenResponse)
 def register_owner(payload: schemas.OwnerRegister, db: Session = Depends(get_db)):
     """Register a new owner/businessman."""
@@ -8,6 +8,6 @@ router = APIRouter(prefix="/catalogue", tags=["catalogue"])
 
 
 @router.get("/", response_model=list[schemas.ItemOut])
-def list_catalogue(db: Session = Depends(get_db)):
-    return crud.list_items(db)
-
+def list_catalogue(owner_id: int | None = None, db: Session = Depends(get_db)):
+    """Public catalogue; ``owner_id`` selects one shop."""
+    return crud.list_items(db, owner_id)
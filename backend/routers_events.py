@@ -0,0 +1,65 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials
+from starlette.concurrency import run_in_threadpool
+from . import crud
+from .database import SessionLocal
+from .routers_auth import get_owner_scope, optional_security, require_admin
+from .utils_events import HubFull, event_hub
+
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+
+def _scope(credentials: HTTPAuthorizationCredentials | None, order_id: int | None) -> int | None:
+    # Own short session: a stream can stay open for hours and must not hold
+    # a pooled connection the way a get_db dependency would
+    db = SessionLocal()
+    try:
+        owner_id = get_owner_scope(credentials, db)
+        if order_id is not None and crud.get_order(db, order_id, owner_id) is None:
+            raise HTTPException(status_code=404, detail="Order not found")
+        return owner_id
+    finally:
+        db.close()
+
+
+@router.get("")
+async def stream_events(
+    order_id: int | None = None,
+    since: str | None = None,
+    access_token: str | None = None,
+    last_event_id: str | None = Header(None),
+    credentials: HTTPAuthorizationCredentials | None = Depends(optional_security),
+):
+    """
+    Server-sent events with order and tracking deltas (``order.created``,
+    ``order.status``, ``tracking.assigned``). ``order_id`` follows one of
+    the caller's orders. A token is required: the bearer header, or
+    ``access_token`` for EventSource clients, which cannot send headers.
+    An owner token scopes the stream to that owner; the admin token sees
+    every owner. Reconnects resume after ``Last-Event-ID`` (or ``since``);
+    a ``reset`` event means the client has to reload instead.
+
+    The hub lives in the worker process: with several workers a stream
+    only carries the writes its own worker made, and event ids are only
+    valid against the worker (and process start) that issued them, so a
+    reconnect that lands elsewhere gets a ``reset``.
+    """
+    if credentials is None and access_token:
+        credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=access_token)
+    owner_id = await run_in_threadpool(_scope, credentials, order_id)
+    try:
+        frames = event_hub.stream(owner_id, order_id, last_event_id or since)
+    except HubFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    return StreamingResponse(
+        frames,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/stats", dependencies=[Depends(require_admin)])
+def events_stats():
+    return event_hub.stats()
@@ -1,132 +1,105 @@
-from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+import secrets
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from .database import get_db
 from . import crud, schemas, models
-from .utils_email import send_email, send_email_with_pdf
-from .utils_gemini import generate_order_status_email
-from .utils_geocoding import parse_address_for_coords, calculate_expected_delivery
-from .utils_pdf import generate_ebill_pdf
+from .utils_outbox import outbox_worker
+from .utils_digest import notify_owner
+from .utils_geocoding import parse_address_for_coords, delivery_days
+from .utils_ebill import ebill_order_dict, ebill_filename, get_or_render_ebill, render_ebills_bulk
+from .utils_order_email import enqueue_order_email, items_summary
+from .utils_render import RenderQueueFull
+from .utils_templates import render
+from .utils_tracking import tracking_cache
+from .routers_auth import get_optional_owner, get_owner_scope
 from .settings import settings
 
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 
 
+def _owner_email(db: Session, order: models.Order) -> str:
+    """Shop owner to notify about an order (platform owner for legacy orders)."""
+    if order.owner_id is not None:
+        owner = db.get(models.Owner, order.owner_id)
+        if owner:
+            return owner.email
+    return settings.owner_email or settings.email_from
+
+
 @router.get("/", response_model=list[schemas.OrderOut])
-def list_orders(db: Session = Depends(get_db)):
-    return crud.list_orders(db)
+def list_orders(
+    owner_id: int | None = Depends(get_owner_scope),
+    db: Session = Depends(get_db),
+):
+    return crud.list_orders(db, owner_id)
 
 
 @router.post("/", response_model=schemas.OrderOut)
 def place_order(
     payload: schemas.OrderCreate,
-    background_tasks: BackgroundTasks,
+    owner: models.Owner | None = Depends(get_optional_owner),
     db: Session = Depends(get_db),
 ):
+    # Located before the transaction starts: nothing below the first write
+    # should keep SQLite's write lock for longer than the inserts take
+    address = payload.customer.address
+    lat, lng = parse_address_for_coords(address)
+    days = delivery_days(address)
+
+    # Storefront checkout is anonymous; an owner token limits the cart to
+    # that owner's items
     try:
-        order = crud.place_order(db, payload)
-        db.commit()
+        order = crud.place_order(db, payload, owner.id if owner else None)
+        db.flush()
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
 
     order = crud.get_order_with_details(db, order.id) or order
 
-    # Auto-assign tracking ID (same as order ID)
-    order.tracking_id = str(order.id)
+    # Auto-assign a tracking code: public lookups by code show the rider's
+    # position, so it must not be guessable the way the order id is
+    order.tracking_id = secrets.token_urlsafe(12)
     
-    # Auto-parse lat/lng from customer address
-    lat, lng = parse_address_for_coords(order.customer.address)
     if lat and lng:
         order.tracking_url = f"https://www.google.com/maps?q={lat},{lng}"
     
-    # Calculate expected delivery date (max 5 days)
-    delivery_date, delivery_str = calculate_expected_delivery(
-        order.created_at, order.customer.address
-    )
-    order.expected_delivery_date = delivery_date
+    # Expected delivery by distance (max 5 days)
+    order.expected_delivery_date = order.created_at + timedelta(days=days)
+    delivery_str = order.expected_delivery_date.strftime("%d %b %Y, %I:%M %p")
     
     db.add(order)
-    db.commit()
-    db.refresh(order)
+    db.flush()
 
-    # Prepare items summary for email
-    items_summary = ", ".join(
-        [
-            f"{oi.item.name if oi.item else f'Item {oi.item_id}'} (×{oi.quantity})"
-            for oi in order.items
-        ]
-    )
+    summary = items_summary(order)
 
-    # Generate e-bill PDF
-    order_dict = {
-        "id": order.id,
-        "status": order.status.value if hasattr(order.status, "value") else str(order.status),
-        "total_amount": order.total_amount,
-        "created_at": order.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-        "customer": {
-            "name": order.customer.name,
-            "email": order.customer.email,
-            "address": order.customer.address,
-            "phone": order.customer.phone,
-        },
-        "items": [
-            {
-                "id": oi.id,
-                "item_id": oi.item_id,
-                "quantity": oi.quantity,
-                "price_at_purchase": oi.price_at_purchase,
-                "item": {
-                    "name": oi.item.name if oi.item else f"Item {oi.item_id}",
-                    "discount_percent": oi.item.discount_percent if oi.item else 0.0,
-                },
-            }
-            for oi in order.items
-        ],
-    }
-    pdf_data = generate_ebill_pdf(order_dict)
+    # Email to customer with e-bill PDF for PLACED status; the outbox worker
+    # renders the e-bill and writes the copy once the order is committed
+    print(f"📧 Queueing PLACED status email to customer: {order.customer.email}")
+    enqueue_order_email(db, order)
 
-    # Email to customer with e-bill PDF for PLACED status
-    customer_email = order.customer.email
-    cust_subj = f"Order #{order.id} Confirmation - E-Bill Attached"
-    cust_body_html = generate_order_status_email(
-        customer_name=order.customer.name,
+    # Email to owner
+    owner_subject = f"New Order #{order.id} placed"
+    owner_body = render(
+        "order_placed_owner.html",
         order_id=order.id,
-        status="placed",
-        status_change_time=order.created_at,
-        expected_delivery=delivery_str,
+        customer_name=order.customer.name,
+        customer_email=order.customer.email,
         total_amount=order.total_amount,
-        items_summary=items_summary,
-    )
-    print(f"📧 Sending PLACED status email to customer: {customer_email}")
-    background_tasks.add_task(
-        send_email_with_pdf,
-        cust_subj,
-        customer_email,
-        f"<div style='font-family: Arial, sans-serif; padding: 20px;'>{cust_body_html.replace(chr(10), '<br>')}</div>",
-        pdf_data,
-        f"Order_{order.id}_E-Bill.pdf",
+        items_summary=summary,
+        expected_delivery=delivery_str,
+        address=order.customer.address,
     )
-
-    # Email to owner
-    owner_subject = f"New Order #{order.id} placed"
-    owner_body = f"""
-    <div style='font-family: Arial, sans-serif; padding: 20px;'>
-        <h2>New Order Received</h2>
-        <p><strong>Order ID:</strong> #{order.id}</p>
-        <p><strong>Customer:</strong> {order.customer.name} ({order.customer.email})</p>
-        <p><strong>Total Amount:</strong> ₹{order.total_amount:.2f}</p>
-        <p><strong>Items:</strong> {items_summary}</p>
-        <p><strong>Expected Delivery:</strong> {delivery_str}</p>
-        <p><strong>Address:</strong> {order.customer.address or 'N/A'}</p>
-    </div>
-    """
-    background_tasks.add_task(
-        send_email,
+    notify_owner(
+        db,
+        _owner_email(db, order),
+        "new_order",
         owner_subject,
-        settings.owner_email or settings.email_from,
         owner_body,
+        f"Order #{order.id} from {order.customer.name}: ₹{order.total_amount:.2f} ({summary})",
+        owner_id=order.owner_id,
     )
 
     # Out-of-stock alerts to owner
@@ -134,20 +107,26 @@ def place_order(
         item = db.get(models.Item, oi.item_id)
         if item and item.stock_quantity <= 0:
             alert_subj = f"Out of Stock: {item.name}"
-            alert_body = f"""
-            <div style='font-family: Arial, sans-serif; padding: 20px;'>
-                <h3>Out of Stock Alert</h3>
-                <p>Item <strong>{item.name}</strong> is now out of stock after order #{order.id}.</p>
-                <p>Date: {datetime.utcnow().strftime('%d %B %Y at %I:%M %p')}</p>
-            </div>
-            """
-            background_tasks.add_task(
-                send_email,
+            alert_body = render(
+                "stock_alert.html",
+                item_name=item.name,
+                order_id=order.id,
+                date=datetime.utcnow().strftime('%d %B %Y at %I:%M %p'),
+            )
+            notify_owner(
+                db,
+                _owner_email(db, order),
+                "out_of_stock",
                 alert_subj,
-                settings.owner_email or settings.email_from,
                 alert_body,
+                f"{item.name} went out of stock after order #{order.id}",
+                owner_id=order.owner_id,
             )
 
+    # The order and its emails are committed together
+    db.commit()
+    db.refresh(order)
+    outbox_worker.wake()
     return order
 
 
@@ -155,117 +134,147 @@ def place_order(
 def update_status(
     order_id: int,
     payload: schemas.OrderStatusUpdate,
-    background_tasks: BackgroundTasks,
+    owner_id: int | None = Depends(get_owner_scope),
     db: Session = Depends(get_db),
 ):
-    order = crud.update_order_status(db, order_id, payload.status)
+    order = crud.update_order_status(db, order_id, payload.status, owner_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
-    db.commit()
+    db.flush()
     order = crud.get_order_with_details(db, order.id) or order
 
     status_change_time = datetime.utcnow()
     status_value = order.status.value if hasattr(order.status, "value") else str(order.status)
 
-    # Prepare items summary
-    items_summary = ", ".join(
-        [
-            f"{oi.item.name if oi.item else f'Item {oi.item_id}'} (×{oi.quantity})"
-            for oi in order.items
-        ]
-    )
-
-    # Get expected delivery date string
-    delivery_str = None
-    if order.expected_delivery_date:
-        delivery_str = order.expected_delivery_date.strftime("%d %b %Y, %I:%M %p")
-
-    # Generate e-bill PDF
-    order_dict = {
-        "id": order.id,
-        "status": status_value,
-        "total_amount": order.total_amount,
-        "created_at": order.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-        "customer": {
-            "name": order.customer.name,
-            "email": order.customer.email,
-            "address": order.customer.address,
-            "phone": order.customer.phone,
-        },
-        "items": [
-            {
-                "id": oi.id,
-                "item_id": oi.item_id,
-                "quantity": oi.quantity,
-                "price_at_purchase": oi.price_at_purchase,
-                "item": {
-                    "name": oi.item.name if oi.item else f"Item {oi.item_id}",
-                    "discount_percent": oi.item.discount_percent if oi.item else 0.0,
-                },
-            }
-            for oi in order.items
-        ],
-    }
-    pdf_data = generate_ebill_pdf(order_dict)
-
-    # Generate professional email content using Gemini
-    cust_body_html = generate_order_status_email(
-        customer_name=order.customer.name,
-        order_id=order.id,
-        status=status_value,
-        status_change_time=status_change_time,
-        expected_delivery=delivery_str,
-        total_amount=order.total_amount,
-        items_summary=items_summary,
-    )
-
-    # Email to customer for ALL status changes (PLACED, PROCESSING, DISPATCHED, DELIVERED, CANCELLED)
-    status_subjects = {
-        "placed": f"Order #{order.id} Confirmation - E-Bill Attached",
-        "processing": f"Order #{order.id} is Being Processed - E-Bill Attached",
-        "dispatched": f"Order #{order.id} Has Been Dispatched - E-Bill Attached",
-        "delivered": f"Order #{order.id} Delivered Successfully - E-Bill Attached",
-        "cancelled": f"Order #{order.id} Cancellation Notice - E-Bill Attached",
-    }
-    
-    cust_subj = status_subjects.get(status_value.lower(), f"Order #{order.id} {status_value.capitalize()} - E-Bill Attached")
-    
-    # Send email to customer for every status change
-    print(f"📧 Sending {status_value.upper()} status email to customer: {order.customer.email}")
-    background_tasks.add_task(
-        send_email_with_pdf,
-        cust_subj,
-        order.customer.email,
-        f"<div style='font-family: Arial, sans-serif; padding: 20px;'>{cust_body_html.replace(chr(10), '<br>')}</div>",
-        pdf_data,
-        f"Order_{order.id}_E-Bill.pdf",
-    )
+    # Email to customer for ALL status changes (PLACED, PROCESSING, DISPATCHED,
+    # DELIVERED, CANCELLED); body and e-bill are composed by the outbox worker
+    print(f"📧 Queueing {status_value.upper()} status email to customer: {order.customer.email}")
+    enqueue_order_email(db, order)
 
     # If order is cancelled, also notify owner
     if status_value.lower() == "cancelled":
         owner_subj = f"Order #{order.id} Cancelled"
-        owner_body = f"""
-        <div style='font-family: Arial, sans-serif; padding: 20px;'>
-            <h2>Order Cancelled</h2>
-            <p><strong>Order ID:</strong> #{order.id}</p>
-            <p><strong>Customer:</strong> {order.customer.name} ({order.customer.email})</p>
-            <p><strong>Total Amount:</strong> ₹{order.total_amount:.2f}</p>
-            <p><strong>Cancelled On:</strong> {status_change_time.strftime('%d %B %Y at %I:%M %p')}</p>
-        </div>
-        """
-        background_tasks.add_task(
-            send_email,
+        owner_body = render(
+            "order_cancelled_owner.html",
+            order_id=order.id,
+            customer_name=order.customer.name,
+            customer_email=order.customer.email,
+            total_amount=order.total_amount,
+            cancelled_on=status_change_time.strftime('%d %B %Y at %I:%M %p'),
+        )
+        notify_owner(
+            db,
+            _owner_email(db, order),
+            "order_cancelled",
             owner_subj,
-            settings.owner_email or settings.email_from,
             owner_body,
+            f"Order #{order.id} from {order.customer.name} cancelled: ₹{order.total_amount:.2f}",
+            owner_id=order.owner_id,
         )
 
+    # The status change and its emails are committed together
+    db.commit()
+    tracking_cache.invalidate(order.tracking_id)
+    outbox_worker.wake()
     return order
 
 
 @router.get("/{order_id}", response_model=schemas.OrderOut)
-def get_order(order_id: int, db: Session = Depends(get_db)):
-    order = crud.get_order_with_details(db, order_id)
+def get_order(
+    order_id: int,
+    owner_id: int | None = Depends(get_owner_scope),
+    db: Session = Depends(get_db),
+):
+    order = crud.get_order_with_details(db, order_id, owner_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     return order
+
+
+@router.post("/ebills", response_model=schemas.EbillBulkOut)
+def render_ebills(
+    payload: schemas.EbillBulkRequest,
+    owner_id: int | None = Depends(get_owner_scope),
+    db: Session = Depends(get_db),
+):
+    """Render (or find) the current e-bill of every listed order."""
+    if len(payload.order_ids) > settings.pdf_bulk_max_orders:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.pdf_bulk_max_orders} orders per request",
+        )
+    return render_ebills_bulk(db, payload.order_ids, owner_id)
+
+
+def _byte_range(header: str, size: int) -> tuple[int, int] | None:
+    """Inclusive (start, end) of a single ``bytes=`` range; None if unsatisfiable."""
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(size - int(last), 0)
+            end = size - 1
+    except ValueError:
+        return None
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+@router.get("/{order_id}/ebill")
+def download_ebill(
+    order_id: int,
+    request: Request,
+    owner_id: int | None = Depends(get_owner_scope),
+    db: Session = Depends(get_db),
+):
+    """Stored e-bill for the order's current state, with ETag and Range support."""
+    order = crud.get_order_with_details(db, order_id, owner_id)
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return ebill_response(db, order, request)
+
+
+def ebill_response(db: Session, order: models.Order, request: Request) -> Response:
+    """The order's e-bill as a conditional, range-aware PDF response."""
+    try:
+        key, path = get_or_render_ebill(
+            ebill_order_dict(db, order), timeout=settings.pdf_queue_timeout_seconds
+        )
+    except RenderQueueFull:
+        raise HTTPException(status_code=503, detail="PDF renderer busy, retry shortly", headers={"Retry-After": "5"})
+    etag = f'"{key}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=0, must-revalidate",
+        "Content-Disposition": f'inline; filename="{ebill_filename(order.id)}"',
+    }
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    with open(path, "rb") as f:
+        pdf = f.read()
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range == etag):
+        span = _byte_range(range_header, len(pdf))
+        if span is None:
+            headers["Content-Range"] = f"bytes */{len(pdf)}"
+            return Response(status_code=416, headers=headers)
+        start, end = span
+        headers["Content-Range"] = f"bytes {start}-{end}/{len(pdf)}"
+        return Response(
+            content=pdf[start:end + 1],
+            status_code=206,
+            media_type="application/pdf",
+            headers=headers,
+        )
+    return Response(content=pdf, media_type="application/pdf", headers=headers)
@@ -1,9 +1,16 @@
-from fastapi import APIRouter, Depends, Response, HTTPException
+from fastapi import APIRouter, Depends, Query, Response, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta, date
 from .database import get_db
-from . import crud, schemas
-from .utils_pdf import generate_revenue_report_pdf
+from . import crud, schemas, models
+from .utils_render import pdf_renderer, RenderQueueFull
+from .utils_ebill import stream_ebill_zip
+from .utils_snapshot import refresh_snapshot, query_snapshot, get_snapshot
+from .utils_rfm import refresh_customer_scores, list_customer_scores
+from .utils_forecast import refresh_inventory_forecast, list_inventory_forecast
+from .utils_cache import report_cache
+from .routers_auth import get_owner_scope, require_admin
 from .settings import settings
 
 
@@ -36,26 +43,137 @@ def _period_bounds(period: str, ref: date | None = None) -> tuple[datetime, date
 
 
 @router.get("/revenue/pdf")
-def revenue_pdf(period: str, date_ref: date | None = None, db: Session = Depends(get_db)):
+def revenue_pdf(period: str, date_ref: date | None = None, owner_id: int | None = Depends(get_owner_scope), db: Session = Depends(get_db)):
     try:
         start, end, label = _period_bounds(period, date_ref)
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid period; use day|month|year")
-    revenue = crud.revenue_between(db, start, end)
-    tax_rate = settings.total_tax_rate_percent
-    tax_due = round(revenue * tax_rate / 100.0, 2)
-    pdf = generate_revenue_report_pdf(f"{period.upper()} {label}", revenue, details=[("Estimated Tax", tax_due)])
+    revenue = crud.cached_revenue_between(db, start, end, owner_id)
+    tax_due = crud.cached_tax_between(db, start, end, owner_id)["tax"]
+    try:
+        pdf = pdf_renderer.render_revenue_report(
+            f"{period.upper()} {label}",
+            revenue,
+            details=[("Estimated Tax", tax_due)],
+            timeout=settings.pdf_queue_timeout_seconds,
+        )
+    except RenderQueueFull:
+        raise HTTPException(status_code=503, detail="PDF renderer busy, retry shortly", headers={"Retry-After": "5"})
     headers = {"Content-Disposition": f"attachment; filename=revenue_{period}_{label}.pdf"}
     return Response(content=pdf, media_type="application/pdf", headers=headers)
 
 
+@router.get("/invoices.zip")
+def invoices_zip(
+    date_from: date = Query(alias="from"),
+    date_to: date = Query(alias="to"),
+    owner_id: int | None = Depends(get_owner_scope),
+):
+    """E-bills of every order placed from ``from`` to ``to`` (inclusive), streamed as a ZIP."""
+    if date_to < date_from:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    start = datetime(date_from.year, date_from.month, date_from.day)
+    end = datetime(date_to.year, date_to.month, date_to.day) + timedelta(days=1)
+    headers = {"Content-Disposition": f"attachment; filename=invoices_{date_from}_{date_to}.zip"}
+    return StreamingResponse(
+        stream_ebill_zip(start, end, owner_id), media_type="application/zip", headers=headers
+    )
+
+
 @router.get("/revenue/tax", response_model=schemas.TaxSummary)
-def revenue_tax(period: str, date_ref: date | None = None, db: Session = Depends(get_db)):
+def revenue_tax(period: str, date_ref: date | None = None, owner_id: int | None = Depends(get_owner_scope), db: Session = Depends(get_db)):
     start, end, label = _period_bounds(period, date_ref)
-    revenue = crud.revenue_between(db, start, end)
+    revenue = crud.cached_revenue_between(db, start, end, owner_id)
     tax_rate = settings.total_tax_rate_percent
-    tax_due = round(revenue * tax_rate / 100.0, 2)
+    tax_due = crud.cached_tax_between(db, start, end, owner_id)["tax"]
     return schemas.TaxSummary(
         total_revenue=revenue, tax_rate_percent=tax_rate, total_tax_due=tax_due, period=label
     )
 
+
+
+@router.post("/analytics/snapshot", dependencies=[Depends(require_admin)])
+def analytics_snapshot(db: Session = Depends(get_db)):
+    """Append orders placed since the last snapshot to the columnar store."""
+    return refresh_snapshot(db)
+
+
+@router.get("/analytics/query")
+def analytics_query(
+    metric: str = "revenue",
+    group_by: str = "day",
+    start: date | None = None,
+    end: date | None = None,
+    status: models.OrderStatus | None = None,
+    item_id: int | None = None,
+    include_cancelled: bool = False,
+    owner_id: int | None = Depends(get_owner_scope),
+):
+    """
+    Filter/group/sum over the memory-mapped snapshot; never touches the
+    database. ``end`` is exclusive.
+    """
+    try:
+        rows = query_snapshot(
+            metric=metric,
+            group_by=group_by,
+            start=datetime(start.year, start.month, start.day) if start else None,
+            end=datetime(end.year, end.month, end.day) if end else None,
+            status=status,
+            item_id=item_id,
+            include_cancelled=include_cancelled,
+            owner_id=owner_id,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "metric": metric,
+        "group_by": group_by,
+        "snapshot_at": get_snapshot().meta["snapshot_at"],
+        "rows": rows,
+    }
+
+
+@router.get("/customers/rfm", response_model=list[schemas.CustomerScoreOut])
+def customers_rfm(
+    segment: str | None = None,
+    limit: int = 100,
+    offset: int = 0,
+    owner_id: int | None = Depends(get_owner_scope),
+    db: Session = Depends(get_db),
+):
+    """Stored RFM scores and LTV, highest LTV first. ``segment`` is e.g. ``555``."""
+    return list_customer_scores(
+        db, segment=segment, limit=limit, offset=offset, owner_id=owner_id
+    )
+
+
+@router.post("/customers/rfm/refresh", dependencies=[Depends(require_admin)])
+def customers_rfm_refresh(full: bool = False, db: Session = Depends(get_db)):
+    """Rescore customers who ordered since the last run (or everyone with ``full``)."""
+    return refresh_customer_scores(db, full=full)
+
+
+@router.get("/inventory/forecast", response_model=list[schemas.InventoryForecastOut])
+def inventory_forecast(
+    needs_reorder: bool | None = None,
+    limit: int = 100,
+    offset: int = 0,
+    owner_id: int | None = Depends(get_owner_scope),
+    db: Session = Depends(get_db),
+):
+    """Nightly depletion forecast, lowest days-of-cover first."""
+    return list_inventory_forecast(
+        db, needs_reorder=needs_reorder, limit=limit, offset=offset, owner_id=owner_id
+    )
+
+
+@router.post("/inventory/forecast/refresh", dependencies=[Depends(require_admin)])
+def inventory_forecast_refresh(db: Session = Depends(get_db)):
+    return refresh_inventory_forecast(db)
+
+
+@router.get("/cache/stats", dependencies=[Depends(require_admin)])
+def cache_stats():
+    """Hit / miss / coalesce counters of the report cache."""
+    return report_cache.stats()
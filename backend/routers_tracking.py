@@ -1,30 +1,168 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from .database import get_db
-from . import models
+from . import crud, schemas
+from .settings import settings
+from .routers_auth import get_owner_scope, require_admin
+from .routers_orders import ebill_response
+from .utils_backfill import MODES, BackfillRunning, backfill_status, start_backfill
+from .utils_events import stage as stage_event
+from .utils_tracking import Position, naive_utc, ping_buffer, tracking_cache, valid_coords
 
 
 router = APIRouter(prefix="/tracking", tags=["tracking"])
 
+# Cached in place of a lookup for a code that several orders share
+_SHARED = object()
+
 
 @router.post("/{order_id}/assign")
-def assign_tracking(order_id: int, tracking_id: str, lat: float | None = None, lng: float | None = None, db: Session = Depends(get_db)):
-    order = db.get(models.Order, order_id)
+def assign_tracking(order_id: int, tracking_id: str, lat: float | None = None, lng: float | None = None, owner_id: int | None = Depends(get_owner_scope), db: Session = Depends(get_db)):
+    order = crud.get_order(db, order_id, owner_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
+    if crud.tracking_id_taken(db, tracking_id, except_order_id=order_id):
+        raise HTTPException(status_code=409, detail="Tracking id is already assigned to another order")
+    previous = order.tracking_id
     order.tracking_id = tracking_id
     # Generate a Google Maps link for dispatch location (if provided)
     if lat is not None and lng is not None:
         order.tracking_url = f"https://www.google.com/maps?q={lat},{lng}"
     db.add(order)
-    db.commit()
+    stage_event(db, "tracking.assigned", order)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Tracking id is already assigned to another order")
+    tracking_cache.invalidate(previous, tracking_id)
     return {"order_id": order_id, "tracking_id": order.tracking_id, "tracking_url": order.tracking_url}
 
 
+def _mode(recompute_all: bool) -> str:
+    return MODES[1] if recompute_all else MODES[0]
+
+
+@router.post("/backfill", status_code=202, dependencies=[Depends(require_admin)])
+def run_backfill(recompute_all: bool = False, restart: bool = False, chunk_size: int | None = None):
+    """
+    Backfill tracking links and expected delivery dates in the background;
+    poll ``GET /tracking/backfill`` for progress. Runs across all owners,
+    so only the admin token may start it.
+    """
+    if chunk_size is not None and chunk_size < 1:
+        raise HTTPException(status_code=400, detail="chunk_size must be positive")
+    mode = _mode(recompute_all)
+    try:
+        start_backfill(mode, chunk_size, restart)
+    except BackfillRunning as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"mode": mode, "started": True}
+
+
+@router.get("/backfill", dependencies=[Depends(require_admin)])
+def get_backfill(recompute_all: bool = False):
+    mode = _mode(recompute_all)
+    status = backfill_status(mode)
+    if status is None:
+        raise HTTPException(status_code=404, detail="No backfill has run")
+    return status
+
+
+@router.post("/pings", response_model=schemas.TrackingPingOut, status_code=202)
+def post_pings(payload: schemas.TrackingPingBatch, owner_id: int | None = Depends(get_owner_scope), db: Session = Depends(get_db)):
+    """
+    Accept a batch of rider GPS pings. They are buffered and written in
+    bulk; pings for unknown (or another owner's) orders and out-of-range
+    coordinates are counted as rejected.
+    """
+    if len(payload.pings) > settings.tracking_batch_max:
+        raise HTTPException(status_code=400, detail=f"At most {settings.tracking_batch_max} pings per batch")
+    known = crud.existing_order_ids(db, {p.order_id for p in payload.pings}, owner_id)
+    accepted = [
+        (p.order_id, p.lat, p.lng, naive_utc(p.ts))
+        for p in payload.pings
+        if p.order_id in known and valid_coords(p.lat, p.lng)
+    ]
+    ping_buffer.add(accepted)
+    return {"accepted": len(accepted), "rejected": len(payload.pings) - len(accepted)}
+
+
+@router.get("/pings/stats", dependencies=[Depends(require_admin)])
+def ping_stats():
+    return ping_buffer.stats()
+
+
+@router.get("/by-code/{tracking_id}")
+def track_by_code(tracking_id: str, db: Session = Depends(get_db)):
+    """
+    Public tracking by carrier code: status, ETA and last known position.
+    A code shared by several orders is a 409 rather than one of them.
+    """
+
+    def load():
+        rows = crud.get_tracking_by_code(db, tracking_id)
+        if not rows:
+            return None
+        if len(rows) > 1:
+            return _SHARED
+        row = rows[0]
+        return {
+            "order_id": row.id,
+            "tracking_id": row.tracking_id,
+            "status": row.status,
+            "expected_delivery_date": row.expected_delivery_date,
+            "tracking_url": row.tracking_url,
+            "position": Position(row.lat, row.lng, row.ts) if row.ts is not None else None,
+        }
+
+    found = tracking_cache.get_or_load(tracking_id, load)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Tracking id not found")
+    if found is _SHARED:
+        raise HTTPException(status_code=409, detail="Tracking id is shared by several orders")
+    # Pings newer than the cached row (or still unflushed) win
+    position = found["position"]
+    live = ping_buffer.peek(found["order_id"])
+    if live is not None and (position is None or live.ts > position.ts):
+        position = live
+    return {**found, "position": position._asdict() if position else None}
+
+
+@router.get("/by-code/{tracking_id}/ebill")
+def ebill_by_code(tracking_id: str, request: Request, db: Session = Depends(get_db)):
+    """
+    The customer's e-bill, keyed by the order's tracking code: checkout is
+    anonymous, so customers have no token for ``/orders/{id}/ebill``.
+    """
+    rows = crud.get_tracking_by_code(db, tracking_id)
+    if not rows:
+        raise HTTPException(status_code=404, detail="Tracking id not found")
+    if len(rows) > 1:
+        raise HTTPException(status_code=409, detail="Tracking id is shared by several orders")
+    order = crud.get_order_with_details(db, rows[0].id)
+    if not order:
+        raise HTTPException(status_code=404, detail="Tracking id not found")
+    return ebill_response(db, order, request)
+
+
+@router.get("/lookups/stats", dependencies=[Depends(require_admin)])
+def lookup_stats():
+    return tracking_cache.stats()
+
+
 @router.get("/{order_id}")
-def get_tracking(order_id: int, db: Session = Depends(get_db)):
-    order = db.get(models.Order, order_id)
+def get_tracking(order_id: int, owner_id: int | None = Depends(get_owner_scope), db: Session = Depends(get_db)):
+    order = crud.get_order(db, order_id, owner_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
-    return {"order_id": order_id, "tracking_id": order.tracking_id, "tracking_url": order.tracking_url, "status": order.status}
+    position = ping_buffer.last_position(order_id)
+    return {
+        "order_id": order_id,
+        "tracking_id": order.tracking_id,
+        "tracking_url": order.tracking_url,
+        "status": order.status,
+        "position": position._asdict() if position else None,
+    }
 
@@ -96,6 +96,34 @@ class OrderStatusUpdate(BaseModel):
     status: OrderStatus
 
 
+class EbillBulkRequest(BaseModel):
+    order_ids: List[int]
+
+
+class EbillBulkOut(BaseModel):
+    requested: int
+    rendered: int
+    cached: int
+    missing: List[int]
+    ebills: dict[int, str]
+
+
+class TrackingPing(BaseModel):
+    order_id: int
+    lat: float
+    lng: float
+    ts: datetime
+
+
+class TrackingPingBatch(BaseModel):
+    pings: List[TrackingPing]
+
+
+class TrackingPingOut(BaseModel):
+    accepted: int
+    rejected: int
+
+
 class ReportRequest(BaseModel):
     period: str  # day|month|year
     date_ref: Optional[date] = None
@@ -108,6 +136,35 @@ class TaxSummary(BaseModel):
     period: str
 
 
+class CustomerScoreOut(BaseModel):
+    customer_id: int
+    name: str
+    email: str
+    last_order_at: datetime
+    recency_days: int
+    frequency: int
+    monetary: float
+    recency_score: int
+    frequency_score: int
+    monetary_score: int
+    segment: str
+    ltv: float
+    computed_at: datetime
+
+
+class InventoryForecastOut(BaseModel):
+    item_id: int
+    name: str
+    stock_quantity: int
+    velocity_7d: float
+    velocity_window: float
+    daily_std: float
+    days_of_cover: Optional[float] = None
+    reorder_point: int
+    needs_reorder: bool
+    computed_at: datetime
+
+
 class OwnerRegister(BaseModel):
     name: str
     email: EmailStr
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings
 
 
@@ -15,16 +17,127 @@ class Settings(BaseSettings):
     # Gemini
     gemini_api_key: str = ""
     gemini_model: str = "gemini-pro"
+    gemini_base_url: str = "https://generativelanguage.googleapis.com"
+    gemini_timeout_seconds: float = 10.0  # per model attempt
+    gemini_deadline_seconds: float = 20.0  # all attempts of one call
+    gemini_max_concurrency: int = 4
+    gemini_breaker_threshold: int = 5
+    gemini_breaker_cooldown_seconds: float = 60.0
+    # Order emails use one generated template per (status, tone, locale)
+    email_tone: str = "warm and professional"
+    email_locale: str = "en-IN"
+    gemini_template_ttl_hours: float = 168.0
 
     # Favicon (external URL)
     favicon_url: str = ""
 
     # JWT Secret (change in production!)
     jwt_secret_key: str = "your-secret-key-change-in-production-2024"
+    # Bearer token for platform-wide access (every tenant's data and the
+    # maintenance endpoints); empty disables it
+    admin_token: str = ""
 
     # Tax config (10% fixed rate for small scale businesses)
     total_tax_rate_percent: float = 10.0
 
+    # Analytics snapshot (memory-mapped .npy columns)
+    snapshot_dir: str = "./data/snapshot"
+
+    # Customer lifetime value projection horizon
+    ltv_horizon_months: int = 12
+
+    # Inventory forecasting
+    forecast_window_days: int = 28
+    forecast_lead_time_days: int = 3
+    forecast_service_level_z: float = 1.65  # ~95% service level
+
+    # Report cache: closed periods are kept for a long TTL, the open one for
+    # a short one; cancellations invalidate every worker's cache through
+    # the cache_generations table
+    report_cache_open_ttl_seconds: float = 60.0
+    report_cache_closed_ttl_seconds: float = 6 * 3600.0
+
+    # Maximum concurrent SMTP sends during an alert run
+    alert_send_concurrency: int = 20
+
+    # In-process scheduler (one worker runs each job via the job_leases table)
+    scheduler_enabled: bool = True
+    scheduler_tick_seconds: float = 30.0
+    scheduler_jitter_seconds: float = 5.0
+
+    # Mail dispatcher: pooled SMTP connections on a dedicated loop thread
+    mail_dispatcher_enabled: bool = True
+    smtp_pool_size: int = 3
+    smtp_keepalive_seconds: float = 60.0
+
+    # Email outbox: durable queue drained by an in-process worker
+    outbox_enabled: bool = True
+    outbox_dir: str = "./data/outbox"
+    outbox_poll_seconds: float = 2.0
+    outbox_batch_size: int = 50
+    outbox_lease_seconds: float = 300.0
+    outbox_max_attempts: int = 6
+    outbox_backoff_base_seconds: float = 30.0
+    outbox_backoff_max_seconds: float = 3600.0
+    outbox_retention_days: int = 30
+
+    # Owner notifications: "immediate" sends one email per event; "minutes"
+    # and "hourly" collect events into one digest per window. Event kinds
+    # listed in owner_digest_urgent_kinds (of new_order, out_of_stock,
+    # order_cancelled) always go out immediately.
+    owner_digest_mode: Literal["immediate", "minutes", "hourly"] = "immediate"
+    owner_digest_minutes: int = 15
+    owner_digest_urgent_kinds: list[str] = ["out_of_stock"]
+
+    # Rendered e-bills, stored by a hash of their content
+    ebill_dir: str = "./data/ebills"
+
+    # PDF rendering in worker processes (0 workers = one per core); renders
+    # beyond pdf_max_queue wait for a slot, or fail after pdf_queue_timeout
+    # seconds on download endpoints
+    pdf_workers: int = 0
+    pdf_max_queue: int = 64
+    pdf_queue_timeout_seconds: float = 5.0
+    pdf_bulk_max_orders: int = 5000
+
+    # Geocoding: the bundled gazetteer covers states, major cities and PIN
+    # prefixes; point gazetteer_path at the India Post All-India Pincode
+    # Directory CSV (.csv or .csv.gz) to add every PIN code and district
+    # (``python -m backend.utils_geocoding fetch <url>`` downloads it)
+    gazetteer_path: str = ""
+    geocode_cache_size: int = 10000
+
+    # Delivery ETA by great-circle distance from the shop: up to
+    # delivery_band_km[i] km takes delivery_band_days[i] days; the extra
+    # last entry applies beyond the farthest band and to unknown addresses
+    delivery_band_km: list[float] = [50, 400, 1000, 1800]
+    delivery_band_days: list[int] = [1, 2, 3, 4, 5]
+
+    # Tracking/ETA backfill: orders read and written per transaction
+    backfill_chunk_size: int = 500
+
+    # Rider GPS pings: buffered in memory and bulk-inserted every
+    # tracking_flush_seconds or tracking_flush_size pings; a request that
+    # finds tracking_max_pending pings buffered flushes them itself
+    tracking_flush_size: int = 500
+    tracking_flush_seconds: float = 2.0
+    tracking_max_pending: int = 20000
+    tracking_batch_max: int = 1000
+    tracking_positions_max: int = 50000
+    # A remembered last position is re-checked against tracking_events
+    # after this long (other worker processes take pings too)
+    tracking_positions_ttl_seconds: float = 10.0
+    # Lookups by tracking code (GET /tracking/by-code/...) are cached briefly
+    tracking_cache_size: int = 10000
+    tracking_cache_ttl_seconds: float = 30.0
+
+    # Live updates (GET /events): events kept for resuming, events a client
+    # may fall behind before it is disconnected, and keepalive interval
+    events_history: int = 1000
+    events_client_buffer: int = 100
+    events_max_subscribers: int = 10000
+    events_keepalive_seconds: float = 15.0
+
     # CORS
     cors_origins: list[str] = ["*"]
 
@@ -0,0 +1,283 @@
+"""
+Tax alert runs.
+
+A run computes the quarter deadline once, the quarter tax ledger totals once per
+revenue scope, and builds the template context once per variant; the
+compiled ``tax_alert.html`` template is then batch-rendered for the owners
+of each variant. Sends are fanned out concurrently behind a bounded
+semaphore.
+
+Automatic alerts are claimed in the ``sent_alerts`` ledger (unique on owner,
+quarter and kind) before anything is rendered, so repeated and parallel runs
+skip owners that were already alerted.
+"""
+import asyncio
+from datetime import datetime, date
+from uuid import uuid4
+
+from sqlalchemy import select, insert, delete
+from sqlalchemy.orm import Session
+
+from . import crud, models
+from .database import SessionLocal
+from .settings import settings
+from .utils_email import send_email_async
+from .utils_templates import render_batch
+from .utils_tax import (
+    _quarter_bounds,
+    get_current_quarter_deadline,
+    calculate_commercial_tax,
+    quarter_label,
+)
+
+
+# Alert kind -> inclusive window of days before the deadline
+ALERT_WINDOWS = {
+    "15_weeks": (100, 110),
+    "1_week": (5, 9),
+}
+
+_DAYS_NOTE = {
+    "manual": "",
+    "15_weeks": " (15 weeks)",
+    "1_week": " (1 week)",
+}
+
+
+def alert_kind_for(days_until: int) -> str | None:
+    for kind, (low, high) in ALERT_WINDOWS.items():
+        if low <= days_until <= high:
+            return kind
+    return None
+
+
+def tax_alert_context(
+    kind: str,
+    today: date,
+    revenue: float,
+    tax_info: dict,
+    deadline: date,
+    days_until: int,
+) -> tuple[str, dict]:
+    """Subject and the template context shared by one alert variant."""
+    quarter = quarter_label(today)
+    if kind == "15_weeks":
+        prefix = "GST & Tax Alert" if tax_info.get("gst_registered") else "Tax Alert"
+        subject = f"{prefix} (15 Weeks Remaining) - {quarter}"
+    elif kind == "1_week":
+        subject = f"⚠️ URGENT: Tax Payment Due in 1 Week - {quarter}"
+    else:
+        subject = f"Tax Payment Alert - {quarter}"
+
+    context = {
+        "kind": kind,
+        "quarter": quarter,
+        "revenue": revenue,
+        "tax_rate": f"{tax_info['tax_rate']:g}",
+        "breakdown": tax_info.get("breakdown", {}),
+        "total_tax": tax_info["total_tax"],
+        "deadline": deadline.strftime("%d %B %Y"),
+        "days_until": days_until,
+        "days_note": _DAYS_NOTE[kind],
+    }
+    return subject, context
+
+
+def revenue_scope(owner) -> int:
+    """Key of the revenue an owner's alert is computed over (their shop)."""
+    return owner.id
+
+
+def claim_alerts(
+    db: Session, owner_ids: list[int], quarter: str, kind: str
+) -> set[int]:
+    """
+    Claim ledger rows with INSERT OR IGNORE; returns the owners this call
+    claimed (owners claimed earlier, by any run, are left out).
+    """
+    if not owner_ids:
+        return set()
+    run_id = uuid4().hex
+    now = datetime.utcnow()
+    db.execute(
+        insert(models.SentAlert).prefix_with("OR IGNORE"),
+        [
+            {
+                "owner_id": owner_id,
+                "quarter": quarter,
+                "alert_kind": kind,
+                "run_id": run_id,
+                "sent_at": now,
+            }
+            for owner_id in owner_ids
+        ],
+    )
+    db.commit()
+    return set(
+        db.execute(
+            select(models.SentAlert.owner_id).where(
+                models.SentAlert.run_id == run_id
+            )
+        ).scalars()
+    )
+
+
+def release_alerts(emails: list[str], quarter: str, kind: str) -> None:
+    """Drop ledger claims for failed sends so the next run retries them."""
+    if not emails:
+        return
+    db = SessionLocal()
+    try:
+        db.execute(
+            delete(models.SentAlert).where(
+                models.SentAlert.quarter == quarter,
+                models.SentAlert.alert_kind == kind,
+                models.SentAlert.owner_id.in_(
+                    select(models.Owner.id).where(models.Owner.email.in_(emails))
+                ),
+            )
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def list_sent_alerts(db: Session, owner_id: int) -> list[dict]:
+    rows = db.execute(
+        select(models.SentAlert)
+        .where(models.SentAlert.owner_id == owner_id)
+        .order_by(models.SentAlert.sent_at.desc())
+    ).scalars()
+    return [
+        {
+            "quarter": row.quarter,
+            "alert_kind": row.alert_kind,
+            "sent_at": row.sent_at.isoformat(),
+        }
+        for row in rows
+    ]
+
+
+def plan_tax_alerts(
+    db: Session,
+    owners,
+    today: date | None = None,
+    kind: str | None = None,
+    only: tuple[str, ...] | None = None,
+) -> dict:
+    """
+    Build the messages for one alert run over ``owners``.
+
+    ``kind`` forces a variant (e.g. ``"manual"``); otherwise it is derived
+    from the days left until the quarter deadline and owners get nothing
+    outside the alert windows (or outside ``only``, when given). Windowed
+    alerts are claimed in the ledger first and only newly claimed owners get
+    a message.
+    """
+    today = today or datetime.utcnow().date()
+    deadline = get_current_quarter_deadline(today)
+    days_until = (deadline - today).days
+    kind = kind or alert_kind_for(days_until)
+    if only is not None and kind not in only:
+        kind = None
+    plan = {
+        "kind": kind,
+        "quarter": quarter_label(today),
+        "deadline": deadline,
+        "days_until": days_until,
+        "messages": [],
+    }
+    if kind is None:
+        return plan
+    if kind in ALERT_WINDOWS:
+        claimed = claim_alerts(db, [o.id for o in owners], plan["quarter"], kind)
+        owners = [o for o in owners if o.id in claimed]
+        if not owners:
+            return plan
+
+    start, end = _quarter_bounds(today)
+    # Large runs fetch every tenant's ledger totals in one grouped query
+    prefetched = crud.tax_by_owner(db, start, end) if len(owners) > 1 else None
+    empty = {"taxable": 0.0, "cgst": 0.0, "sgst": 0.0, "tax": 0.0}
+    ledger_by_scope: dict = {}
+    variants: dict = {}
+    for owner in owners:
+        scope = revenue_scope(owner)
+        if scope not in ledger_by_scope:
+            if prefetched is not None:
+                ledger_by_scope[scope] = prefetched.get(scope, empty)
+            else:
+                ledger_by_scope[scope] = crud.cached_tax_between(
+                    db, start, end, scope
+                )
+        ledger = ledger_by_scope[scope]
+        gst = bool(owner.gst_number and owner.gst_number.strip())
+        # Owners with the same ledger totals and GST status get the same body
+        variant = (tuple(ledger.values()), gst)
+        if variant not in variants:
+            tax_info = calculate_commercial_tax(ledger, owner)
+            subject, context = tax_alert_context(
+                kind, today, ledger["taxable"], tax_info, deadline, days_until
+            )
+            variants[variant] = (subject, context, [])
+        variants[variant][2].append(owner)
+
+    for subject, context, members in variants.values():
+        bodies = render_batch(
+            "tax_alert.html",
+            [{"owner_name": owner.name or ""} for owner in members],
+            **context,
+        )
+        plan["messages"].extend(
+            (subject, owner.email, body) for owner, body in zip(members, bodies)
+        )
+    plan["revenue_scopes"] = len(ledger_by_scope)
+    plan["variants"] = len(variants)
+    return plan
+
+
+def active_owners(db: Session):
+    """Only the columns an alert run needs, for every active owner."""
+    return db.execute(
+        select(
+            models.Owner.id,
+            models.Owner.name,
+            models.Owner.email,
+            models.Owner.gst_number,
+        ).where(models.Owner.is_active == True)
+    ).all()
+
+
+async def send_alerts_async(messages: list[tuple[str, str, str]]) -> dict:
+    """Send ``(subject, to, html)`` messages with bounded concurrency."""
+    semaphore = asyncio.Semaphore(max(settings.alert_send_concurrency, 1))
+    failed: list[str] = []
+
+    async def _send(subject: str, to_email: str, body: str) -> None:
+        async with semaphore:
+            try:
+                await send_email_async(subject, to_email, body)
+            except Exception as e:
+                print(f"❌ Error sending alert to owner {to_email}: {str(e)}")
+                failed.append(to_email)
+
+    await asyncio.gather(*(_send(*m) for m in messages))
+    return {"sent": len(messages) - len(failed), "failed": failed}
+
+
+def send_alerts(
+    messages: list[tuple[str, str, str]],
+    quarter: str | None = None,
+    kind: str | None = None,
+) -> dict:
+    """
+    Synchronous wrapper (BackgroundTasks threads, cron). With ``quarter``
+    and ``kind``, ledger claims of failed sends are released.
+    """
+    if not messages:
+        return {"sent": 0, "failed": []}
+    result = asyncio.run(send_alerts_async(messages))
+    print(f"✅ Tax alerts sent: {result['sent']}, failed: {len(result['failed'])}")
+    if quarter and kind in ALERT_WINDOWS:
+        release_alerts(result["failed"], quarter, kind)
+    return result
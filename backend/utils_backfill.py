@@ -0,0 +1,308 @@
+"""
+Backfill of order tracking links and delivery ETAs.
+
+Orders placed before ``expected_delivery_date`` existed, or located by an
+older geocoder, carry a null or stale ``tracking_url`` and
+``expected_delivery_date``. ``backfill_delivery`` walks the affected orders
+in id order, ``chunk_size`` at a time, geocodes each distinct address once
+per run and writes a chunk's changes with a single executemany UPDATE. The
+last order id of the chunk is committed to ``backfill_checkpoints`` in the
+same transaction, so an interrupted run carries on after the last chunk
+that was written.
+
+Two modes:
+
+- ``missing`` fills only null fields;
+- ``all`` recomputes every ETA, and the tracking link of orders that are not
+  dispatched yet (a dispatched order's link may come from
+  ``/tracking/{id}/assign`` and is left alone unless null).
+
+From the command line::
+
+    python -m backend.utils_backfill [--all] [--restart] [--chunk-size N]
+"""
+import argparse
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable
+
+from sqlalchemy import bindparam, func, or_, select, true, update
+from sqlalchemy.dialects.sqlite import insert
+
+from . import models
+from .database import engine
+from .settings import settings
+from .utils_geocoding import delivery_days, parse_address_for_coords
+from .utils_tracking import tracking_cache
+
+
+Order = models.Order
+Checkpoint = models.BackfillCheckpoint
+
+MODES = ("missing", "all")
+
+# Statuses whose tracking link is still the one derived from the address
+_UNDISPATCHED = (models.OrderStatus.placed, models.OrderStatus.processing)
+
+_running = threading.Lock()
+
+
+class BackfillRunning(RuntimeError):
+    pass
+
+
+def _checkpoint_name(mode: str) -> str:
+    return f"delivery:{mode}"
+
+
+def _affected(mode: str):
+    if mode == "missing":
+        return or_(Order.tracking_url.is_(None), Order.expected_delivery_date.is_(None))
+    return true()
+
+
+def _tracking_url(lat: float | None, lng: float | None) -> str | None:
+    if lat and lng:
+        return f"https://www.google.com/maps?q={lat},{lng}"
+    return None
+
+
+def _status(row) -> dict:
+    return {
+        "name": row.name,
+        "last_id": row.last_id,
+        "total": row.total,
+        "processed": row.processed,
+        "updated": row.updated,
+        "started_at": row.started_at,
+        "updated_at": row.updated_at,
+        "finished_at": row.finished_at,
+        "last_error": row.last_error,
+    }
+
+
+def backfill_status(mode: str = "missing") -> dict | None:
+    with engine.connect() as conn:
+        row = conn.execute(
+            select(Checkpoint).where(Checkpoint.name == _checkpoint_name(mode))
+        ).first()
+    return _status(row) if row else None
+
+
+def _begin(mode: str, restart: bool) -> tuple[int, int, int]:
+    """Start or resume the checkpoint; returns (last_id, processed, updated)."""
+    name = _checkpoint_name(mode)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        row = conn.execute(select(Checkpoint).where(Checkpoint.name == name)).first()
+        if row is None or restart or row.finished_at is not None:
+            last_id, processed, updated = 0, 0, 0
+        else:
+            last_id, processed, updated = row.last_id, row.processed, row.updated
+        remaining = conn.execute(
+            select(func.count(Order.id)).where(Order.id > last_id, _affected(mode))
+        ).scalar_one()
+        values = {
+            "last_id": last_id,
+            "total": processed + remaining,
+            "processed": processed,
+            "updated": updated,
+            "updated_at": now,
+            "finished_at": None,
+            "last_error": None,
+        }
+        if last_id == 0:
+            values["started_at"] = now
+        conn.execute(
+            insert(Checkpoint)
+            .values({"name": name, "started_at": now, **values})
+            .on_conflict_do_update(index_elements=[Checkpoint.name], set_=values)
+        )
+    return last_id, processed, updated
+
+
+def _fail(mode: str, error: str) -> None:
+    with engine.begin() as conn:
+        conn.execute(
+            update(Checkpoint)
+            .where(Checkpoint.name == _checkpoint_name(mode))
+            .values(last_error=error, updated_at=datetime.utcnow())
+        )
+
+
+def _print_progress(status: dict) -> None:
+    print(
+        f"✓ Delivery backfill ({status['mode']}): "
+        f"{status['processed']}/{status['total']} order(s), "
+        f"{status['updated']} updated, {status['addresses']} address(es) geocoded"
+    )
+
+
+def backfill_delivery(
+    mode: str = "missing",
+    chunk_size: int | None = None,
+    restart: bool = False,
+    progress: Callable[[dict], None] | None = _print_progress,
+) -> dict:
+    """
+    Recompute ``tracking_url`` and ``expected_delivery_date`` for the orders
+    selected by ``mode``, resuming from the stored checkpoint unless
+    ``restart``. ``progress`` is called after every chunk.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown backfill mode {mode!r}")
+    if not _running.acquire(blocking=False):
+        raise BackfillRunning("A delivery backfill is already running")
+    try:
+        return _run(mode, chunk_size or settings.backfill_chunk_size, restart, progress)
+    finally:
+        _running.release()
+
+
+def _run(mode: str, chunk_size: int, restart: bool, progress) -> dict:
+    started = time.perf_counter()
+    name = _checkpoint_name(mode)
+    last_id, processed, updated = _begin(mode, restart)
+    status = backfill_status(mode)
+    total = status["total"]
+    # address -> (tracking link, days to deliver); one geocode per address
+    located: dict[str, tuple[str | None, int]] = {}
+
+    chunk = (
+        select(
+            Order.id,
+            Order.status,
+            Order.created_at,
+            Order.tracking_url,
+            Order.expected_delivery_date,
+            models.Customer.address,
+        )
+        .join(models.Customer, Order.customer_id == models.Customer.id)
+        .where(Order.id > bindparam("after"), _affected(mode))
+        .order_by(Order.id)
+        .limit(chunk_size)
+    )
+    write = (
+        update(Order)
+        .where(Order.id == bindparam("b_id"))
+        # A backfill is not an order change: keep updated_at as it was
+        .values(
+            tracking_url=bindparam("b_url"),
+            expected_delivery_date=bindparam("b_eta"),
+            updated_at=Order.updated_at,
+        )
+    )
+    try:
+        while True:
+            with engine.begin() as conn:
+                rows = conn.execute(chunk, {"after": last_id}).all()
+                if not rows:
+                    break
+                changes = []
+                for row in rows:
+                    address = (row.address or "").strip()
+                    if address not in located:
+                        located[address] = (
+                            _tracking_url(*parse_address_for_coords(address)),
+                            delivery_days(address),
+                        )
+                    url, days = located[address]
+                    eta = row.created_at + timedelta(days=days) if row.created_at else None
+
+                    new_url = row.tracking_url
+                    if url and (row.tracking_url is None or (
+                        mode == "all" and row.status in _UNDISPATCHED
+                    )):
+                        new_url = url
+                    new_eta = row.expected_delivery_date
+                    if eta and (row.expected_delivery_date is None or mode == "all"):
+                        new_eta = eta
+
+                    if (new_url, new_eta) != (row.tracking_url, row.expected_delivery_date):
+                        changes.append({"b_id": row.id, "b_url": new_url, "b_eta": new_eta})
+                if changes:
+                    conn.execute(write, changes)
+                last_id = rows[-1].id
+                processed += len(rows)
+                updated += len(changes)
+                conn.execute(
+                    update(Checkpoint)
+                    .where(Checkpoint.name == name)
+                    .values(
+                        last_id=last_id,
+                        processed=processed,
+                        updated=updated,
+                        updated_at=datetime.utcnow(),
+                    )
+                )
+            if changes:
+                tracking_cache.clear()
+            if progress:
+                progress({
+                    "mode": mode,
+                    "total": total,
+                    "processed": processed,
+                    "updated": updated,
+                    "addresses": len(located),
+                })
+    except Exception as e:
+        _fail(mode, str(e) or e.__class__.__name__)
+        raise
+
+    with engine.begin() as conn:
+        conn.execute(
+            update(Checkpoint)
+            .where(Checkpoint.name == name)
+            .values(finished_at=datetime.utcnow(), updated_at=datetime.utcnow())
+        )
+    result = backfill_status(mode)
+    result["addresses"] = len(located)
+    result["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+def start_backfill(mode: str = "missing", chunk_size: int | None = None, restart: bool = False) -> None:
+    """Run ``backfill_delivery`` on a background thread (admin endpoint)."""
+    if _running.locked():
+        raise BackfillRunning("A delivery backfill is already running")
+
+    def _target():
+        try:
+            backfill_delivery(mode, chunk_size, restart)
+        except BackfillRunning:
+            pass
+        except Exception as e:
+            print(f"❌ Delivery backfill ({mode}) failed: {e}")
+
+    threading.Thread(target=_target, name="delivery-backfill", daemon=True).start()
+
+
+if __name__ == "__main__":
+    from .database import Base
+    from .migrations import migrate_add_expected_delivery_date
+
+    parser = argparse.ArgumentParser(
+        prog="python -m backend.utils_backfill",
+        description="Backfill order tracking links and expected delivery dates.",
+    )
+    parser.add_argument(
+        "--all", action="store_true",
+        help="recompute every order, not only those with missing values",
+    )
+    parser.add_argument(
+        "--restart", action="store_true",
+        help="ignore the checkpoint of an interrupted run and start over",
+    )
+    parser.add_argument("--chunk-size", type=int, default=settings.backfill_chunk_size)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    migrate_add_expected_delivery_date()
+    summary = backfill_delivery(
+        "all" if args.all else "missing", args.chunk_size, args.restart
+    )
+    print(
+        f"✓ Delivery backfill done: {summary['processed']} order(s) checked, "
+        f"{summary['updated']} updated in {summary['duration_ms'] / 1000:.1f}s"
+    )
@@ -0,0 +1,168 @@
+"""
+In-process cache for report aggregates.
+
+Results for fully closed periods (period end at or before today) rarely
+change and are kept for a long TTL; the open period is cached for a short
+one. Concurrent requests for the same key are coalesced so only one
+computation runs and the others wait for its result.
+
+Every worker process has its own cache, so invalidation goes through the
+database: a write that changes past revenue (a cancellation or its undo)
+bumps the ``reports`` row of ``cache_generations`` in its own transaction
+(``bump_generation``), and every lookup passes the generation it read; a
+cache that sees a different one drops all its entries.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Any, Callable, Hashable
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from . import models
+from .settings import settings
+
+
+REPORTS = "reports"
+
+
+def read_generation(db: Session, name: str = REPORTS) -> int:
+    """Current shared generation of cache ``name`` (0 before the first bump)."""
+    generation = db.execute(
+        select(models.CacheGeneration.generation).where(
+            models.CacheGeneration.name == name
+        )
+    ).scalar_one_or_none()
+    return generation or 0
+
+
+def bump_generation(db: Session, name: str = REPORTS) -> None:
+    """Invalidate cache ``name`` in every process once ``db`` commits."""
+    stmt = insert(models.CacheGeneration).values(
+        name=name, generation=1, updated_at=datetime.utcnow()
+    )
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[models.CacheGeneration.name],
+            set_={
+                "generation": models.CacheGeneration.generation + 1,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+    )
+
+
+class ReportCache:
+    def __init__(self, open_ttl: float, closed_ttl: float, max_entries: int = 4096):
+        self.open_ttl = open_ttl
+        self.closed_ttl = closed_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # Shared generation the entries were computed under
+        self._generation = 0
+        # key -> (value, expires_at, start, end)
+        self._entries: OrderedDict[Hashable, tuple[Any, float, datetime, datetime]] = OrderedDict()
+        # key -> (future, start, end)
+        self._inflight: dict[Hashable, tuple[Future, datetime, datetime]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get_or_compute(
+        self,
+        key: Hashable,
+        start: datetime,
+        end: datetime,
+        compute: Callable[[], Any],
+        generation: int = 0,
+    ) -> Any:
+        """
+        Return the cached value for ``key`` or compute it exactly once.
+        ``generation`` is the shared generation read before the lookup.
+        """
+        with self._lock:
+            if generation != self._generation:
+                # Another process changed cached data: drop everything
+                self._entries.clear()
+                self._inflight.clear()
+                self._generation = generation
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at, _, _ = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                future = inflight[0]
+                self.coalesced += 1
+                leader = False
+            else:
+                future = Future()
+                self._inflight[key] = (future, start, end)
+                self.misses += 1
+                leader = True
+
+        if not leader:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                inflight = self._inflight.get(key)
+                if inflight is not None and inflight[0] is future:
+                    del self._inflight[key]
+            future.set_exception(e)
+            raise
+
+        closed = end.date() <= datetime.utcnow().date()
+        ttl = self.closed_ttl if closed else self.open_ttl
+        expires_at = time.monotonic() + ttl
+        with self._lock:
+            # A concurrent invalidation removes the in-flight marker; in that
+            # case hand the value to the waiters but do not store it.
+            inflight = self._inflight.pop(key, None)
+            if inflight is not None and inflight[0] is future and generation == self._generation:
+                self._entries[key] = (value, expires_at, start, end)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        future.set_result(value)
+        return value
+
+    def sweep(self) -> int:
+        """Evict expired entries of this process's cache."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                k for k, (_, exp, _, _) in self._entries.items() if exp <= now
+            ]
+            for k in expired:
+                del self._entries[k]
+            return len(expired)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "inflight": len(self._inflight),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+            }
+
+
+report_cache = ReportCache(
+    open_ttl=settings.report_cache_open_ttl_seconds,
+    closed_ttl=settings.report_cache_closed_ttl_seconds,
+)
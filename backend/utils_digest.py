@@ -0,0 +1,138 @@
+"""
+Owner notification digests.
+
+Owner-facing events (new orders, stock-outs, cancellations) go out either as
+individual emails or, in the ``minutes`` and ``hourly`` digest modes, are
+recorded in ``owner_events`` and summarized into one email per recipient
+per window by the ``owner_digest`` job. Kinds listed in
+``owner_digest_urgent_kinds``, and events raised with ``urgent=True``, skip
+the digest.
+"""
+from datetime import datetime, timedelta
+from itertools import groupby
+
+from sqlalchemy import select, update, delete
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+from .settings import settings
+from .utils_outbox import enqueue_email, outbox_worker
+from .utils_templates import render
+
+
+DIGEST_TITLES = {
+    "new_order": "New Orders",
+    "out_of_stock": "Out of Stock",
+    "order_cancelled": "Cancelled Orders",
+}
+
+# Event lines listed in one digest; the rest are only counted
+MAX_DIGEST_LINES = 200
+
+
+def digest_interval_seconds() -> float | None:
+    """Digest window for the configured mode (None when sending immediately)."""
+    if settings.owner_digest_mode == "hourly":
+        return 3600.0
+    if settings.owner_digest_mode == "minutes":
+        return max(settings.owner_digest_minutes, 1) * 60.0
+    return None
+
+
+def notify_owner(
+    db: Session,
+    to_email: str,
+    kind: str,
+    subject: str,
+    body_html: str,
+    summary: str,
+    owner_id: int | None = None,
+    urgent: bool = False,
+) -> None:
+    """Queue an owner notification in the caller's transaction."""
+    if (
+        urgent
+        or digest_interval_seconds() is None
+        or kind in settings.owner_digest_urgent_kinds
+    ):
+        enqueue_email(db, subject, to_email, body_html)
+        return
+    db.add(
+        models.OwnerEvent(
+            owner_id=owner_id, to_email=to_email, kind=kind, summary=summary
+        )
+    )
+
+
+def _digest_email(events: list[models.OwnerEvent], now: datetime) -> tuple[str, str]:
+    kinds = list(DIGEST_TITLES) + sorted(
+        {e.kind for e in events} - DIGEST_TITLES.keys()
+    )
+    by_kind = {k: [e for e in events if e.kind == k] for k in kinds}
+    counts = [(k, len(v)) for k, v in by_kind.items() if v]
+
+    sections = []
+    budget = MAX_DIGEST_LINES
+    for kind, items in by_kind.items():
+        if items and budget > 0:
+            sections.append((kind, [e.summary for e in items[:budget]]))
+            budget -= len(sections[-1][1])
+
+    subject = "Shop summary: " + ", ".join(
+        f"{count} {DIGEST_TITLES.get(kind, kind).lower()}" for kind, count in counts
+    )
+    body = render(
+        "owner_digest.html",
+        period_start=min(e.created_at for e in events).strftime("%d %b %Y, %I:%M %p"),
+        period_end=now.strftime("%d %b %Y, %I:%M %p"),
+        counts=counts,
+        sections=sections,
+        titles=DIGEST_TITLES,
+        truncated=max(len(events) - MAX_DIGEST_LINES, 0),
+    )
+    return subject, body
+
+
+def send_owner_digests() -> dict:
+    """Summarize pending events into one outbox email per recipient."""
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        # Summarized events are only kept as long as the sent emails
+        db.execute(
+            delete(models.OwnerEvent).where(
+                models.OwnerEvent.digested_at
+                < now - timedelta(days=settings.outbox_retention_days)
+            )
+        )
+        events = db.execute(
+            select(models.OwnerEvent)
+            .where(models.OwnerEvent.digested_at.is_(None))
+            .order_by(models.OwnerEvent.to_email, models.OwnerEvent.id)
+        ).scalars().all()
+        if not events:
+            db.commit()
+            return {"digests": 0, "events": 0}
+
+        digests = 0
+        for to_email, group in groupby(events, key=lambda e: e.to_email):
+            subject, body = _digest_email(list(group), now)
+            enqueue_email(db, subject, to_email, body)
+            digests += 1
+
+        # Mark exactly the rows summarized above; events committed meanwhile
+        # wait for the next window.
+        ids = [e.id for e in events]
+        for i in range(0, len(ids), 500):
+            db.execute(
+                update(models.OwnerEvent)
+                .where(models.OwnerEvent.id.in_(ids[i:i + 500]))
+                .values(digested_at=now)
+            )
+        db.commit()
+    finally:
+        db.close()
+    outbox_worker.wake()
+    print(f"✓ Owner digests queued: {digests} email(s) for {len(events)} event(s)")
+    return {"digests": digests, "events": len(events)}
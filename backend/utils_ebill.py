@@ -0,0 +1,255 @@
+"""
+Content-addressed e-bill store.
+
+An e-bill is rendered once per distinct invoice content: its key is a
+SHA-256 over the canonical JSON of the order data the PDF is drawn from
+(status included) plus the renderer version, and the PDF is kept as
+``<ebill_dir>/<key>.pdf``. Identical renders resolve to the same file,
+emails attach it by path and ``GET /orders/{id}/ebill`` serves it.
+Rendering happens in the PDF worker processes (see ``utils_render``);
+``render_ebills_bulk`` fans a list of orders out across them and
+``stream_ebill_zip`` streams a period's e-bills as a ZIP archive.
+
+Every status change makes a new key, so ``purge_ebills`` (run with the
+outbox purge) deletes the PDFs that neither an order's current state nor
+an unsent email references.
+"""
+import hashlib
+import json
+import os
+import time
+import zipfile
+from datetime import datetime
+from typing import Iterator
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import crud, models
+from .database import SessionLocal
+from .settings import settings
+from .utils_render import pdf_renderer
+
+
+# Bump when the PDF layout changes so stored e-bills are re-rendered
+EBILL_RENDER_VERSION = 2
+
+
+def ebill_order_dict(
+    db: Session, order: models.Order, tax_lines: list[models.TaxLine] | None = None
+) -> dict:
+    """The order fields an e-bill is drawn from."""
+    if tax_lines is None:
+        tax_lines = crud.order_tax_lines(db, order.id)
+    return {
+        "id": order.id,
+        "status": order.status.value if hasattr(order.status, "value") else str(order.status),
+        "total_amount": order.total_amount,
+        "created_at": order.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+        "customer": {
+            "name": order.customer.name,
+            "email": order.customer.email,
+            "address": order.customer.address,
+            "phone": order.customer.phone,
+        },
+        "items": [
+            {
+                "id": oi.id,
+                "item_id": oi.item_id,
+                "quantity": oi.quantity,
+                "price_at_purchase": oi.price_at_purchase,
+                "item": {
+                    "name": oi.item.name if oi.item else f"Item {oi.item_id}",
+                    "discount_percent": oi.item.discount_percent if oi.item else 0.0,
+                },
+            }
+            for oi in order.items
+        ],
+        "tax_lines": [
+            {
+                "rate_percent": line.rate_percent,
+                "taxable_amount": line.taxable_amount,
+                "cgst_amount": line.cgst_amount,
+                "sgst_amount": line.sgst_amount,
+            }
+            for line in tax_lines
+        ],
+    }
+
+
+def ebill_key(order_dict: dict) -> str:
+    canonical = json.dumps(
+        [EBILL_RENDER_VERSION, order_dict], sort_keys=True, separators=(",", ":"), default=str
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def ebill_path(key: str) -> str:
+    return os.path.join(settings.ebill_dir, f"{key}.pdf")
+
+
+def get_or_render_ebill(order_dict: dict, timeout: float | None = None) -> tuple[str, str]:
+    """
+    Key and path of the stored e-bill, rendering it only if it is new.
+    ``timeout`` bounds the wait for a render queue slot (``RenderQueueFull``).
+    """
+    key = ebill_key(order_dict)
+    path = ebill_path(key)
+    if not os.path.exists(path):
+        pdf_renderer.render_ebill(order_dict, path, timeout=timeout)
+    return key, path
+
+
+def _ensure_ebills(
+    db: Session, order_ids: list[int], owner_id: int | None = None
+) -> list[tuple[models.Order, str, str, bool]]:
+    """
+    ``(order, key, path, rendered)`` for each listed order that exists,
+    rendering the missing e-bills in parallel across the worker processes.
+    """
+    tax_lines = crud.tax_lines_for_orders(db, order_ids)
+    results = []
+    futures = []
+    for order in crud.get_orders_with_details(db, order_ids, owner_id):
+        order_dict = ebill_order_dict(db, order, tax_lines[order.id])
+        key = ebill_key(order_dict)
+        path = ebill_path(key)
+        missing = not os.path.exists(path)
+        if missing:
+            futures.append(pdf_renderer.submit_ebill(order_dict, path))
+        results.append((order, key, path, missing))
+    for future in futures:
+        future.result()
+    return results
+
+
+def render_ebills_bulk(
+    db: Session, order_ids: list[int], owner_id: int | None = None, chunk_size: int = 500
+) -> dict:
+    """
+    Make sure every listed order has its current e-bill stored. Orders are
+    loaded in chunks and only missing PDFs are rendered; the render queue
+    bounds how many are in flight.
+    """
+    ids = list(dict.fromkeys(order_ids))
+    found: dict[int, str] = {}
+    rendered = 0
+    for i in range(0, len(ids), chunk_size):
+        for order, key, _, missing in _ensure_ebills(db, ids[i:i + chunk_size], owner_id):
+            found[order.id] = key
+            rendered += missing
+        db.expunge_all()
+
+    return {
+        "requested": len(ids),
+        "rendered": rendered,
+        "cached": len(found) - rendered,
+        "missing": [i for i in ids if i not in found],
+        "ebills": {order_id: key for order_id, key in found.items()},
+    }
+
+
+class _ZipSink:
+    """Write-only target for ``ZipFile``; ``take`` hands over what was written."""
+
+    def __init__(self):
+        self._parts: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def stream_ebill_zip(
+    start_dt: datetime, end_dt: datetime, owner_id: int | None = None, batch_size: int = 100
+) -> Iterator[bytes]:
+    """
+    ZIP archive of the e-bills of every order placed in ``[start_dt, end_dt)``,
+    yielded piece by piece. Order ids are read in keyset batches; each
+    batch is rendered (or found in the store) and its PDFs are written
+    into the archive before the next is read, so neither the archive nor
+    the period's orders are ever held in full. PDFs are stored, not
+    deflated: they are compressed already.
+
+    Runs in its own session, as the response body outlives the request's.
+    The session's transaction ends before a batch is written out, so a
+    slow download does not keep a connection (or a read lock) from writers.
+    """
+    db = SessionLocal()
+    sink = _ZipSink()
+    try:
+        with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as archive:
+            for ids in crud.iter_order_ids_between(db, start_dt, end_dt, owner_id, batch_size):
+                ready = [(order.id, path) for order, _, path, _ in _ensure_ebills(db, ids, owner_id)]
+                db.expunge_all()
+                db.rollback()
+                for order_id, path in ready:
+                    archive.write(path, arcname=ebill_filename(order_id))
+                    yield sink.take()
+        yield sink.take()
+    finally:
+        db.close()
+
+
+def purge_ebills(batch_size: int = 500) -> int:
+    """
+    Delete stored e-bills that are not the current one of any order and are
+    not attached to an unsent email; returns how many files were removed.
+    Files younger than an hour are kept, as their order change or email may
+    not be committed yet.
+    """
+    if not os.path.isdir(settings.ebill_dir):
+        return 0
+    young = time.time() - 3600
+    keep: set[str] = set()
+    db = SessionLocal()
+    try:
+        last_id = 0
+        while True:
+            ids = list(
+                db.execute(
+                    select(models.Order.id)
+                    .where(models.Order.id > last_id)
+                    .order_by(models.Order.id)
+                    .limit(batch_size)
+                ).scalars()
+            )
+            if not ids:
+                break
+            tax_lines = crud.tax_lines_for_orders(db, ids)
+            for order in crud.get_orders_with_details(db, ids):
+                keep.add(ebill_key(ebill_order_dict(db, order, tax_lines[order.id])))
+            last_id = ids[-1]
+            db.expunge_all()
+        for path in db.execute(
+            select(models.EmailOutbox.attachment_path)
+            .where(
+                models.EmailOutbox.status != "sent",
+                models.EmailOutbox.attachment_path.is_not(None),
+            )
+            .distinct()
+        ).scalars():
+            keep.add(os.path.basename(path).split(".")[0])
+    finally:
+        db.close()
+
+    removed = 0
+    for name in os.listdir(settings.ebill_dir):
+        path = os.path.join(settings.ebill_dir, name)
+        if name.split(".")[0] in keep or os.path.getmtime(path) > young:
+            continue
+        os.remove(path)
+        removed += 1
+    return removed
+
+
+def ebill_filename(order_id: int) -> str:
+    return f"Order_{order_id}_E-Bill.pdf"
@@ -10,6 +10,7 @@ from email import encoders
 import aiosmtplib
 
 from .settings import settings
+from .utils_mailer import MailDispatcher
 
 
 logger = logging.getLogger(__name__)
@@ -21,18 +22,68 @@ _unverified_ssl_context.check_hostname = False
 _unverified_ssl_context.verify_mode = ssl.CERT_NONE
 
 
-async def send_email_async(
+def _smtp_kwargs() -> dict:
+    return {
+        "hostname": settings.smtp_host,
+        "port": settings.smtp_port,
+        "start_tls": True,
+        "username": settings.smtp_username,
+        "password": settings.smtp_password,
+        "timeout": 30,
+        "tls_context": _unverified_ssl_context,
+    }
+
+
+# Started in the app lifespan; scripts and cron runs without it fall back to
+# one connection per message.
+mailer = MailDispatcher(
+    _smtp_kwargs,
+    pool_size=settings.smtp_pool_size,
+    keepalive_seconds=settings.smtp_keepalive_seconds,
+)
+
+
+async def _deliver_async(msg) -> None:
+    if mailer.running:
+        await mailer.send(msg)
+    else:
+        await aiosmtplib.send(msg, **_smtp_kwargs())
+
+
+def _log_delivery(to_email: str):
+    def _done(future) -> None:
+        e = future.exception()
+        if e is None:
+            print(f"✅ Email sent successfully to {to_email}")
+        else:
+            print(f"❌ Email sending failed to {to_email}: {str(e)}")
+            logger.error(f"Email send error: {e}")
+
+    return _done
+
+
+def _build_message(
     subject: str,
     to_email: str,
     body_html: str,
     body_text: str | None = None,
-) -> None:
+) -> EmailMessage:
     msg = EmailMessage()
     msg["From"] = settings.email_from or settings.smtp_username
     msg["To"] = to_email
     msg["Subject"] = subject
     msg.set_content(body_text or "")
     msg.add_alternative(body_html, subtype="html")
+    return msg
+
+
+async def send_email_async(
+    subject: str,
+    to_email: str,
+    body_html: str,
+    body_text: str | None = None,
+) -> None:
+    msg = _build_message(subject, to_email, body_html, body_text)
     if not settings.smtp_username or not settings.smtp_password:
         logger.info(
             "SMTP not configured; capturing email locally",
@@ -50,16 +101,7 @@ async def send_email_async(
         print(body_html)
         print("--- END EMAIL ---\n")
         return
-    await aiosmtplib.send(
-        msg,
-        hostname=settings.smtp_host,
-        port=settings.smtp_port,
-        start_tls=True,
-        username=settings.smtp_username,
-        password=settings.smtp_password,
-        timeout=30,
-        tls_context=_unverified_ssl_context,
-    )
+    await _deliver_async(msg)
 
 
 def send_email(
@@ -68,6 +110,11 @@ def send_email(
     body_html: str,
     body_text: str | None = None,
 ) -> None:
+    if mailer.running and settings.smtp_username and settings.smtp_password:
+        # Hand off to the dispatcher's pooled connections; no per-message loop
+        msg = _build_message(subject, to_email, body_html, body_text)
+        mailer.submit(msg).add_done_callback(_log_delivery(to_email))
+        return
     try:
         asyncio.run(send_email_async(subject, to_email, body_html, body_text))
     except RuntimeError:
@@ -86,6 +133,31 @@ async def send_email_with_pdf_async(
     body_text: str | None = None,
 ) -> None:
     """Send email with PDF attachment."""
+    msg = _build_pdf_message(
+        subject, to_email, body_html, pdf_data, pdf_filename, body_text
+    )
+
+    if not settings.smtp_username or not settings.smtp_password:
+        print("\n--- EMAIL WITH PDF (mock send) ---")
+        print(f"To      : {to_email}")
+        print(f"Subject : {subject}")
+        print(f"PDF     : {pdf_filename} ({len(pdf_data)} bytes)")
+        print("HTML    :")
+        print(body_html)
+        print("--- END EMAIL ---\n")
+        return
+
+    await _deliver_async(msg)
+
+
+def _build_pdf_message(
+    subject: str,
+    to_email: str,
+    body_html: str,
+    pdf_data: bytes,
+    pdf_filename: str,
+    body_text: str | None = None,
+) -> MIMEMultipart:
     msg = MIMEMultipart()
     msg["From"] = settings.email_from or settings.smtp_username
     msg["To"] = to_email
@@ -103,27 +175,7 @@ async def send_email_with_pdf_async(
         "Content-Disposition", f'attachment; filename="{pdf_filename}"'
     )
     msg.attach(part)
-
-    if not settings.smtp_username or not settings.smtp_password:
-        print("\n--- EMAIL WITH PDF (mock send) ---")
-        print(f"To      : {to_email}")
-        print(f"Subject : {subject}")
-        print(f"PDF     : {pdf_filename} ({len(pdf_data)} bytes)")
-        print("HTML    :")
-        print(body_html)
-        print("--- END EMAIL ---\n")
-        return
-
-    await aiosmtplib.send(
-        msg,
-        hostname=settings.smtp_host,
-        port=settings.smtp_port,
-        start_tls=True,
-        username=settings.smtp_username,
-        password=settings.smtp_password,
-        timeout=30,
-        tls_context=_unverified_ssl_context,
-    )
+    return msg
 
 
 def send_email_with_pdf(
@@ -145,6 +197,13 @@ def send_email_with_pdf(
             print("---\n")
             return
 
+        if mailer.running:
+            msg = _build_pdf_message(
+                subject, to_email, body_html, pdf_data, pdf_filename, body_text
+            )
+            mailer.submit(msg).add_done_callback(_log_delivery(to_email))
+            return
+
         # Try to send email
         try:
             asyncio.run(
@@ -0,0 +1,334 @@
+"""
+In-process pub/sub hub for order and tracking updates.
+
+Writers stage an event on their session (``stage``); it is rendered just
+before the commit and published only once the commit succeeds, so
+subscribers never see changes that were rolled back. Each event is a delta
+(the fields that changed, not the whole order graph), serialized once into
+an SSE frame, kept in a short history for resuming and fanned out on the
+app's event loop to the matching subscribers.
+
+Subscribers are indexed by the order they follow, or by owner, so a
+publish only visits the streams it concerns, and each one has a bounded
+queue. A client that falls ``events_client_buffer`` events behind is
+disconnected; it reconnects with its last event id (``Last-Event-ID``) and
+catches up from the history, or gets a ``reset`` event telling it to
+reload when the id is no longer there (or is from before a restart).
+
+The hub is per process: with several workers, a stream only carries the
+writes made by its own worker.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, NamedTuple
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+from .settings import settings
+
+
+_STAGED = "hub_staged"
+_READY = "hub_ready"
+
+# Queue markers
+_KEEPALIVE = object()
+_CLOSED = object()
+
+
+class HubEvent(NamedTuple):
+    seq: int
+    kind: str
+    owner_id: int | None
+    order_id: int | None
+    frame: str
+
+
+class HubFull(RuntimeError):
+    pass
+
+
+class Subscriber:
+    __slots__ = ("owner_id", "order_id", "queue")
+
+    def __init__(self, owner_id: int | None, order_id: int | None, buffer: int):
+        self.owner_id = owner_id
+        self.order_id = order_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer)
+
+    def wants(self, ev: HubEvent) -> bool:
+        # owner_id None is the admin's platform-wide stream
+        if self.owner_id is not None and ev.owner_id != self.owner_id:
+            return False
+        return self.order_id is None or ev.order_id == self.order_id
+
+
+class EventHub:
+    def __init__(
+        self,
+        history: int = 1000,
+        client_buffer: int = 100,
+        max_subscribers: int = 10000,
+        keepalive_seconds: float = 15.0,
+    ):
+        self.client_buffer = max(client_buffer, 1)
+        self.max_subscribers = max_subscribers
+        self.keepalive_seconds = keepalive_seconds
+        # Event ids are "<epoch>-<seq>"; a new epoch per process start tells
+        # reconnecting clients that the history they knew is gone
+        self.epoch = format(int(time.time() * 1000), "x")
+        self._seq = 0
+        self._history: deque[HubEvent] = deque(maxlen=max(history, 1))
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._heartbeat: asyncio.Task | None = None
+        # Loop-thread only
+        self._by_order: dict[int, set[Subscriber]] = {}
+        self._by_owner: dict[int | None, set[Subscriber]] = {}
+        self.subscribers = 0
+        self.published = 0
+        self.delivered = 0
+        self.overflowed = 0
+
+    # -- publishing (any thread) ------------------------------------------
+
+    def publish(self, kind: str, owner_id: int | None, order_id: int | None, data: dict) -> HubEvent:
+        payload = json.dumps(jsonable_encoder(data), separators=(",", ":"))
+        with self._lock:
+            self._seq += 1
+            ev = HubEvent(
+                self._seq,
+                kind,
+                owner_id,
+                order_id,
+                f"id: {self.epoch}-{self._seq}\nevent: {kind}\ndata: {payload}\n\n",
+            )
+            self._history.append(ev)
+            self.published += 1
+            loop = self._loop
+            if loop is not None:
+                # Scheduled under the lock so events fan out in seq order
+                try:
+                    loop.call_soon_threadsafe(self._fan_out, ev)
+                except RuntimeError:
+                    pass  # loop already closed
+        return ev
+
+    def _fan_out(self, ev: HubEvent) -> None:
+        targets = [self._by_owner.get(None, ()), self._by_order.get(ev.order_id, ())]
+        if ev.owner_id is not None:
+            targets.append(self._by_owner.get(ev.owner_id, ()))
+        for group in targets:
+            for sub in list(group):
+                if sub.wants(ev):
+                    self._offer(sub, ev)
+
+    def _offer(self, sub: Subscriber, item: Any) -> None:
+        try:
+            sub.queue.put_nowait(item)
+            if item is not _KEEPALIVE:
+                self.delivered += 1
+        except asyncio.QueueFull:
+            if item is _KEEPALIVE:
+                return
+            # Too far behind: drop what is queued and end the stream; the
+            # client resumes from its last event id
+            self.overflowed += 1
+            self._close(sub)
+
+    def _close(self, sub: Subscriber) -> None:
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        sub.queue.put_nowait(_CLOSED)
+        self._unsubscribe(sub)
+
+    # -- subscribing (loop thread) ----------------------------------------
+
+    def _group(self, sub: Subscriber) -> set[Subscriber]:
+        if sub.order_id is not None:
+            return self._by_order.setdefault(sub.order_id, set())
+        return self._by_owner.setdefault(sub.owner_id, set())
+
+    def _unsubscribe(self, sub: Subscriber) -> None:
+        index, key = (
+            (self._by_order, sub.order_id)
+            if sub.order_id is not None
+            else (self._by_owner, sub.owner_id)
+        )
+        group = index.get(key)
+        if group is not None and sub in group:
+            group.discard(sub)
+            self.subscribers -= 1
+            if not group:
+                del index[key]
+
+    def _backlog(self, cursor: str | None, sub: Subscriber) -> tuple[list[HubEvent], bool]:
+        """Events after ``cursor`` for ``sub``, and whether it must reload."""
+        if not cursor:
+            return [], False
+        epoch, _, seq = cursor.partition("-")
+        with self._lock:
+            history = list(self._history)
+            latest = self._seq
+        if epoch != self.epoch or not seq.isdigit() or int(seq) > latest:
+            return [], True
+        after = int(seq)
+        oldest = history[0].seq if history else latest + 1
+        if after < oldest - 1:
+            return [], True
+        return [ev for ev in history if ev.seq > after and sub.wants(ev)], False
+
+    def stream(
+        self,
+        owner_id: int | None,
+        order_id: int | None = None,
+        cursor: str | None = None,
+    ) -> AsyncIterator[str]:
+        """
+        Subscribe and return the client's SSE frames (call on the event
+        loop); raises ``HubFull`` at ``max_subscribers``.
+        """
+        if self.subscribers >= self.max_subscribers:
+            raise HubFull("Too many event subscribers")
+        sub = Subscriber(owner_id, order_id, self.client_buffer)
+        self._group(sub).add(sub)
+        self.subscribers += 1
+        return self._frames(sub, cursor)
+
+    async def _frames(self, sub: Subscriber, cursor: str | None) -> AsyncIterator[str]:
+        try:
+            # Subscribed before reading the history, so nothing falls between
+            # the two; events in both are skipped by seq
+            backlog, reset = self._backlog(cursor, sub)
+            yield f"retry: {int(self.keepalive_seconds * 1000)}\n\n"
+            if reset:
+                yield f"id: {self.epoch}-{self._seq}\nevent: reset\ndata: {{}}\n\n"
+            last = backlog[-1].seq if backlog else 0
+            for ev in backlog:
+                yield ev.frame
+            while True:
+                item = await sub.queue.get()
+                if item is _CLOSED:
+                    return
+                if item is _KEEPALIVE:
+                    yield ": keepalive\n\n"
+                    continue
+                if item.seq > last:
+                    yield item.frame
+        finally:
+            self._unsubscribe(sub)
+
+    # -- lifecycle ----------------------------------------------------------
+
+    async def _beat(self) -> None:
+        # One timer for every stream: idle connections get a comment line so
+        # proxies keep them open
+        while True:
+            await asyncio.sleep(self.keepalive_seconds)
+            for index in (self._by_owner, self._by_order):
+                for group in list(index.values()):
+                    for sub in list(group):
+                        self._offer(sub, _KEEPALIVE)
+
+    def start(self) -> None:
+        if self._heartbeat is None:
+            self._loop = asyncio.get_running_loop()
+            self._heartbeat = asyncio.create_task(self._beat())
+            print("✓ Event hub started")
+
+    async def stop(self) -> None:
+        """End every open stream and stop fanning out."""
+        with self._lock:
+            self._loop = None
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            try:
+                await self._heartbeat
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat = None
+        for index in (self._by_owner, self._by_order):
+            for group in list(index.values()):
+                for sub in list(group):
+                    self._close(sub)
+
+    def stats(self) -> dict:
+        with self._lock:
+            retained = len(self._history)
+            last_id = f"{self.epoch}-{self._seq}"
+        return {
+            "running": self._heartbeat is not None,
+            "subscribers": self.subscribers,
+            "published": self.published,
+            "delivered": self.delivered,
+            "overflowed": self.overflowed,
+            "history": retained,
+            "last_event_id": last_id,
+        }
+
+
+event_hub = EventHub(
+    history=settings.events_history,
+    client_buffer=settings.events_client_buffer,
+    max_subscribers=settings.events_max_subscribers,
+    keepalive_seconds=settings.events_keepalive_seconds,
+)
+
+
+# -- publishing from a session ------------------------------------------------
+
+def stage(db: Session, kind: str, order: models.Order) -> None:
+    """Publish ``kind`` for ``order`` once ``db`` commits (dropped on rollback)."""
+    db.info.setdefault(_STAGED, []).append((kind, order))
+
+
+def _delta(kind: str, order: models.Order) -> dict:
+    if kind == "order.created":
+        return {
+            "id": order.id,
+            "status": order.status,
+            "total_amount": order.total_amount,
+            "customer_id": order.customer_id,
+            "customer_name": order.customer.name if order.customer else None,
+            "created_at": order.created_at,
+            "expected_delivery_date": order.expected_delivery_date,
+            "tracking_id": order.tracking_id,
+        }
+    if kind == "order.status":
+        return {"id": order.id, "status": order.status, "updated_at": order.updated_at}
+    if kind == "tracking.assigned":
+        return {
+            "id": order.id,
+            "tracking_id": order.tracking_id,
+            "tracking_url": order.tracking_url,
+        }
+    raise ValueError(f"Unknown event kind {kind!r}")
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def _render_staged(session: Session) -> None:
+    # Objects are expired by the commit, so read them while they are loaded
+    staged = session.info.pop(_STAGED, None)
+    if staged:
+        session.info.setdefault(_READY, []).extend(
+            (kind, order.owner_id, order.id, _delta(kind, order))
+            for kind, order in staged
+        )
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publish_ready(session: Session) -> None:
+    for kind, owner_id, order_id, data in session.info.pop(_READY, ()):
+        event_hub.publish(kind, owner_id, order_id, data)
+
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def _drop_staged(session: Session, previous_transaction) -> None:
+    session.info.pop(_STAGED, None)
+    session.info.pop(_READY, None)
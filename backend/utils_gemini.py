@@ -1,44 +1,376 @@
-from datetime import datetime
+import asyncio
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+
+import httpx
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
 from .settings import settings
+from .utils_templates import render, status_message
 
 
-def generate_email_content(prompt: str) -> str:
+def _running_loop() -> asyncio.AbstractEventLoop | None:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class CircuitBreaker:
     """
-    Best-effort Gemini integration; falls back to prompt if library or
-    API key is not available.
+    Opens after ``threshold`` consecutive failures; while open, calls are
+    skipped until ``cooldown`` has passed, then a single trial call decides
+    whether to close it again.
     """
-    try:
-        import google.generativeai as genai
-
-        if not settings.gemini_api_key:
-            print("⚠️  Gemini API key not configured - using fallback content")
-            return prompt
-        
-        print("🤖 Generating email content with Gemini API...")
-        genai.configure(api_key=settings.gemini_api_key)
-        
-        # Try different models if one fails
-        models_to_try = [settings.gemini_model, "gemini-pro", "gemini-1.5-pro"]
-        for model_name in models_to_try:
-            try:
-                model = genai.GenerativeModel(model_name)
-                resp = model.generate_content(prompt)
-                text = getattr(resp, "text", None)
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = max(threshold, 1)
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.cooldown or self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            self._trial = False
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.failures >= self.threshold:
+                if self.opened_at is None:
+                    print(f"⚠️  Gemini circuit open after {self.failures} failure(s)")
+                self.opened_at = time.monotonic()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return "open"
+        return "half-open"
+
+
+class GeminiClient:
+    """
+    Shared async client for the Gemini REST API.
+
+    ``start`` (app lifespan) binds one pooled ``httpx.AsyncClient`` and the
+    concurrency semaphore to the app's event loop; sync callers in request
+    threads submit to that loop and wait at most the call deadline. Every
+    model attempt has its own timeout and all attempts share one deadline.
+    """
+
+    def __init__(self):
+        self.breaker = CircuitBreaker(
+            settings.gemini_breaker_threshold,
+            settings.gemini_breaker_cooldown_seconds,
+        )
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._http: httpx.AsyncClient | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self.calls = 0
+        self.skipped = 0
+
+    def start(self) -> None:
+        if self._http is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._http = self._new_http()
+        self._semaphore = asyncio.Semaphore(max(settings.gemini_max_concurrency, 1))
+
+    async def stop(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+        self._http = None
+        self._loop = None
+        self._semaphore = None
+
+    @staticmethod
+    def _new_http() -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=settings.gemini_base_url,
+            timeout=settings.gemini_timeout_seconds,
+            limits=httpx.Limits(max_connections=max(settings.gemini_max_concurrency, 1)),
+        )
+
+    @staticmethod
+    def _models() -> list[str]:
+        return list(dict.fromkeys([settings.gemini_model, "gemini-pro", "gemini-1.5-pro"]))
+
+    async def _call(self, http: httpx.AsyncClient, model: str, prompt: str) -> str | None:
+        resp = await http.post(
+            f"/v1beta/models/{model}:generateContent",
+            headers={"x-goog-api-key": settings.gemini_api_key},
+            json={"contents": [{"parts": [{"text": prompt}]}]},
+        )
+        resp.raise_for_status()
+        candidates = resp.json().get("candidates") or []
+        if not candidates:
+            return None
+        parts = candidates[0].get("content", {}).get("parts") or []
+        return "".join(p.get("text", "") for p in parts) or None
+
+    async def _generate(self, http: httpx.AsyncClient, semaphore: asyncio.Semaphore, prompt: str) -> str | None:
+        deadline = time.monotonic() + settings.gemini_deadline_seconds
+        last_error: Exception | None = None
+        async with semaphore:
+            for model in self._models():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("Gemini deadline exceeded")
+                try:
+                    text = await asyncio.wait_for(
+                        self._call(http, model, prompt),
+                        min(remaining, settings.gemini_timeout_seconds),
+                    )
+                except Exception as e:
+                    print(f"⚠️  Model {model} failed ({e.__class__.__name__}), trying next...")
+                    last_error = e
+                    continue
                 if text:
-                    print(f"✅ Gemini content generated successfully using {model_name}")
+                    print(f"✅ Gemini content generated successfully using {model}")
                     return text
-            except Exception as model_error:
-                if model_name == models_to_try[-1]:
-                    # Last model failed, raise the error
-                    raise model_error
-                print(f"⚠️  Model {model_name} failed, trying next...")
-                continue
-        
-        print("⚠️  Gemini returned empty - using fallback")
+                return None
+            raise last_error
+
+    async def generate(self, prompt: str) -> str | None:
+        """Generated text, or None when skipped, empty or failed."""
+        if not self.breaker.allow():
+            self.skipped += 1
+            return None
+        self.calls += 1
+        try:
+            if self._http is not None and _running_loop() is self._loop:
+                text = await self._generate(self._http, self._semaphore, prompt)
+            else:
+                async with self._new_http() as http:
+                    text = await self._generate(http, asyncio.Semaphore(1), prompt)
+        except asyncio.CancelledError:
+            # generate_sync gave up waiting; still one failure, and a
+            # half-open breaker's trial must not be left pending
+            self.breaker.record(False)
+            raise
+        except Exception as e:
+            self.breaker.record(False)
+            print(f"❌ Gemini API error: {str(e) or e.__class__.__name__} - using fallback content")
+            return None
+        self.breaker.record(True)
+        return text
+
+    def generate_sync(self, prompt: str) -> str | None:
+        """Blocking variant for request threads; never waits past the deadline."""
+        if self.breaker.state == "open":
+            self.skipped += 1
+            return None
+        loop = self._loop
+        if loop is None:
+            return asyncio.run(self.generate(prompt))
+        if loop.is_running() and _running_loop() is loop:
+            # Blocking here would deadlock the loop the client lives on
+            return None
+        future = asyncio.run_coroutine_threadsafe(self.generate(prompt), loop)
+        try:
+            return future.result(settings.gemini_deadline_seconds + 1)
+        except Exception:
+            # generate records the failure itself once it is cancelled
+            future.cancel()
+            return None
+
+    def stats(self) -> dict:
+        return {
+            "started": self._http is not None,
+            "breaker": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "calls": self.calls,
+            "skipped": self.skipped,
+        }
+
+
+gemini_client = GeminiClient()
+
+
+def generate_email_content(prompt: str) -> str:
+    """
+    Best-effort Gemini integration through the shared client; falls back
+    to the prompt when no API key is set, the circuit is open or the call
+    fails or times out.
+    """
+    if not settings.gemini_api_key:
+        print("⚠️  Gemini API key not configured - using fallback content")
         return prompt
-    except Exception as e:
-        print(f"❌ Gemini API error: {str(e)} - using fallback content")
+    text = gemini_client.generate_sync(prompt)
+    if not text:
         return prompt
+    return text
+
+
+# Bump when the template prompt or placeholder set changes; copy cached
+# under an older version is ignored.
+COPY_TEMPLATE_VERSION = 1
+
+PLACEHOLDERS = (
+    "customer_name",
+    "order_id",
+    "status_time",
+    "expected_delivery",
+    "total_amount",
+    "items_summary",
+)
+_REQUIRED_PLACEHOLDERS = {"customer_name", "order_id"}
+_PLACEHOLDER = re.compile(r"\[\[(\w+)\]\]")
+
+# Keys whose generation failed are retried after this many seconds
+_RETRY_SECONDS = 300.0
+
+# (status, tone, locale, version) -> (template or None, monotonic expiry)
+_copy_cache: dict[tuple, tuple[str | None, float]] = {}
+_copy_locks: dict[tuple, threading.Lock] = {}
+_copy_locks_guard = threading.Lock()
+
+
+def _template_prompt(status: str, tone: str, locale: str) -> str:
+    placeholders = ", ".join(f"[[{p}]]" for p in PLACEHOLDERS)
+    return f"""Write a reusable email body template for online shop customers whose order status changed.
+
+Status: {status.upper()}
+Status Message: {status_message(status)}
+Tone: {tone}
+Locale: {locale} (language, spelling and currency conventions; amounts are in ₹)
+
+Use these placeholders literally wherever the value belongs: {placeholders}.
+Do not invent any other placeholder and do not fill in example values.
+
+The email should:
+1. Address the customer by [[customer_name]]
+2. Clearly state the order status of order #[[order_id]] and what it means
+3. Include the date and time of the status change ([[status_time]])
+4. Mention the expected delivery ([[expected_delivery]]) where it is relevant for this status
+5. Include the order total ([[total_amount]]) and items ([[items_summary]])
+6. Provide next steps or reassurance
+7. End with a thank you message
+
+Keep it concise and customer-friendly. Return only the email body text (no subject line)."""
+
+
+def _valid_template(text: str | None) -> bool:
+    if not text:
+        return False
+    found = set(_PLACEHOLDER.findall(text))
+    return _REQUIRED_PLACEHOLDERS <= found and found <= set(PLACEHOLDERS)
+
+
+def _load_template(db: Session, key: tuple) -> models.EmailCopyTemplate | None:
+    status, tone, locale, version = key
+    return db.execute(
+        select(models.EmailCopyTemplate).where(
+            models.EmailCopyTemplate.status == status,
+            models.EmailCopyTemplate.tone == tone,
+            models.EmailCopyTemplate.locale == locale,
+            models.EmailCopyTemplate.version == version,
+            models.EmailCopyTemplate.expires_at > datetime.utcnow(),
+        )
+    ).scalar_one_or_none()
+
+
+def _store_template(db: Session, key: tuple, body: str, expires_at: datetime) -> None:
+    status, tone, locale, version = key
+    stmt = insert(models.EmailCopyTemplate).values(
+        status=status,
+        tone=tone,
+        locale=locale,
+        version=version,
+        body=body,
+        created_at=datetime.utcnow(),
+        expires_at=expires_at,
+    )
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["status", "tone", "locale", "version"],
+            set_={
+                "body": stmt.excluded.body,
+                "created_at": stmt.excluded.created_at,
+                "expires_at": stmt.excluded.expires_at,
+            },
+        )
+    )
+
+
+def get_copy_template(
+    status: str,
+    tone: str | None = None,
+    locale: str | None = None,
+) -> str | None:
+    """
+    Template for ``(status, tone, locale)``: from memory, then the
+    ``email_copy_templates`` table, then one Gemini call. Returns None when
+    no valid template is available. The table is read and written in short
+    sessions of its own; no connection is held during the Gemini call, so
+    callers waiting on the per-key lock never wait on the database.
+    """
+    key = (
+        status.lower(),
+        tone or settings.email_tone,
+        locale or settings.email_locale,
+        COPY_TEMPLATE_VERSION,
+    )
+    hit = _copy_cache.get(key)
+    if hit is not None and hit[1] > time.monotonic():
+        return hit[0]
+    if not settings.gemini_api_key:
+        return None
+
+    with _copy_locks_guard:
+        lock = _copy_locks.setdefault(key, threading.Lock())
+    with lock:
+        hit = _copy_cache.get(key)
+        if hit is not None and hit[1] > time.monotonic():
+            return hit[0]
+
+        with SessionLocal() as session:
+            row = _load_template(session, key)
+            stored = (row.body, row.expires_at) if row is not None else None
+        if stored is not None:
+            template = stored[0]
+            ttl = (stored[1] - datetime.utcnow()).total_seconds()
+        else:
+            prompt = _template_prompt(key[0], key[1], key[2])
+            text = generate_email_content(prompt)
+            if text != prompt and _valid_template(text):
+                template = text.strip()
+                ttl = settings.gemini_template_ttl_hours * 3600
+                with SessionLocal() as session:
+                    _store_template(
+                        session, key, template,
+                        datetime.utcnow() + timedelta(seconds=ttl),
+                    )
+                    session.commit()
+                print(f"✓ Cached order email template for {key[:3]}")
+            else:
+                template, ttl = None, _RETRY_SECONDS
+        _copy_cache[key] = (template, time.monotonic() + ttl)
+        return template
+
+
+def fill_copy_template(template: str, fields: dict[str, str]) -> str:
+    return _PLACEHOLDER.sub(lambda m: fields.get(m.group(1), ""), template)
 
 
 def generate_order_status_email(
@@ -51,60 +383,33 @@ def generate_order_status_email(
     items_summary: str | None = None,
 ) -> str:
     """
-    Generate professional order status email content using Gemini.
+    Order status email body: the cached Gemini template for the status,
+    filled locally with the order fields, or the built-in copy.
     """
-    status_messages = {
-        "placed": "Your order has been successfully placed!",
-        "processing": "We're preparing your order for dispatch.",
-        "dispatched": "Great news! Your order has been dispatched.",
-        "delivered": "Your order has been delivered successfully!",
-        "cancelled": "Your order has been cancelled.",
-    }
-
-    status_msg = status_messages.get(status.lower(), "Your order status has been updated.")
-
+    status_msg = status_message(status)
     time_str = status_change_time.strftime("%d %B %Y at %I:%M %p")
 
-    prompt = f"""Write a professional, friendly email to customer {customer_name} about their order #{order_id}.
+    template = get_copy_template(status)
+    if template is not None:
+        return fill_copy_template(
+            template,
+            {
+                "customer_name": customer_name,
+                "order_id": str(order_id),
+                "status_time": time_str,
+                "expected_delivery": expected_delivery or "to be confirmed",
+                "total_amount": f"₹{total_amount:.2f}" if total_amount else "",
+                "items_summary": items_summary or "",
+            },
+        )
 
-Status: {status.upper()}
-Status Message: {status_msg}
-Status Changed On: {time_str}
-{f'Expected Delivery: {expected_delivery}' if expected_delivery else ''}
-{f'Total Amount: ₹{total_amount:.2f}' if total_amount else ''}
-{f'Items: {items_summary}' if items_summary else ''}
-
-Write a warm, professional email that:
-1. Addresses the customer by name
-2. Clearly states the order status and what it means
-3. Includes the date and time of the status change
-4. {f'Mentions expected delivery date: {expected_delivery}' if expected_delivery else 'Mentions delivery timeline'}
-5. {f'Includes order total: ₹{total_amount:.2f}' if total_amount else ''}
-6. Provides next steps or reassurance
-7. Ends with a thank you message
-
-Keep it concise, professional, and customer-friendly. Return only the email body text (no subject line)."""
-
-    content = generate_email_content(prompt)
-
-    # Fallback if Gemini fails
-    if content == prompt or not content:
-        content = f"""
-Dear {customer_name},
-
-{status_msg}
-
-Order Details:
-- Order ID: #{order_id}
-- Status: {status.upper()}
-- Status Updated: {time_str}
-{f'- Expected Delivery: {expected_delivery}' if expected_delivery else ''}
-{f'- Total Amount: ₹{total_amount:.2f}' if total_amount else ''}
-
-Thank you for your business!
-
-Best regards,
-Small Scale Business Automation Team
-"""
-
-    return content
+    return render(
+        "order_status.txt",
+        customer_name=customer_name,
+        status_message=status_msg,
+        order_id=order_id,
+        status=status,
+        status_time=time_str,
+        expected_delivery=expected_delivery,
+        total_amount=total_amount,
+    )
@@ -1,8 +1,47 @@
 """
 Geocoding utilities for address parsing and delivery calculations.
+
+Addresses are resolved offline against a gazetteer: the bundled
+``data/gazetteer_in.csv`` (states and union territories, major cities with
+their common alternate names, and PIN prefixes) plus, when
+``gazetteer_path`` is set, the India Post All-India Pincode Directory CSV,
+which adds a centroid for every PIN code and district.
+
+Place names are found with an Aho-Corasick automaton compiled over every
+name in the gazetteer, so a lookup is one pass over the address however
+many names are loaded. A six-digit PIN wins; otherwise the most specific
+name consistent with the PIN prefix or a named state, then the PIN
+prefix, then a state name. Results are memoized per normalized address.
+
+Delivery ETAs come from the great-circle distance between the shop and the
+destination. Distances from the shop to every six-digit PIN (through its
+own centroid or its 3/2-digit prefix) are computed once per gazetteer load
+with a vectorized haversine into ``PinDistanceTable``, so an order with a
+PIN costs one array read; ``delivery_band_km`` / ``delivery_band_days``
+turn distance into days.
+
+The directory is not vendored (about 155k rows, republished monthly).
+Fetch it once and point ``gazetteer_path`` at the result::
+
+    python -m backend.utils_geocoding fetch <directory CSV URL> [--out PATH]
 """
-from datetime import datetime, timedelta
+import argparse
+import csv
+import gzip
+import io
+import os
 import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Iterable, Iterator, NamedTuple
+
+import httpx
+import numpy as np
+
+from .settings import settings
 
 
 # Shop location: Jaipur, Rajasthan
@@ -11,71 +50,490 @@ SHOP_LNG = 75.7873
 SHOP_CITY = "Jaipur"
 SHOP_STATE = "Rajasthan"
 
+BUNDLED_GAZETTEER = os.path.join(os.path.dirname(__file__), "data", "gazetteer_in.csv")
 
-def parse_address_for_coords(address: str | None) -> tuple[float | None, float | None]:
+# Name kinds, most specific first
+KIND_RANK = {"city": 0, "district": 1, "state": 2}
+
+# A place name followed by one of these is part of a street name ("Delhi
+# Road, Meerut") and only counts when nothing else in the address matched
+STREET_WORDS = frozenset({
+    "road", "rd", "marg", "street", "st", "lane", "path", "highway", "hwy",
+    "bypass", "gate", "chowk",
+})
+
+# Rough bounding box of India; directory rows outside it are bad data
+_LAT_RANGE = (6.0, 37.5)
+_LNG_RANGE = (68.0, 97.5)
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+class Place(NamedTuple):
+    name: str
+    kind: str  # state | city | district | pin
+    state: str
+    pincode: str | None
+    lat: float
+    lng: float
+
+
+def normalize_address(address: str) -> str:
+    """Lowercased words separated by single spaces, padded with one space each side."""
+    text = address.lower().replace("&", " and ")
+    return " " + " ".join(re.findall(r"[a-z0-9]+", text)) + " "
+
+
+_PIN = re.compile(r"(?<![0-9])([1-9][0-9]{2}) ?([0-9]{3})(?![0-9])")
+# A directory's PIN column, whole
+_DIRECTORY_PIN = re.compile(r"[1-9][0-9]{5}")
+
+
+def _pin_in(normalized: str) -> str | None:
+    """The last six-digit PIN in a normalized address ("302 017" included)."""
+    found = _PIN.findall(normalized)
+    return "".join(found[-1]) if found else None
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance in km; accepts scalars or NumPy arrays."""
+    lat1, lng1, lat2, lng2 = (np.radians(v) for v in (lat1, lng1, lat2, lng2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+class AhoCorasick:
+    """Finds every occurrence of every pattern in a single pass over the text."""
+
+    def __init__(self, patterns: Iterable[str]):
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[tuple[int, ...]] = [()]
+        for pattern_id, pattern in enumerate(patterns):
+            node = 0
+            for ch in pattern:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                node = nxt
+            self._out[node] += (pattern_id,)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] += self._out[self._fail[child]]
+
+    def __len__(self) -> int:
+        return len(self._goto)
+
+    def find(self, text: str) -> Iterator[tuple[int, int]]:
+        """``(end_index, pattern_id)`` for each match, in text order."""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for pattern_id in out[node]:
+                yield i, pattern_id
+
+
+def _open_text(path: str):
+    if path.endswith(".gz"):
+        return io.TextIOWrapper(gzip.open(path, "rb"), encoding="utf-8-sig", newline="")
+    return open(path, encoding="utf-8-sig", newline="")
+
+
+def _coords(lat: str, lng: str) -> tuple[float, float] | None:
+    try:
+        lat_f, lng_f = float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None
+    if _LAT_RANGE[0] <= lat_f <= _LAT_RANGE[1] and _LNG_RANGE[0] <= lng_f <= _LNG_RANGE[1]:
+        return lat_f, lng_f
+    return None
+
+
+class Gazetteer:
+    def __init__(self):
+        self.places: list[Place] = []
+        self.by_pin: dict[str, int] = {}
+        self._names: dict[str, list[int]] = {}
+        self._states: dict[str, str] = {}
+        self._patterns: list[str] = []
+        self._matcher = AhoCorasick([])
+        self.distances: "PinDistanceTable | None" = None
+
+    def _add(self, place: Place, names: Iterable[str] = (), pins: Iterable[str] = ()) -> None:
+        index = len(self.places)
+        self.places.append(place)
+        for name in names:
+            key = normalize_address(name)
+            if key.strip():
+                self._names.setdefault(key, []).append(index)
+        for pin in pins:
+            # First entry for a PIN or prefix wins
+            self.by_pin.setdefault(pin, index)
+
+    def _state_name(self, name: str) -> str:
+        """The gazetteer's spelling of a state (directories use upper case)."""
+        return self._states.get(normalize_address(name), name.strip().title())
+
+    def load_bundled(self, path: str) -> None:
+        with _open_text(path) as f:
+            for row in csv.DictReader(f):
+                coords = _coords(row["lat"], row["lng"])
+                if coords is None:
+                    continue
+                aliases = [a for a in (row.get("aliases") or "").split("|") if a]
+                pins = [p for p in (row.get("pincode") or "").split("|") if p]
+                place = Place(row["name"], row["kind"], row["state"], pins[0] if pins else None, *coords)
+                if row["kind"] == "state":
+                    for name in [row["name"], *aliases]:
+                        self._states[normalize_address(name)] = row["state"]
+                self._add(place, [row["name"], *aliases], pins)
+
+    def load_india_post(self, path: str) -> None:
+        """
+        Add PIN and district centroids from the India Post directory (one
+        row per post office; averaged per PIN code and per district). Rows
+        without a six-digit PIN or usable coordinates are skipped.
+        """
+        # [lat sum, lng sum, offices, state] per PIN and per district
+        pins: dict[str, list] = {}
+        districts: dict[tuple[str, str], list] = {}
+        with _open_text(path) as f:
+            reader = csv.reader(f)
+            header = [h.strip().lower() for h in next(reader)]
+
+            def column(*names: str) -> int:
+                for name in names:
+                    if name in header:
+                        return header.index(name)
+                raise ValueError(f"{path}: no {names[0]} column")
+
+            i_pin = column("pincode")
+            i_district = column("districtname", "district")
+            i_state = column("statename", "state")
+            i_lat = column("latitude")
+            i_lng = column("longitude")
+            for row in reader:
+                pin = row[i_pin].strip()
+                coords = _coords(row[i_lat], row[i_lng])
+                if coords is None or not _DIRECTORY_PIN.fullmatch(pin):
+                    continue
+                state = self._state_name(row[i_state])
+                for acc, key in (
+                    (pins, pin),
+                    (districts, (row[i_district].strip().title(), state)),
+                ):
+                    entry = acc.get(key)
+                    if entry is None:
+                        entry = acc[key] = [0.0, 0.0, 0, state]
+                    entry[0] += coords[0]
+                    entry[1] += coords[1]
+                    entry[2] += 1
+        for pin, (lat, lng, n, state) in pins.items():
+            self._add(Place(pin, "pin", state, pin, lat / n, lng / n), pins=[pin])
+        for (district, _), (lat, lng, n, state) in districts.items():
+            self._add(Place(district, "district", state, None, lat / n, lng / n), names=[district])
+
+    def compile(self) -> None:
+        self._patterns = list(self._names)
+        self._matcher = AhoCorasick(self._patterns)
+
+    def lookup(self, normalized: str) -> Place | None:
+        pin_place = None
+        pin = _pin_in(normalized)
+        if pin:
+            if pin in self.by_pin:
+                return self.places[self.by_pin[pin]]
+            for prefix in (pin[:3], pin[:2]):
+                if prefix in self.by_pin:
+                    pin_place = self.places[self.by_pin[prefix]]
+                    break
+
+        # Matched spans; a name inside a longer matched name ("jammu" in
+        # "jammu and kashmir") does not count on its own.
+        spans = [
+            (end - len(self._patterns[pattern_id]) + 1, end, pattern_id)
+            for end, pattern_id in self._matcher.find(normalized)
+        ]
+        spans = [
+            (start, end, pid)
+            for start, end, pid in spans
+            if not any(s <= start and end <= e and (s, e) != (start, end) for s, e, _ in spans)
+        ]
+        # Patterns end with the padding space: the next word starts after it
+        places_named = [
+            span for span in spans
+            if normalized[span[1] + 1:].split(" ", 1)[0] not in STREET_WORDS
+        ]
+        spans = places_named or spans
+        places = self.places
+        candidates = [
+            (index, end) for _, end, pid in spans for index in self._names[self._patterns[pid]]
+        ]
+        named_states = [c for c in candidates if places[c[0]].kind == "state"]
+        local = [c for c in candidates if places[c[0]].kind != "state"]
+        if pin_place is not None:
+            states = {pin_place.state}
+        else:
+            states = {places[i].state for i, _ in named_states}
+        if states:
+            local = [c for c in local if places[c[0]].state in states]
+
+        if local:
+            # The city the PIN prefix belongs to, else the most specific
+            # kind, else the last one named (addresses end with the city)
+            index, _ = min(
+                local,
+                key=lambda c: (places[c[0]] is not pin_place, KIND_RANK.get(places[c[0]].kind, 3), -c[1]),
+            )
+            return places[index]
+        if pin_place is not None:
+            return pin_place
+        if named_states:
+            return places[max(named_states, key=lambda c: c[1])[0]]
+        return None
+
+
+class PinDistanceTable:
+    """
+    Distance and delivery days from one origin to every six-digit PIN,
+    indexed by ``pin - 100000``. PINs without a centroid of their own take
+    their 3-digit, then 2-digit, prefix's.
+    """
+
+    FIRST_PIN = 100000
+    UNKNOWN = np.iinfo(np.uint16).max
+
+    def __init__(self, gazetteer: Gazetteer, origin_lat: float, origin_lng: float,
+                 band_km: list[float], band_days: list[int]):
+        if len(band_days) != len(band_km) + 1:
+            raise ValueError("delivery_band_days needs one more entry than delivery_band_km")
+        if any(b <= a for a, b in zip(band_km, band_km[1:])):
+            raise ValueError("delivery_band_km must be strictly increasing")
+        self.band_km = np.asarray(band_km, dtype=np.float64)
+        self.band_days = np.asarray(band_days, dtype=np.uint8)
+
+        keys = sorted(gazetteer.by_pin, key=len)  # prefixes first, exact PINs last
+        places = [gazetteer.places[gazetteer.by_pin[k]] for k in keys]
+        lat = np.fromiter((p.lat for p in places), dtype=np.float64, count=len(places))
+        lng = np.fromiter((p.lng for p in places), dtype=np.float64, count=len(places))
+        distances = np.minimum(
+            np.ceil(haversine_km(origin_lat, origin_lng, lat, lng)), self.UNKNOWN - 1
+        ).astype(np.uint16)
+
+        self.km = np.full(900000, self.UNKNOWN, dtype=np.uint16)
+        exact = np.fromiter((len(k) == 6 for k in keys), dtype=bool, count=len(keys))
+        for key, km in zip(keys, distances[~exact]):
+            # A k-digit prefix covers a block of 10**(6 - k) PINs
+            span = 10 ** (6 - len(key))
+            first = int(key) * span - self.FIRST_PIN
+            if first >= 0:
+                self.km[first:first + span] = km
+        pins = np.array([int(k) for k, e in zip(keys, exact) if e], dtype=np.int64)
+        self.km[pins - self.FIRST_PIN] = distances[exact]
+        known = self.km != self.UNKNOWN
+        self.days = np.full(self.km.shape, self.band_days[-1], dtype=np.uint8)
+        self.days[known] = self.band_days[np.searchsorted(self.band_km, self.km[known], side="left")]
+
+    def km_to_pin(self, pin: str) -> int | None:
+        km = int(self.km[int(pin) - self.FIRST_PIN])
+        return None if km == self.UNKNOWN else km
+
+    def days_for_pin(self, pin: str) -> int | None:
+        index = int(pin) - self.FIRST_PIN
+        if self.km[index] == self.UNKNOWN:
+            return None
+        return int(self.days[index])
+
+    def days_for_km(self, km: float) -> int:
+        return int(self.band_days[np.searchsorted(self.band_km, km, side="left")])
+
+
+# The India Post directory columns the gazetteer reads, in fetch's output order
+DIRECTORY_COLUMNS = ("pincode", "districtname", "statename", "latitude", "longitude")
+DEFAULT_DIRECTORY_PATH = "./data/gazetteer/india_post.csv.gz"
+
+
+def compact_india_post(src: str, out_path: str) -> int:
     """
-    Simple address parsing to extract approximate coordinates.
-    For production, use a proper geocoding API (Google Maps, OpenStreetMap).
+    Copy the rows of an India Post directory CSV (.csv or .csv.gz) that have
+    a valid PIN and usable coordinates to a gzipped CSV of ``DIRECTORY_COLUMNS``; returns
+    the number of rows written.
     """
+    with _open_text(src) as f:
+        reader = csv.reader(f)
+        header = [h.strip().lower() for h in next(reader)]
+        aliases = {"districtname": ("districtname", "district"), "statename": ("statename", "state")}
+        index = []
+        for name in DIRECTORY_COLUMNS:
+            found = next((header.index(a) for a in aliases.get(name, (name,)) if a in header), None)
+            if found is None:
+                raise ValueError(f"{src}: no {name} column")
+            index.append(found)
+        os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+        tmp = f"{out_path}.tmp"
+        written = 0
+        with gzip.open(tmp, "wt", encoding="utf-8", newline="") as out:
+            writer = csv.writer(out)
+            writer.writerow(DIRECTORY_COLUMNS)
+            for row in reader:
+                if len(row) < len(header):
+                    continue
+                values = [row[i].strip() for i in index]
+                if _coords(values[3], values[4]) is None or not _DIRECTORY_PIN.fullmatch(values[0]):
+                    continue
+                writer.writerow(values)
+                written += 1
+    os.replace(tmp, out_path)
+    return written
+
+
+def fetch_india_post(url: str, out_path: str = DEFAULT_DIRECTORY_PATH, timeout: float = 120.0) -> int:
+    """
+    Download the All-India Pincode Directory CSV from ``url`` (e.g. the CSV
+    export of the data.gov.in dataset) and store its compacted form at
+    ``out_path``; returns the number of rows kept.
+    """
+    download = f"{out_path}.download"
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    try:
+        with httpx.stream("GET", url, timeout=timeout, follow_redirects=True) as resp:
+            resp.raise_for_status()
+            with open(download, "wb") as f:
+                for chunk in resp.iter_bytes():
+                    f.write(chunk)
+        with open(download, "rb") as f:
+            gzipped = f.read(2) == b"\x1f\x8b"
+        if gzipped:
+            os.replace(download, download + ".gz")
+            download += ".gz"
+        return compact_india_post(download, out_path)
+    finally:
+        if os.path.exists(download):
+            os.remove(download)
+
+
+_gazetteer: Gazetteer | None = None
+_load_lock = threading.Lock()
+
+
+def load_gazetteer(path: str | None = None) -> Gazetteer:
+    """Load and compile the gazetteer (bundled data plus ``gazetteer_path``)."""
+    global _gazetteer
+    with _load_lock:
+        started = time.perf_counter()
+        gazetteer = Gazetteer()
+        gazetteer.load_bundled(BUNDLED_GAZETTEER)
+        extra = settings.gazetteer_path if path is None else path
+        if extra:
+            try:
+                gazetteer.load_india_post(extra)
+            except (OSError, ValueError) as e:
+                print(f"⚠ Gazetteer {extra} not loaded: {e}")
+        gazetteer.compile()
+        gazetteer.distances = PinDistanceTable(
+            gazetteer,
+            SHOP_LAT,
+            SHOP_LNG,
+            settings.delivery_band_km,
+            settings.delivery_band_days,
+        )
+        _gazetteer = gazetteer
+        _geocode_normalized.cache_clear()
+    print(
+        f"✓ Gazetteer loaded: {len(gazetteer.places)} place(s), "
+        f"{len(gazetteer._patterns)} name(s) in {time.perf_counter() - started:.2f}s"
+    )
+    return gazetteer
+
+
+def _get_gazetteer() -> Gazetteer:
+    return _gazetteer or load_gazetteer()
+
+
+@lru_cache(maxsize=settings.geocode_cache_size)
+def _geocode_normalized(normalized: str) -> Place | None:
+    return _get_gazetteer().lookup(normalized)
+
+
+def geocode(address: str | None) -> Place | None:
+    """Best gazetteer match for a free-text address, or None."""
     if not address:
-        return None, None
+        return None
+    return _geocode_normalized(normalize_address(address))
 
-    # Try to extract common patterns
-    # This is a simplified version; in production use a geocoding API
-    address_lower = address.lower()
 
-    # Common city coordinates (approximate)
-    city_coords = {
-        "jaipur": (26.9124, 75.7873),
-        "delhi": (28.6139, 77.2090),
-        "mumbai": (19.0760, 72.8777),
-        "bangalore": (12.9716, 77.5946),
-        "kolkata": (22.5726, 88.3639),
-        "chennai": (13.0827, 80.2707),
-        "hyderabad": (17.3850, 78.4867),
-        "pune": (18.5204, 73.8567),
-        "ahmedabad": (23.0225, 72.5714),
-        "surat": (21.1702, 72.8311),
-    }
+def parse_address_for_coords(address: str | None) -> tuple[float | None, float | None]:
+    """
+    Approximate coordinates of an address from the gazetteer; (None, None)
+    when nothing in it is recognised.
+    """
+    place = geocode(address)
+    if place is None:
+        return None, None
+    return place.lat, place.lng
 
-    for city, (lat, lng) in city_coords.items():
-        if city in address_lower:
-            return lat, lng
 
-    # Default: return Jaipur coordinates if no match
-    return SHOP_LAT, SHOP_LNG
+def delivery_days(address: str | None) -> int:
+    """Days to deliver to ``address`` by its distance from the shop."""
+    distances = _get_gazetteer().distances
+    if address:
+        normalized = normalize_address(address)
+        pin = _pin_in(normalized)
+        days = distances.days_for_pin(pin) if pin else None
+        if days is not None:
+            return days
+        place = _geocode_normalized(normalized)
+        if place is not None:
+            return distances.days_for_km(haversine_km(SHOP_LAT, SHOP_LNG, place.lat, place.lng))
+    # Unknown destination: the slowest band
+    return int(distances.band_days[-1])
 
 
 def calculate_expected_delivery(
     order_date: datetime, address: str | None
 ) -> tuple[datetime, str]:
     """
-    Calculate expected delivery date (max 5 days from order date).
+    Calculate expected delivery date from the distance to the address.
     Returns (delivery_datetime, formatted_string).
     """
-    base_days = 2  # Minimum 2 days
-    max_days = 5
-
-    # Simple logic: if address contains certain keywords, add days
-    if address:
-        address_lower = address.lower()
-        if any(
-            keyword in address_lower
-            for keyword in ["remote", "rural", "village", "taluka"]
-        ):
-            delivery_days = max_days
-        elif any(keyword in address_lower for keyword in ["metro", "city"]):
-            delivery_days = base_days + 1
-        else:
-            delivery_days = base_days + 2
-    else:
-        delivery_days = base_days + 2
-
-    delivery_days = min(delivery_days, max_days)
-    delivery_date = order_date + timedelta(days=delivery_days)
+    delivery_date = order_date + timedelta(days=delivery_days(address))
 
     # Format: "DD MMM YYYY, HH:MM AM/PM"
     formatted = delivery_date.strftime("%d %b %Y, %I:%M %p")
 
     return delivery_date, formatted
 
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python -m backend.utils_geocoding",
+        description="Fetch the India Post directory for the gazetteer.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    fetch = commands.add_parser("fetch", help="download and compact the directory CSV")
+    fetch.add_argument("url", help="URL of the All-India Pincode Directory CSV (.csv or .csv.gz)")
+    fetch.add_argument("--out", default=DEFAULT_DIRECTORY_PATH)
+    args = parser.parse_args()
+
+    rows = fetch_india_post(args.url, args.out)
+    load_gazetteer(args.out)
+    print(f"✓ {rows} post office row(s) written to {args.out}; set GAZETTEER_PATH={args.out}")
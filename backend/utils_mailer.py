@@ -0,0 +1,169 @@
+"""
+Long-lived SMTP dispatcher.
+
+Messages are handed over from any thread (BackgroundTasks workers, the
+scheduler, request handlers) and sent from one event loop running on a
+dedicated thread. A few worker coroutines each keep an authenticated SMTP
+connection open between messages, so the TCP, STARTTLS and AUTH handshake
+is paid once per connection instead of once per email. Idle connections are
+kept alive with NOOP and reopened when the server has dropped them.
+"""
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from email.message import Message
+from typing import Any, Callable
+
+import aiosmtplib
+
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class MailDispatcher:
+    def __init__(
+        self,
+        connect_kwargs: Callable[[], dict[str, Any]],
+        pool_size: int = 3,
+        keepalive_seconds: float = 60.0,
+    ):
+        self.connect_kwargs = connect_kwargs
+        self.pool_size = max(pool_size, 1)
+        self.keepalive_seconds = keepalive_seconds
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._queue: asyncio.Queue | None = None
+        self._thread: threading.Thread | None = None
+        self._workers: list[asyncio.Task] = []
+        self._ready = threading.Event()
+        self.sent = 0
+        self.failed = 0
+        self.connects = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._ready.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="mail-dispatcher", daemon=True
+        )
+        self._thread.start()
+        self._ready.wait()
+        print(f"✓ Mail dispatcher started ({self.pool_size} SMTP connection(s))")
+
+    def _run(self) -> None:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._workers = [
+            loop.create_task(self._worker(i)) for i in range(self.pool_size)
+        ]
+        loop.call_soon(self._ready.set)
+        try:
+            loop.run_until_complete(asyncio.gather(*self._workers))
+        finally:
+            loop.close()
+            self._loop = None
+
+    def submit(self, msg: Message) -> Future:
+        """Queue ``msg`` from any thread; the future resolves once it is sent."""
+        future: Future = Future()
+        loop = self._loop
+        if loop is None or not self.running:
+            future.set_exception(RuntimeError("Mail dispatcher is not running"))
+            return future
+        loop.call_soon_threadsafe(self._queue.put_nowait, (msg, future))
+        return future
+
+    async def send(self, msg: Message) -> None:
+        """Await delivery of ``msg`` from another event loop."""
+        await asyncio.wrap_future(self.submit(msg))
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        smtp = aiosmtplib.SMTP(**self.connect_kwargs())
+        await smtp.connect()
+        self.connects += 1
+        return smtp
+
+    @staticmethod
+    async def _close(smtp: aiosmtplib.SMTP | None) -> None:
+        if smtp is None or not smtp.is_connected:
+            return
+        try:
+            await smtp.quit()
+        except Exception:
+            smtp.close()
+
+    async def _worker(self, index: int) -> None:
+        smtp: aiosmtplib.SMTP | None = None
+        while True:
+            try:
+                item = await asyncio.wait_for(
+                    self._queue.get(), timeout=self.keepalive_seconds
+                )
+            except asyncio.TimeoutError:
+                # Idle: keep the session warm, or drop it if the server went away
+                if smtp is not None and smtp.is_connected:
+                    try:
+                        await smtp.noop()
+                    except Exception:
+                        smtp.close()
+                        smtp = None
+                continue
+            if item is _STOP:
+                await self._close(smtp)
+                return
+            msg, future = item
+            if future.set_running_or_notify_cancel():
+                try:
+                    smtp = await self._deliver(smtp, msg)
+                    self.sent += 1
+                    future.set_result(None)
+                except Exception as e:
+                    self.failed += 1
+                    logger.error(f"SMTP worker {index} send error: {e}")
+                    future.set_exception(e)
+
+    async def _deliver(
+        self, smtp: aiosmtplib.SMTP | None, msg: Message
+    ) -> aiosmtplib.SMTP:
+        """Send on the pooled connection, reconnecting once if it was dropped."""
+        for attempt in range(2):
+            if smtp is None or not smtp.is_connected:
+                smtp = await self._connect()
+            try:
+                await smtp.send_message(msg)
+                return smtp
+            except (aiosmtplib.SMTPServerDisconnected, ConnectionError):
+                smtp.close()
+                smtp = None
+                if attempt:
+                    raise
+        return smtp
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """Drain queued messages, close the connections and stop the loop."""
+        loop = self._loop
+        if loop is None or not self.running:
+            return
+        for _ in self._workers:
+            loop.call_soon_threadsafe(self._queue.put_nowait, _STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "pool_size": self.pool_size,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "sent": self.sent,
+            "failed": self.failed,
+            "connects": self.connects,
+        }
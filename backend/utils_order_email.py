@@ -0,0 +1,92 @@
+"""
+Customer emails about order status changes.
+
+The order change commits only a short outbox row (recipient, subject, order
+id and the status it announces); the body and e-bill are composed by the
+outbox worker at send time. Rendering the PDF and asking Gemini for copy
+can take seconds, and doing either inside the order transaction would keep
+SQLite's write lock for that long. The attached e-bill is the order's as it
+is when the email goes out.
+"""
+from datetime import datetime
+
+from sqlalchemy.orm import Session
+
+from . import crud, models
+from .database import SessionLocal
+from .utils_ebill import ebill_filename, ebill_order_dict, get_or_render_ebill
+from .utils_gemini import generate_order_status_email
+from .utils_outbox import enqueue_email
+from .utils_templates import render
+
+
+STATUS_SUBJECTS = {
+    "placed": "Order #{id} Confirmation - E-Bill Attached",
+    "processing": "Order #{id} is Being Processed - E-Bill Attached",
+    "dispatched": "Order #{id} Has Been Dispatched - E-Bill Attached",
+    "delivered": "Order #{id} Delivered Successfully - E-Bill Attached",
+    "cancelled": "Order #{id} Cancellation Notice - E-Bill Attached",
+}
+
+
+def _status_value(status) -> str:
+    return status.value if hasattr(status, "value") else str(status)
+
+
+def items_summary(order: models.Order) -> str:
+    return ", ".join(
+        f"{oi.item.name if oi.item else f'Item {oi.item_id}'} (×{oi.quantity})"
+        for oi in order.items
+    )
+
+
+def enqueue_order_email(db: Session, order: models.Order) -> models.EmailOutbox:
+    """Queue the customer email for the order's current status, in the caller's transaction."""
+    status = _status_value(order.status).lower()
+    subject = STATUS_SUBJECTS.get(
+        status, f"Order #{{id}} {status.capitalize()} - E-Bill Attached"
+    ).format(id=order.id)
+    row = enqueue_email(
+        db,
+        subject,
+        order.customer.email,
+        "",
+        attachment_filename=ebill_filename(order.id),
+    )
+    row.order_id = order.id
+    row.order_status = status
+    return row
+
+
+def compose_order_email(
+    order_id: int, status: str, changed_at: datetime
+) -> tuple[str, str] | None:
+    """
+    ``(body_html, e-bill path)`` for a queued order email, or None when the
+    order no longer exists. Blocking: called from a worker thread.
+    """
+    db = SessionLocal()
+    try:
+        order = crud.get_order_with_details(db, order_id)
+        if order is None:
+            return None
+        order_dict = ebill_order_dict(db, order)
+        fields = {
+            "customer_name": order.customer.name,
+            "order_id": order.id,
+            "total_amount": order.total_amount,
+            "items_summary": items_summary(order),
+            "expected_delivery": (
+                order.expected_delivery_date.strftime("%d %b %Y, %I:%M %p")
+                if order.expected_delivery_date else None
+            ),
+        }
+    finally:
+        # Nothing below needs the database: release the connection first
+        db.close()
+
+    _, ebill_file = get_or_render_ebill(order_dict)
+    content = generate_order_status_email(
+        status=status, status_change_time=changed_at, **fields
+    )
+    return render("order_customer.html", content=content), ebill_file
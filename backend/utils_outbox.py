@@ -0,0 +1,379 @@
+"""
+Durable email outbox.
+
+Order emails are written to ``email_outbox`` in the same transaction as the
+order change, so they survive SMTP outages and restarts. The worker claims
+due rows in batches with a single guarded UPDATE (a stale claim is taken
+over once its lease runs out), sends them and records the outcome: failures
+are retried with exponential backoff and moved to the dead-letter state
+(``status = 'dead'``) after ``outbox_max_attempts``.
+
+Attachments are referenced, never stored inline: either a file owned by
+another store (``attachment_path``, e.g. a stored e-bill) or bytes written
+once to the outbox directory under their SHA-256 digest. Either way they
+are read back at send time, so retries do not keep PDFs in memory. Order
+status emails (rows with an ``order_id``) are composed at send time too,
+see ``utils_order_email``.
+"""
+import asyncio
+import hashlib
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from sqlalchemy import select, update, delete, func, or_, and_
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal, engine
+from .settings import settings
+from .utils_email import send_email_async, send_email_with_pdf_async
+
+
+Outbox = models.EmailOutbox
+
+
+def _attachment_path(digest: str) -> str:
+    return os.path.join(settings.outbox_dir, digest)
+
+
+def store_attachment(data: bytes) -> str:
+    """Write ``data`` under its digest (once) and return the digest."""
+    digest = hashlib.sha256(data).hexdigest()
+    path = _attachment_path(digest)
+    if not os.path.exists(path):
+        os.makedirs(settings.outbox_dir, exist_ok=True)
+        tmp = f"{path}.{uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    return digest
+
+
+def _read_attachment(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def enqueue_email(
+    db: Session,
+    subject: str,
+    to_email: str,
+    body_html: str,
+    body_text: str | None = None,
+    attachment: bytes | None = None,
+    attachment_filename: str | None = None,
+    attachment_path: str | None = None,
+) -> models.EmailOutbox:
+    """Add an email to the outbox; it is sent once the caller commits."""
+    row = Outbox(
+        to_email=to_email,
+        subject=subject,
+        body_html=body_html,
+        body_text=body_text,
+        attachment_digest=store_attachment(attachment) if attachment else None,
+        attachment_path=attachment_path,
+        attachment_filename=attachment_filename,
+    )
+    db.add(row)
+    return row
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Delay before retry number ``attempts`` (exponential, jittered)."""
+    delay = min(
+        settings.outbox_backoff_base_seconds * 2 ** (attempts - 1),
+        settings.outbox_backoff_max_seconds,
+    )
+    return delay * random.uniform(0.5, 1.0)
+
+
+def claim_batch(limit: int) -> tuple[str, list]:
+    """Claim up to ``limit`` due rows; returns the claim id and the rows."""
+    now = datetime.utcnow()
+    claim_id = uuid4().hex
+    due = (
+        select(Outbox.id)
+        .where(
+            or_(
+                and_(Outbox.status == "pending", Outbox.next_attempt_at <= now),
+                and_(Outbox.status == "sending", Outbox.claimed_until <= now),
+            )
+        )
+        .order_by(Outbox.next_attempt_at)
+        .limit(limit)
+    )
+    with engine.begin() as conn:
+        conn.execute(
+            update(Outbox)
+            .where(Outbox.id.in_(due))
+            .values(
+                status="sending",
+                claim_id=claim_id,
+                claimed_until=now + timedelta(seconds=settings.outbox_lease_seconds),
+            )
+        )
+        rows = conn.execute(
+            select(
+                Outbox.id,
+                Outbox.to_email,
+                Outbox.subject,
+                Outbox.body_html,
+                Outbox.body_text,
+                Outbox.attachment_digest,
+                Outbox.attachment_path,
+                Outbox.attachment_filename,
+                Outbox.order_id,
+                Outbox.order_status,
+                Outbox.attempts,
+                Outbox.created_at,
+            ).where(Outbox.claim_id == claim_id)
+        ).all()
+    return claim_id, rows
+
+
+async def _send(row) -> str | None:
+    """Send one claimed row; returns the error message on failure."""
+    try:
+        body_html = row.body_html
+        path = row.attachment_path or (
+            _attachment_path(row.attachment_digest) if row.attachment_digest else None
+        )
+        if row.order_id is not None:
+            # Imported here: utils_order_email queues through this module
+            from .utils_order_email import compose_order_email
+
+            composed = await asyncio.to_thread(
+                compose_order_email, row.order_id, row.order_status, row.created_at
+            )
+            if composed is None:
+                return f"Order {row.order_id} no longer exists"
+            body_html, path = composed
+        if path:
+            data = await asyncio.to_thread(_read_attachment, path)
+            await send_email_with_pdf_async(
+                row.subject,
+                row.to_email,
+                body_html,
+                data,
+                row.attachment_filename or "attachment.pdf",
+                row.body_text,
+            )
+        else:
+            await send_email_async(
+                row.subject, row.to_email, body_html, row.body_text
+            )
+        return None
+    except Exception as e:
+        return str(e) or e.__class__.__name__
+
+
+def finish_batch(claim_id: str, rows: list, errors: list[str | None]) -> dict:
+    """Record send outcomes; only rows still held by ``claim_id`` are updated."""
+    now = datetime.utcnow()
+    sent_ids = [row.id for row, error in zip(rows, errors) if error is None]
+    dead = 0
+    with engine.begin() as conn:
+        if sent_ids:
+            conn.execute(
+                update(Outbox)
+                .where(Outbox.id.in_(sent_ids), Outbox.claim_id == claim_id)
+                .values(
+                    status="sent",
+                    sent_at=now,
+                    attempts=Outbox.attempts + 1,
+                    claim_id=None,
+                    claimed_until=None,
+                    last_error=None,
+                )
+            )
+        for row, error in zip(rows, errors):
+            if error is None:
+                continue
+            attempts = row.attempts + 1
+            if attempts >= settings.outbox_max_attempts:
+                dead += 1
+                values = {"status": "dead"}
+                print(f"❌ Email to {row.to_email} moved to dead letter after {attempts} attempt(s): {error}")
+            else:
+                values = {
+                    "status": "pending",
+                    "next_attempt_at": now + timedelta(seconds=backoff_seconds(attempts)),
+                }
+                print(f"⚠ Email to {row.to_email} failed (attempt {attempts}), will retry: {error}")
+            conn.execute(
+                update(Outbox)
+                .where(Outbox.id == row.id, Outbox.claim_id == claim_id)
+                .values(
+                    attempts=attempts,
+                    claim_id=None,
+                    claimed_until=None,
+                    last_error=error,
+                    **values,
+                )
+            )
+    return {"sent": len(sent_ids), "retry": len(rows) - len(sent_ids) - dead, "dead": dead}
+
+
+class OutboxWorker:
+    """Drains the outbox from the app's event loop; ``wake`` skips the poll wait."""
+
+    def __init__(self, poll_seconds: float = 2.0, batch_size: int = 50):
+        self.poll_seconds = poll_seconds
+        self.batch_size = batch_size
+        self._task: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wake: asyncio.Event | None = None
+
+    async def drain_once(self) -> int:
+        claim_id, rows = await asyncio.to_thread(claim_batch, self.batch_size)
+        if not rows:
+            return 0
+        semaphore = asyncio.Semaphore(max(settings.smtp_pool_size, 1))
+
+        async def _bounded(row):
+            async with semaphore:
+                return await _send(row)
+
+        errors = await asyncio.gather(*(_bounded(row) for row in rows))
+        await asyncio.to_thread(finish_batch, claim_id, rows, list(errors))
+        return len(rows)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                drained = await self.drain_once()
+            except Exception as e:
+                print(f"⚠ Outbox worker error: {e}")
+                drained = 0
+            if drained >= self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def wake(self) -> None:
+        """Thread-safe nudge after committing new outbox rows."""
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+            print("✓ Email outbox worker started")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._loop = None
+
+
+def purge_outbox() -> dict:
+    """
+    Delete sent rows past the retention window and attachment files that no
+    unsent row references (files younger than an hour are kept, as their
+    rows may not be committed yet), then the stale stored e-bills.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=settings.outbox_retention_days)
+    with engine.begin() as conn:
+        purged = conn.execute(
+            delete(Outbox).where(Outbox.status == "sent", Outbox.sent_at < cutoff)
+        ).rowcount
+        referenced = set(
+            conn.execute(
+                select(Outbox.attachment_digest)
+                .where(
+                    Outbox.status != "sent",
+                    Outbox.attachment_digest.is_not(None),
+                )
+                .distinct()
+            ).scalars()
+        )
+    removed = 0
+    if os.path.isdir(settings.outbox_dir):
+        young = time.time() - 3600
+        for name in os.listdir(settings.outbox_dir):
+            path = os.path.join(settings.outbox_dir, name)
+            if name.split(".")[0] in referenced or os.path.getmtime(path) > young:
+                continue
+            os.remove(path)
+            removed += 1
+    # Imported here: utils_ebill pulls in crud and the PDF renderer
+    from .utils_ebill import purge_ebills
+
+    ebills = purge_ebills()
+    print(f"✓ Outbox purge: {purged} sent row(s), {removed} attachment file(s), {ebills} stale e-bill(s)")
+    return {"rows": purged, "attachments": removed, "ebills": ebills}
+
+
+def outbox_stats() -> dict:
+    db: Session = SessionLocal()
+    try:
+        counts = dict(
+            db.execute(
+                select(Outbox.status, func.count(Outbox.id)).group_by(Outbox.status)
+            ).all()
+        )
+        oldest = db.execute(
+            select(func.min(Outbox.created_at)).where(Outbox.status == "pending")
+        ).scalar_one()
+        return {
+            "pending": counts.get("pending", 0),
+            "sending": counts.get("sending", 0),
+            "sent": counts.get("sent", 0),
+            "dead": counts.get("dead", 0),
+            "oldest_pending_at": oldest,
+        }
+    finally:
+        db.close()
+
+
+def list_dead_letters(limit: int = 100) -> list[dict]:
+    db: Session = SessionLocal()
+    try:
+        return [
+            {
+                "id": row.id,
+                "to_email": row.to_email,
+                "subject": row.subject,
+                "attempts": row.attempts,
+                "last_error": row.last_error,
+                "created_at": row.created_at,
+            }
+            for row in db.execute(
+                select(Outbox)
+                .where(Outbox.status == "dead")
+                .order_by(Outbox.id.desc())
+                .limit(limit)
+            ).scalars()
+        ]
+    finally:
+        db.close()
+
+
+def requeue_dead_letter(outbox_id: int) -> bool:
+    """Move a dead-lettered email back to pending with a fresh attempt budget."""
+    with engine.begin() as conn:
+        result = conn.execute(
+            update(Outbox)
+            .where(Outbox.id == outbox_id, Outbox.status == "dead")
+            .values(status="pending", attempts=0, next_attempt_at=datetime.utcnow())
+        )
+        return result.rowcount == 1
+
+
+outbox_worker = OutboxWorker(
+    poll_seconds=settings.outbox_poll_seconds,
+    batch_size=settings.outbox_batch_size,
+)
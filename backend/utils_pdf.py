@@ -1,170 +1,315 @@
+"""
+PDF layouts for e-bills and revenue reports.
+
+The static parts of a layout (headings, column titles, rules, summary
+labels) work as a page template: their content-stream operators are drawn
+once per process, cached in ``_fragments`` and copied into each page at
+the right offset, so a render only draws the variable text. That text is
+written through one text object per page rather than one per string.
+
+Form XObjects were the other option, but a form belongs to a single
+document and each one adds an object, a resource dictionary and a stream
+of its own; for one-page invoices that made the file larger, not smaller.
+"""
+import threading
 from io import BytesIO
-from datetime import datetime
+from typing import Callable
+
+from reportlab import rl_config
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import cm
 from reportlab.pdfgen import canvas
 
+from .settings import settings
+
+
+PAGE_WIDTH, PAGE_HEIGHT = A4
+
+# Used in this order in every document, so the internal font names (/F1,
+# /F2) baked into cached fragments are the same in each of them.
+_FONTS = ("Helvetica", "Helvetica-Bold")
+
+_fragments: dict[tuple, str] = {}
+
+# rl_config is process-wide; held while _save switches useA85
+_rl_config_lock = threading.Lock()
+
+
+def _new_canvas(buf: BytesIO) -> canvas.Canvas:
+    c = canvas.Canvas(buf, pagesize=A4)
+    for name in _FONTS:
+        c.setFont(name, 10)
+    return c
+
+
+def _save(c: canvas.Canvas) -> None:
+    """
+    Write the document with Flate-only streams: ASCII85 on top makes every
+    stream a quarter larger and is the slowest step of saving without
+    reportlab's C accelerators. Stream filters are chosen from
+    ``rl_config.useA85`` while saving, so it is switched for this save only
+    and other documents keep reportlab's default.
+    """
+    with _rl_config_lock:
+        previous = rl_config.useA85
+        rl_config.useA85 = 0
+        try:
+            c.save()
+        finally:
+            rl_config.useA85 = previous
+
+
+def _fragment(key: tuple, draw: Callable[[canvas.Canvas], None]) -> str:
+    """Content-stream operators of a static layout part, drawn on first use."""
+    ops = _fragments.get(key)
+    if ops is None:
+        scratch = _new_canvas(BytesIO())
+        # The canvas's pending operators (private; see test_pdf)
+        if not isinstance(scratch._code, list):
+            raise RuntimeError("reportlab Canvas._code is not a list of operators; update _fragment")
+        start = len(scratch._code)
+        draw(scratch)
+        ops = _fragments[key] = "\n".join(scratch._code[start:])
+    return ops
+
+
+def _place(c: canvas.Canvas, key: tuple, draw: Callable[[canvas.Canvas], None], y: float = 0.0) -> None:
+    """Copy the static part ``key`` into the page with its origin moved up to ``y``."""
+    c.saveState()
+    if y:
+        c.translate(0, y)
+    c.addLiteral(_fragment(key, draw))
+    c.restoreState()
+
+
+class _Text:
+    """Variable text of one page, emitted as a single text object."""
+
+    def __init__(self, c: canvas.Canvas):
+        self.canvas = c
+        self.text = c.beginText()
+        self.font = None
+        self.used = False
+
+    def put(self, x: float, y: float, value: str, font: tuple[str, float] = ("Helvetica", 10)) -> None:
+        if font != self.font:
+            self.text.setFont(*font)
+            self.font = font
+        self.text.setTextOrigin(x, y)
+        self.text.textOut(value)
+        self.used = True
+
+    def flush(self) -> None:
+        if self.used:
+            self.canvas.drawText(self.text)
+        self.text = self.canvas.beginText()
+        self.font = None
+        self.used = False
+
+
+def _report_breakdown_heading(c: canvas.Canvas) -> None:
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(2 * cm, 0, "Breakdown:")
+
 
 def generate_revenue_report_pdf(period_label: str, revenue: float, details: list[tuple[str, float]] | None = None) -> bytes:
     buf = BytesIO()
-    c = canvas.Canvas(buf, pagesize=A4)
-    width, height = A4
+    c = _new_canvas(buf)
+    height = PAGE_HEIGHT
+    text = _Text(c)
     y = height - 2 * cm
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(2 * cm, y, f"Revenue Report - {period_label}")
+    text.put(2 * cm, y, f"Revenue Report - {period_label}", ("Helvetica-Bold", 16))
     y -= 1.2 * cm
-    c.setFont("Helvetica", 12)
-    c.drawString(2 * cm, y, f"Total Revenue: ₹ {revenue:,.2f}")
+    text.put(2 * cm, y, f"Total Revenue: ₹ {revenue:,.2f}", ("Helvetica", 12))
     y -= 1.0 * cm
     if details:
-        c.setFont("Helvetica-Bold", 12)
-        c.drawString(2 * cm, y, "Breakdown:")
+        _place(c, ("report", "breakdown"), _report_breakdown_heading, y)
         y -= 0.8 * cm
-        c.setFont("Helvetica", 11)
         for label, amt in details:
             if y < 2 * cm:
+                text.flush()
                 c.showPage()
                 y = height - 2 * cm
-                c.setFont("Helvetica", 11)
-            c.drawString(2.5 * cm, y, f"- {label}: ₹ {amt:,.2f}")
+            text.put(2.5 * cm, y, f"- {label}: ₹ {amt:,.2f}", ("Helvetica", 11))
             y -= 0.6 * cm
+    text.flush()
     c.showPage()
-    c.save()
+    _save(c)
     pdf = buf.getvalue()
     buf.close()
     return pdf
 
 
+def _ebill_header(c: canvas.Canvas) -> None:
+    y = PAGE_HEIGHT - 2 * cm
+    c.setFont("Helvetica-Bold", 18)
+    c.drawString(2 * cm, y, "E-BILL / INVOICE")
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(2 * cm, y - 2.9 * cm, "Bill To:")
+
+
+def _ebill_table_head(c: canvas.Canvas) -> None:
+    c.setFont("Helvetica-Bold", 10)
+    c.drawString(2 * cm, 0, "Item")
+    c.drawString(8 * cm, 0, "Qty")
+    c.drawString(10 * cm, 0, "Price")
+    c.drawString(13 * cm, 0, "Disc%")
+    c.drawString(15 * cm, 0, "Total")
+    c.line(2 * cm, -0.6 * cm, 18 * cm, -0.6 * cm)
+
+
+def _ebill_summary_labels(has_discount: bool, half_rate: str) -> Callable[[canvas.Canvas], None]:
+    def draw(c: canvas.Canvas) -> None:
+        c.line(2 * cm, 0, 18 * cm, 0)
+        y = -0.5 * cm
+        c.setFont("Helvetica", 10)
+        c.drawString(12 * cm, y, "Subtotal:")
+        y -= 0.5 * cm
+        if has_discount:
+            c.drawString(12 * cm, y, "Discount:")
+            y -= 0.5 * cm
+        c.drawString(12 * cm, y, f"CGST{half_rate}:")
+        y -= 0.5 * cm
+        c.drawString(12 * cm, y, f"SGST{half_rate}:")
+        y -= 0.5 * cm
+        c.setFont("Helvetica-Bold", 12)
+        c.drawString(12 * cm, y, "Total Amount:")
+        y -= 1.0 * cm
+        c.setFont("Helvetica", 8)
+        c.drawString(2 * cm, y, "Thank you for your order!")
+
+    return draw
+
+
 def generate_ebill_pdf(order_data: dict) -> bytes:
     """Generate downloadable e-bill PDF for order."""
     buf = BytesIO()
-    c = canvas.Canvas(buf, pagesize=A4)
-    width, height = A4
+    c = _new_canvas(buf)
+    height = PAGE_HEIGHT
+    text = _Text(c)
     y = height - 2 * cm
 
-    # Header
-    c.setFont("Helvetica-Bold", 18)
-    c.drawString(2 * cm, y, "E-BILL / INVOICE")
+    # Header (title and "Bill To:" are static)
+    _place(c, ("ebill", "header"), _ebill_header)
     y -= 0.8 * cm
-    c.setFont("Helvetica", 10)
-    c.drawString(2 * cm, y, f"Order ID: #{order_data.get('id', 'N/A')}")
+    text.put(2 * cm, y, f"Order ID: #{order_data.get('id', 'N/A')}")
     y -= 0.6 * cm
     created_at = order_data.get("created_at", "")
     if isinstance(created_at, str):
-        c.drawString(2 * cm, y, f"Date: {created_at}")
+        text.put(2 * cm, y, f"Date: {created_at}")
     else:
-        c.drawString(2 * cm, y, f"Date: {created_at.strftime('%Y-%m-%d %H:%M') if hasattr(created_at, 'strftime') else 'N/A'}")
+        text.put(2 * cm, y, f"Date: {created_at.strftime('%Y-%m-%d %H:%M') if hasattr(created_at, 'strftime') else 'N/A'}")
     y -= 1.5 * cm
 
     # Customer Details
     customer = order_data.get("customer", {})
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(2 * cm, y, "Bill To:")
     y -= 0.6 * cm
-    c.setFont("Helvetica", 10)
-    c.drawString(2 * cm, y, customer.get("name", ""))
+    text.put(2 * cm, y, customer.get("name", ""))
     y -= 0.5 * cm
-    c.drawString(2 * cm, y, customer.get("email", ""))
+    text.put(2 * cm, y, customer.get("email", ""))
     y -= 0.5 * cm
     if customer.get("address"):
-        c.drawString(2 * cm, y, customer.get("address", ""))
+        text.put(2 * cm, y, customer.get("address", ""))
         y -= 0.5 * cm
     if customer.get("phone"):
-        c.drawString(2 * cm, y, f"Phone: {customer.get('phone', '')}")
+        text.put(2 * cm, y, f"Phone: {customer.get('phone', '')}")
         y -= 1.0 * cm
 
     # Items Table Header
-    c.setFont("Helvetica-Bold", 10)
-    c.drawString(2 * cm, y, "Item")
-    c.drawString(8 * cm, y, "Qty")
-    c.drawString(10 * cm, y, "Price")
-    c.drawString(13 * cm, y, "Disc%")
-    c.drawString(15 * cm, y, "Total")
-    y -= 0.6 * cm
-    c.line(2 * cm, y, 18 * cm, y)
-    y -= 0.4 * cm
+    _place(c, ("ebill", "table_head"), _ebill_table_head, y)
+    y -= 1.0 * cm
 
     # Items
-    c.setFont("Helvetica", 9)
     items = order_data.get("items", [])
     subtotal = 0.0
     total_discount = 0.0
-    
+    row_font = ("Helvetica", 9)
+
     for item in items:
         item_name = item.get("item", {}).get("name", f"Item {item.get('item_id')}")
         qty = item.get("quantity", 0)
         price_at_purchase = item.get("price_at_purchase", 0.0)  # Already discounted
         discount_pct = item.get("item", {}).get("discount_percent", 0.0)
-        
+
         # Calculate original price before discount
         if discount_pct > 0:
             original_price = price_at_purchase / (1 - discount_pct / 100.0)
         else:
             original_price = price_at_purchase
-        
+
         # Calculate totals
         item_subtotal = original_price * qty
         item_discount = item_subtotal * (discount_pct / 100.0)
         item_total = price_at_purchase * qty  # Final after discount
-        
+
         subtotal += item_subtotal
         total_discount += item_discount
 
         if y < 3 * cm:
+            text.flush()
             c.showPage()
             y = height - 2 * cm
 
-        c.drawString(2 * cm, y, item_name[:30])
-        c.drawString(8 * cm, y, str(qty))
-        c.drawString(10 * cm, y, f"₹{price_at_purchase:.2f}")
-        c.drawString(13 * cm, y, f"{discount_pct}%")
-        c.drawString(15 * cm, y, f"₹{item_total:.2f}")
+        text.put(2 * cm, y, item_name[:30], row_font)
+        text.put(8 * cm, y, str(qty), row_font)
+        text.put(10 * cm, y, f"₹{price_at_purchase:.2f}", row_font)
+        text.put(13 * cm, y, f"{discount_pct}%", row_font)
+        text.put(15 * cm, y, f"₹{item_total:.2f}", row_font)
         y -= 0.5 * cm
 
     y -= 0.3 * cm
-    c.line(2 * cm, y, 18 * cm, y)
-    y -= 0.5 * cm
 
     # Bill Summary
-    taxable_amount = subtotal - total_discount
-    tax_rate = 18.0  # Default 18% GST
-    tax_amt = taxable_amount * (tax_rate / 100.0)
-    sgst = tax_amt / 2
-    cgst = tax_amt / 2
+    # Tax comes from the order's tax_lines captured at purchase time; orders
+    # without ledger rows fall back to the configured rate.
+    tax_lines = order_data.get("tax_lines") or []
+    if tax_lines:
+        taxable_amount = sum(line["taxable_amount"] for line in tax_lines)
+        cgst = sum(line["cgst_amount"] for line in tax_lines)
+        sgst = sum(line["sgst_amount"] for line in tax_lines)
+        rates = {line["rate_percent"] for line in tax_lines}
+        tax_rate = rates.pop() if len(rates) == 1 else None
+    else:
+        taxable_amount = subtotal - total_discount
+        tax_rate = settings.total_tax_rate_percent
+        cgst = round(taxable_amount * tax_rate / 200.0, 2)
+        sgst = round(taxable_amount * tax_rate / 200.0, 2)
+    tax_amt = cgst + sgst
     final_total = taxable_amount + tax_amt  # Subtotal - Discount + Tax
+    half_rate = f" ({tax_rate / 2:g}%)" if tax_rate is not None else ""
+    has_discount = total_discount > 0
 
-    c.setFont("Helvetica", 10)
-    c.drawString(12 * cm, y, "Subtotal:")
-    c.drawString(15 * cm, y, f"₹{subtotal:.2f}")
+    # Rule, labels and the thank-you line are static per (discount, rate)
+    _place(
+        c,
+        ("ebill", "summary", int(has_discount), tax_rate),
+        _ebill_summary_labels(has_discount, half_rate),
+        y,
+    )
     y -= 0.5 * cm
-    if total_discount > 0:
-        c.drawString(12 * cm, y, "Discount:")
-        c.drawString(15 * cm, y, f"-₹{total_discount:.2f}")
+    text.put(15 * cm, y, f"₹{subtotal:.2f}")
+    y -= 0.5 * cm
+    if has_discount:
+        text.put(15 * cm, y, f"-₹{total_discount:.2f}")
         y -= 0.5 * cm
-    c.drawString(12 * cm, y, "CGST (9%):")
-    c.drawString(15 * cm, y, f"₹{cgst:.2f}")
+    text.put(15 * cm, y, f"₹{cgst:.2f}")
     y -= 0.5 * cm
-    c.drawString(12 * cm, y, "SGST (9%):")
-    c.drawString(15 * cm, y, f"₹{sgst:.2f}")
+    text.put(15 * cm, y, f"₹{sgst:.2f}")
     y -= 0.5 * cm
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(12 * cm, y, "Total Amount:")
-    c.drawString(15 * cm, y, f"₹{final_total:.2f}")
+    text.put(15 * cm, y, f"₹{final_total:.2f}", ("Helvetica-Bold", 12))
     y -= 1.0 * cm
 
     # Footer
-    c.setFont("Helvetica", 8)
-    c.drawString(2 * cm, y, "Thank you for your order!")
     y -= 0.4 * cm
     status = order_data.get("status", "N/A")
     if isinstance(status, str):
-        c.drawString(2 * cm, y, f"Order Status: {status.upper()}")
+        text.put(2 * cm, y, f"Order Status: {status.upper()}", ("Helvetica", 8))
     else:
-        c.drawString(2 * cm, y, f"Order Status: {status.value.upper() if hasattr(status, 'value') else 'N/A'}")
+        text.put(2 * cm, y, f"Order Status: {status.value.upper() if hasattr(status, 'value') else 'N/A'}", ("Helvetica", 8))
 
+    text.flush()
     c.showPage()
-    c.save()
+    _save(c)
     pdf = buf.getvalue()
     buf.close()
     return pdf
-
@@ -0,0 +1,136 @@
+"""
+Process-pool PDF rendering.
+
+reportlab drawing is pure-Python CPU work; running it in request threads
+holds the GIL and slows every other request. ``PdfRenderer`` hands renders
+to a pool of worker processes sized to the machine (``pdf_workers``, 0 =
+one per core) and caps the number of renders queued or running
+(``pdf_max_queue``), so a bulk run cannot starve checkout of workers
+indefinitely. E-bill workers write the PDF straight into the e-bill store
+and only the path travels back.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable
+
+from .settings import settings
+
+
+class RenderQueueFull(RuntimeError):
+    pass
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _render_ebill_to(order_dict: dict, path: str) -> str:
+    """Worker-side: render an e-bill into ``path`` unless it already exists."""
+    if not os.path.exists(path):
+        from .utils_pdf import generate_ebill_pdf
+
+        _write_atomic(path, generate_ebill_pdf(order_dict))
+    return path
+
+
+def _render_revenue_report(period_label: str, revenue: float, details) -> bytes:
+    from .utils_pdf import generate_revenue_report_pdf
+
+    return generate_revenue_report_pdf(period_label, revenue, details=details)
+
+
+def _warm_up() -> None:
+    # Import reportlab (and its font metrics) once per worker process
+    from . import utils_pdf  # noqa: F401
+
+
+class PdfRenderer:
+    def __init__(self, workers: int = 0, max_queue: int = 256):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max(max_queue, 1)
+        self._slots = threading.BoundedSemaphore(self.max_queue)
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.rejected = 0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: never fork a process that is running server threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_warm_up,
+                )
+            return self._executor
+
+    def start(self) -> None:
+        # Workers are spawned lazily; bring them all up now rather than
+        # during the first burst of renders
+        pool = self._pool()
+        for future in [pool.submit(_warm_up) for _ in range(self.workers)]:
+            future.result()
+        print(f"✓ PDF renderer started ({self.workers} worker process(es))")
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+    def submit(self, fn: Callable, *args, timeout: float | None = None) -> Future:
+        """
+        Queue ``fn(*args)`` on the pool. Waits up to ``timeout`` seconds for a
+        queue slot (forever when None) and raises ``RenderQueueFull`` after.
+        """
+        if not self._slots.acquire(timeout=timeout):
+            self.rejected += 1
+            raise RenderQueueFull(f"PDF render queue is full ({self.max_queue})")
+        try:
+            future = self._pool().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        self.submitted += 1
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def submit_ebill(self, order_dict: dict, path: str, timeout: float | None = None) -> Future:
+        # Workers may not share our working directory
+        return self.submit(_render_ebill_to, order_dict, os.path.abspath(path), timeout=timeout)
+
+    def render_ebill(self, order_dict: dict, path: str, timeout: float | None = None) -> str:
+        return self.submit_ebill(order_dict, path, timeout=timeout).result()
+
+    def render_revenue_report(
+        self,
+        period_label: str,
+        revenue: float,
+        details: list[tuple[str, float]] | None = None,
+        timeout: float | None = None,
+    ) -> bytes:
+        return self.submit(
+            _render_revenue_report, period_label, revenue, details, timeout=timeout
+        ).result()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "started": self._executor is not None,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+        }
+
+
+pdf_renderer = PdfRenderer(
+    workers=settings.pdf_workers,
+    max_queue=settings.pdf_max_queue,
+)
@@ -0,0 +1,233 @@
+"""
+Customer RFM (recency / frequency / monetary) and lifetime-value scoring.
+
+All customers are aggregated in a single GROUP BY over ``orders`` and scored
+with NumPy against the quintiles of their own shop's customers (customers
+without an owner form one group). Incremental runs only re-aggregate
+customers whose orders changed since the last run and score them against
+the population already stored in ``customer_scores``.
+"""
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import select, func, delete
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+from .settings import settings
+
+
+def _quintile(population: np.ndarray, values: np.ndarray, higher_is_better: bool = True) -> np.ndarray:
+    """
+    Score ``values`` 1..5 by their mid-rank percentile within ``population``,
+    so ties land in the same quintile.
+    """
+    n = len(population)
+    if n == 0:
+        return np.full(len(values), 3, dtype=np.int64)
+    ranked = np.sort(population)
+    rank = (
+        np.searchsorted(ranked, values, side="left")
+        + np.searchsorted(ranked, values, side="right")
+    ) / 2.0
+    if not higher_is_better:
+        rank = n - rank
+    return np.clip(np.floor(rank * 5 / n) + 1, 1, 5).astype(np.int64)
+
+
+def _aggregate(db: Session, customer_ids=None):
+    """
+    One aggregate query: last/first order, count, sum and owner per
+    customer.
+    """
+    q = (
+        select(
+            models.Order.customer_id,
+            func.max(models.Order.created_at),
+            func.min(models.Order.created_at),
+            func.count(models.Order.id),
+            func.coalesce(func.sum(models.Order.total_amount), 0.0),
+            models.Customer.owner_id,
+        )
+        .join(models.Customer, models.Customer.id == models.Order.customer_id)
+        .where(models.Order.status != models.OrderStatus.cancelled)
+        .group_by(models.Order.customer_id)
+    )
+    if customer_ids is not None:
+        q = q.where(models.Order.customer_id.in_(customer_ids))
+    return db.execute(q).all()
+
+
+def _last_run(db: Session) -> datetime | None:
+    return db.execute(select(func.max(models.CustomerScore.computed_at))).scalar_one()
+
+
+def refresh_customer_scores(db: Session, full: bool = False) -> dict:
+    """
+    Recompute RFM scores and LTV. Without ``full``, only customers with
+    orders created or updated since the previous run are rescored. A full
+    run also deletes the scores of customers it did not rescore (deleted,
+    or left with only cancelled orders).
+    """
+    now = datetime.utcnow()
+    since = None if full else _last_run(db)
+
+    if since is None:
+        rows = _aggregate(db)
+        population = rows
+    else:
+        changed = (
+            select(models.Order.customer_id)
+            .where(models.Order.updated_at >= since)
+            .distinct()
+        )
+        rows = _aggregate(db, changed)
+        # Drop stale scores for changed customers (including ones whose
+        # orders were all cancelled); refreshed rows are re-inserted below.
+        db.execute(
+            delete(models.CustomerScore).where(
+                models.CustomerScore.customer_id.in_(changed)
+            )
+        )
+        stored = db.execute(
+            select(
+                models.CustomerScore.customer_id,
+                models.CustomerScore.last_order_at,
+                models.CustomerScore.first_order_at,
+                models.CustomerScore.frequency,
+                models.CustomerScore.monetary,
+                models.Customer.owner_id,
+            ).join(
+                models.Customer,
+                models.Customer.id == models.CustomerScore.customer_id,
+            )
+        ).all()
+        population = stored + rows
+
+    mode = "full" if since is None else "incremental"
+    if not rows:
+        if since is None:
+            db.execute(delete(models.CustomerScore))
+        db.commit()
+        return {"mode": mode, "customers_scored": 0, "computed_at": now.isoformat()}
+
+    now64 = np.datetime64(now, "s")
+
+    def _columns(data):
+        last = np.array([r[1] for r in data], dtype="datetime64[s]")
+        first = np.array([r[2] for r in data], dtype="datetime64[s]")
+        recency = (now64 - last).astype("timedelta64[D]").astype(np.int64)
+        tenure = (now64 - first).astype("timedelta64[D]").astype(np.int64)
+        freq = np.array([r[3] for r in data], dtype=np.int64)
+        monetary = np.array([r[4] for r in data], dtype=np.float64)
+        owners = np.array([r[5] or 0 for r in data], dtype=np.int64)
+        return recency, tenure, freq, monetary, owners
+
+    pop_recency, _, pop_freq, pop_monetary, pop_owners = _columns(population)
+    recency, tenure, freq, monetary, owners = _columns(rows)
+
+    # Quintiles are taken within each shop: a customer is ranked against
+    # the other customers of the same owner, not the whole platform
+    r_score = np.empty(len(rows), dtype=np.int64)
+    f_score = np.empty(len(rows), dtype=np.int64)
+    m_score = np.empty(len(rows), dtype=np.int64)
+    for owner in np.unique(owners):
+        sel = owners == owner
+        pop = pop_owners == owner
+        r_score[sel] = _quintile(pop_recency[pop], recency[sel], higher_is_better=False)
+        f_score[sel] = _quintile(pop_freq[pop], freq[sel])
+        m_score[sel] = _quintile(pop_monetary[pop], monetary[sel])
+
+    # LTV: average order value x monthly order rate over the customer's
+    # tenure, projected over the configured horizon.
+    aov = monetary / np.maximum(freq, 1)
+    months = np.maximum(tenure / 30.0, 1.0)
+    ltv = np.round(aov * (freq / months) * settings.ltv_horizon_months, 2)
+
+    values = [
+        {
+            "customer_id": int(rows[i][0]),
+            "last_order_at": rows[i][1],
+            "first_order_at": rows[i][2],
+            "frequency": int(freq[i]),
+            "monetary": round(float(monetary[i]), 2),
+            "recency_score": int(r_score[i]),
+            "frequency_score": int(f_score[i]),
+            "monetary_score": int(m_score[i]),
+            "segment": f"{r_score[i]}{f_score[i]}{m_score[i]}",
+            "ltv": float(ltv[i]),
+            "computed_at": now,
+        }
+        for i in range(len(rows))
+    ]
+    stmt = insert(models.CustomerScore)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.CustomerScore.customer_id],
+        set_={
+            col: getattr(stmt.excluded, col)
+            for col in values[0]
+            if col != "customer_id"
+        },
+    )
+    db.execute(stmt, values)
+    if since is None:
+        # Every customer still scored was just written with computed_at=now
+        db.execute(delete(models.CustomerScore).where(models.CustomerScore.computed_at != now))
+    db.commit()
+    return {
+        "mode": mode,
+        "customers_scored": len(values),
+        "computed_at": now.isoformat(),
+    }
+
+
+def run_rfm_refresh(full: bool = False) -> dict:
+    """Synchronous batch job entry point (nightly / scheduler)."""
+    db = SessionLocal()
+    try:
+        result = refresh_customer_scores(db, full=full)
+        print(f"✓ RFM scores refreshed ({result['mode']}): {result['customers_scored']} customer(s)")
+        return result
+    finally:
+        db.close()
+
+
+def list_customer_scores(
+    db: Session,
+    segment: str | None = None,
+    limit: int = 100,
+    offset: int = 0,
+    owner_id: int | None = None,
+) -> list[dict]:
+    q = (
+        select(models.CustomerScore, models.Customer.name, models.Customer.email)
+        .join(models.Customer, models.Customer.id == models.CustomerScore.customer_id)
+        .order_by(models.CustomerScore.ltv.desc())
+        .limit(limit)
+        .offset(offset)
+    )
+    if segment:
+        q = q.where(models.CustomerScore.segment == segment)
+    if owner_id is not None:
+        q = q.where(models.Customer.owner_id == owner_id)
+    now = datetime.utcnow()
+    return [
+        {
+            "customer_id": score.customer_id,
+            "name": name,
+            "email": email,
+            "last_order_at": score.last_order_at,
+            "recency_days": (now - score.last_order_at).days,
+            "frequency": score.frequency,
+            "monetary": score.monetary,
+            "recency_score": score.recency_score,
+            "frequency_score": score.frequency_score,
+            "monetary_score": score.monetary_score,
+            "segment": score.segment,
+            "ltv": score.ltv,
+            "computed_at": score.computed_at,
+        }
+        for score, name, email in db.execute(q).all()
+    ]
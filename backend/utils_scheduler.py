@@ -1,14 +1,27 @@
 """
-Background scheduler for automated tax alerts.
-This should be called periodically (e.g., daily via cron or scheduled task).
+Background scheduler for automated tax alerts and other periodic jobs.
+The in-process Scheduler is started from the app lifespan; the tax check can
+also be called from an external cron via /taxes/auto-check-alerts.
 """
 import asyncio
-from datetime import datetime
+import os
+import random
+import socket
+import time
+from datetime import datetime, timedelta
+from typing import Callable
+from uuid import uuid4
+from sqlalchemy import select, insert, update, or_
 from sqlalchemy.orm import Session
-from .database import SessionLocal
-from .routers_taxes import check_tax_alerts, get_current_quarter_deadline
 from . import models
-from sqlalchemy import select
+from .database import SessionLocal, engine
+from .settings import settings
+from .utils_alerts import (
+    plan_tax_alerts,
+    active_owners,
+    send_alerts_async,
+    release_alerts,
+)
 
 
 async def check_and_send_tax_alerts():
@@ -19,67 +32,19 @@ async def check_and_send_tax_alerts():
     db: Session = SessionLocal()
     try:
         # Get all active owners
-        owners = db.execute(
-            select(models.Owner).where(models.Owner.is_active == True)
-        ).scalars().all()
+        owners = active_owners(db)
         
         print(f"🔍 Checking tax alerts for {len(owners)} active owner(s)...")
         
-        for owner in owners:
-            try:
-                # Check if alert needs to be sent for this owner
-                today = datetime.utcnow().date()
-                deadline = get_current_quarter_deadline(today)
-                days_until = (deadline - today).days
-                
-                # Send alert if 1 week (7 days) before deadline
-                if 5 <= days_until <= 9:  # 1 week = 7 days, with 2 day window
-                    print(f"📧 Sending 1-week tax alert to owner: {owner.email} (Order #{owner.id})")
-                    # Import here to avoid circular dependency
-                    from fastapi import BackgroundTasks
-                    from .utils_email import send_email
-                    from .routers_taxes import _quarter_bounds, calculate_commercial_tax
-                    from . import crud
-                    
-                    background_tasks = BackgroundTasks()
-                    start, end = _quarter_bounds(today)
-                    revenue = crud.revenue_between(db, start, end)
-                    tax_info = calculate_commercial_tax(revenue, owner)
-                    
-                    breakdown_html = ""
-                    for key, value in tax_info.get("breakdown", {}).items():
-                        breakdown_html += f"<li><strong>{key}:</strong> ₹ {value:,.2f}</li>"
-                    
-                    subject = f"⚠️ URGENT: Tax Payment Due in 1 Week - Q{(today.month - 1) // 3 + 1} {today.year}"
-                    
-                    html = f"""
-                    <div style='font-family: Arial, sans-serif; padding: 20px;'>
-                        <h2 style='color: red;'>⚠️ URGENT: Tax Payment Due in 1 Week</h2>
-                        <p><strong>Dear {owner.name},</strong></p>
-                        <p><strong>Quarter:</strong> Q{(today.month - 1) // 3 + 1} {today.year}</p>
-                        <p><strong>Total Revenue:</strong> ₹ {revenue:,.2f}</p>
-                        <h3>Tax Breakdown (10% Rate):</h3>
-                        <ul>
-                            {breakdown_html}
-                        </ul>
-                        <p><strong>Total Tax Due:</strong> ₹ {tax_info['total_tax']:,.2f}</p>
-                        <p><strong>Payment Deadline:</strong> {deadline.strftime('%d %B %Y')}</p>
-                        <p><strong>Days Remaining:</strong> {days_until} days (1 week)</p>
-                        <p style='color: red; font-weight: bold; font-size: 16px;'>⚠️ Please make payment immediately to avoid penalties and late fees.</p>
-                        <p style='margin-top: 20px; padding-top: 20px; border-top: 1px solid #ddd;'>
-                            <small>This is an automated reminder from Small Scale Business Automation system.</small>
-                        </p>
-                    </div>
-                    """
-                    
-                    # Send email directly
-                    from .utils_email import send_email
-                    send_email(subject, owner.email, html)
-                    print(f"✅ Tax alert sent to {owner.email}")
-                    
-            except Exception as e:
-                print(f"❌ Error sending alert to owner {owner.email}: {str(e)}")
-                continue
+        today = datetime.utcnow().date()
+        # Send alert if 1 week (7 days) before deadline
+        plan = plan_tax_alerts(db, owners, today, only=("1_week",))
+        
+        if plan["messages"]:
+            print(f"📧 Sending 1-week tax alert to {len(plan['messages'])} owner(s)")
+            result = await send_alerts_async(plan["messages"])
+            print(f"✅ Tax alerts sent: {result['sent']}, failed: {len(result['failed'])}")
+            release_alerts(result["failed"], plan["quarter"], plan["kind"])
         
         print("✅ Tax alert check completed")
         
@@ -97,3 +62,231 @@ def run_daily_tax_check():
         # Already in event loop, create task
         asyncio.create_task(check_and_send_tax_alerts())
 
+
+class Scheduler:
+    """
+    In-process asyncio scheduler for periodic jobs.
+
+    Every worker process runs the same loop, but a job only runs where its
+    row in ``job_leases`` is claimed: the claim is a single UPDATE that
+    succeeds only if the job is due and no live lease is held, so exactly one
+    worker runs each tick even with several uvicorn workers.
+
+    Maintenance of a process's own memory (``register_local``) runs in every
+    worker on a local timer instead; leasing it would clean one worker only.
+    """
+
+    def __init__(self, tick_seconds: float = 30.0, jitter_seconds: float = 5.0):
+        self.tick_seconds = tick_seconds
+        self.jitter_seconds = jitter_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self.jobs: dict[str, dict] = {}
+        self.local_jobs: dict[str, dict] = {}
+        self._task: asyncio.Task | None = None
+        # Running jobs: asyncio keeps only weak references to tasks
+        self._running: set[asyncio.Task] = set()
+
+    def register(
+        self,
+        name: str,
+        func: Callable,
+        interval_seconds: float,
+        *,
+        timeout_seconds: float,
+        jitter_seconds: float | None = None,
+    ) -> None:
+        """
+        Register ``func`` (sync or async) to run every ``interval_seconds``
+        on one worker. The lease expires after ``timeout_seconds``, so a
+        worker that dies mid-run blocks the job for at most that long.
+        """
+        self.jobs[name] = {
+            "func": func,
+            "interval": interval_seconds,
+            "jitter": self.jitter_seconds if jitter_seconds is None else jitter_seconds,
+            "timeout": timeout_seconds,
+        }
+
+    def register_local(self, name: str, func: Callable, interval_seconds: float) -> None:
+        """Register sync ``func`` to run every ``interval_seconds`` in every worker."""
+        self.local_jobs[name] = {
+            "func": func,
+            "interval": interval_seconds,
+            "next_run": time.monotonic() + interval_seconds,
+        }
+
+    def _ensure_rows(self) -> None:
+        if not self.jobs:
+            return
+        now = datetime.utcnow()
+        with engine.begin() as conn:
+            conn.execute(
+                insert(models.JobLease).prefix_with("OR IGNORE"),
+                [
+                    {
+                        "name": name,
+                        "next_run_at": now + timedelta(seconds=random.uniform(0, job["jitter"])),
+                        "run_count": 0,
+                    }
+                    for name, job in self.jobs.items()
+                ],
+            )
+
+    def _claim(self, name: str) -> bool:
+        job = self.jobs[name]
+        now = datetime.utcnow()
+        next_run = now + timedelta(
+            seconds=job["interval"] + random.uniform(0, job["jitter"])
+        )
+        with engine.begin() as conn:
+            result = conn.execute(
+                update(models.JobLease)
+                .where(
+                    models.JobLease.name == name,
+                    models.JobLease.next_run_at <= now,
+                    or_(
+                        models.JobLease.lease_until.is_(None),
+                        models.JobLease.lease_until <= now,
+                    ),
+                )
+                .values(
+                    next_run_at=next_run,
+                    holder=self.worker_id,
+                    lease_until=now + timedelta(seconds=job["timeout"]),
+                    last_started_at=now,
+                )
+            )
+            return result.rowcount == 1
+
+    def _finish(self, name: str, duration_ms: float, error: str | None) -> None:
+        with engine.begin() as conn:
+            conn.execute(
+                update(models.JobLease)
+                .where(
+                    models.JobLease.name == name,
+                    models.JobLease.holder == self.worker_id,
+                )
+                .values(
+                    lease_until=None,
+                    last_finished_at=datetime.utcnow(),
+                    last_duration_ms=round(duration_ms, 1),
+                    last_error=error,
+                    run_count=models.JobLease.run_count + 1,
+                )
+            )
+
+    async def run_job(self, name: str) -> None:
+        func = self.jobs[name]["func"]
+        started = time.perf_counter()
+        error = None
+        try:
+            if asyncio.iscoroutinefunction(func):
+                await func()
+            else:
+                await asyncio.to_thread(func)
+        except Exception as e:
+            error = str(e)
+            print(f"❌ Scheduled job {name} failed: {error}")
+        await asyncio.to_thread(
+            self._finish, name, (time.perf_counter() - started) * 1000, error
+        )
+
+    async def run_local_job(self, name: str) -> None:
+        try:
+            await asyncio.to_thread(self.local_jobs[name]["func"])
+        except Exception as e:
+            print(f"❌ Local job {name} failed: {e}")
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _loop(self) -> None:
+        await asyncio.to_thread(self._ensure_rows)
+        while True:
+            for name in self.jobs:
+                try:
+                    if await asyncio.to_thread(self._claim, name):
+                        self._spawn(self.run_job(name))
+                except Exception as e:
+                    print(f"⚠ Scheduler claim error for {name}: {e}")
+            now = time.monotonic()
+            for name, job in self.local_jobs.items():
+                if job["next_run"] <= now:
+                    job["next_run"] = now + job["interval"]
+                    self._spawn(self.run_local_job(name))
+            await asyncio.sleep(self.tick_seconds + random.uniform(0, self.jitter_seconds))
+
+    def start(self) -> None:
+        if self._task is None and (self.jobs or self.local_jobs):
+            self._task = asyncio.create_task(self._loop())
+            print(
+                f"✓ Scheduler started ({len(self.jobs)} job(s), "
+                f"{len(self.local_jobs)} local, worker {self.worker_id})"
+            )
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Jobs in threads finish on their own; their leases expire if not
+        for task in list(self._running):
+            task.cancel()
+        await asyncio.gather(*self._running, return_exceptions=True)
+
+
+def job_stats() -> list[dict]:
+    """Schedule, holder and last duration of every registered job."""
+    db: Session = SessionLocal()
+    try:
+        return [
+            {
+                "name": job.name,
+                "next_run_at": job.next_run_at,
+                "holder": job.holder,
+                "running": job.lease_until is not None and job.lease_until > datetime.utcnow(),
+                "last_started_at": job.last_started_at,
+                "last_finished_at": job.last_finished_at,
+                "last_duration_ms": job.last_duration_ms,
+                "last_error": job.last_error,
+                "run_count": job.run_count,
+            }
+            for job in db.execute(
+                select(models.JobLease).order_by(models.JobLease.name)
+            ).scalars()
+        ]
+    finally:
+        db.close()
+
+
+def register_default_jobs(scheduler: Scheduler) -> None:
+    from .utils_cache import report_cache
+    from .utils_snapshot import run_snapshot_refresh
+    from .utils_rfm import run_rfm_refresh
+    from .utils_forecast import run_inventory_forecast
+    from .utils_outbox import purge_outbox
+    from .utils_digest import digest_interval_seconds, send_owner_digests
+
+    day = 24 * 3600
+    scheduler.register("tax_alerts", run_daily_tax_check, day, timeout_seconds=1800, jitter_seconds=600)
+    scheduler.register("analytics_snapshot", run_snapshot_refresh, 3600, timeout_seconds=1800, jitter_seconds=120)
+    scheduler.register("customer_rfm", run_rfm_refresh, day, timeout_seconds=3600, jitter_seconds=600)
+    scheduler.register("inventory_forecast", run_inventory_forecast, day, timeout_seconds=3600, jitter_seconds=600)
+    scheduler.register("email_outbox_purge", purge_outbox, day, timeout_seconds=900, jitter_seconds=600)
+    if digest_interval_seconds() is not None:
+        scheduler.register(
+            "owner_digest", send_owner_digests, digest_interval_seconds(), timeout_seconds=600, jitter_seconds=0
+        )
+    # Each worker evicts its own cache entries
+    scheduler.register_local("report_cache_sweep", report_cache.sweep, 300)
+
+
+scheduler = Scheduler(
+    tick_seconds=settings.scheduler_tick_seconds,
+    jitter_seconds=settings.scheduler_jitter_seconds,
+)
@@ -0,0 +1,454 @@
+"""
+Columnar analytics snapshot of order data.
+
+Orders and order items are exported into one ``.npy`` file per column and
+opened with ``mmap_mode='r'``, so ad-hoc analytics (trends, basket analysis,
+cohorts) read the snapshot instead of contending with checkout on the live
+SQLite file. Refreshes are incremental: only rows created after the last
+snapshot are fetched, and status (and owner) changes are picked up via
+``updated_at``.
+
+Every refresh writes a complete set of column files into a new ``v<N>``
+directory (unchanged columns are hard-linked from the previous one) and
+then swaps ``meta.json`` to point at it, so a reader always maps columns
+of one version. The previous directory is kept for readers that read the
+old meta just before the swap; older ones are removed.
+"""
+import json
+import os
+import shutil
+import threading
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+from .settings import settings
+
+
+EPOCH = datetime(1970, 1, 1)
+
+# Status codes are positions in the enum; stored as int8
+STATUSES = list(models.OrderStatus)
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+
+ORDER_COLUMNS = {
+    "id": np.int64,
+    "owner_id": np.int64,  # 0 for orders without an owner
+    "customer_id": np.int64,
+    "created_at": np.int64,  # epoch seconds (UTC)
+    "total_amount": np.float64,
+    "status": np.int8,
+}
+ORDER_ITEM_COLUMNS = {
+    "id": np.int64,
+    "order_id": np.int64,
+    "item_id": np.int64,
+    "quantity": np.int64,
+    "price_at_purchase": np.float64,
+}
+
+# Order columns patched in place for updated orders: position in ``changed``
+_PATCHED = {"status": 1, "total_amount": 2, "owner_id": 3}
+
+META_FILE = "meta.json"
+# Bump when the column set or layout changes; older snapshots are rebuilt
+SCHEMA_VERSION = 3
+FETCH_CHUNK = 10_000
+
+_lock = threading.Lock()
+_loaded: "OrderSnapshot | None" = None
+
+
+def _to_epoch(dt: datetime | None) -> int:
+    if dt is None:
+        return 0
+    return int((dt - EPOCH).total_seconds())
+
+
+def _version_dir(version: int) -> str:
+    return f"v{version}"
+
+
+def _column_path(directory: str, table: str, column: str) -> str:
+    return os.path.join(settings.snapshot_dir, directory, f"{table}.{column}.npy")
+
+
+def _read_meta() -> dict:
+    path = os.path.join(settings.snapshot_dir, META_FILE)
+    if os.path.exists(path):
+        with open(path) as f:
+            meta = json.load(f)
+        if meta.get("schema") == SCHEMA_VERSION:
+            return meta
+    return {
+        "schema": SCHEMA_VERSION,
+        "version": 0,
+        "dir": None,
+        "last_order_id": 0,
+        "last_order_item_id": 0,
+        "orders_updated_at": None,
+        "snapshot_at": None,
+        "order_rows": 0,
+        "order_item_rows": 0,
+    }
+
+
+def _write_meta(meta: dict) -> None:
+    path = os.path.join(settings.snapshot_dir, META_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, path)
+
+
+def _load_column(directory: str | None, table: str, column: str, dtype) -> np.ndarray:
+    if directory is None:
+        return np.empty(0, dtype=dtype)
+    path = _column_path(directory, table, column)
+    if not os.path.exists(path):
+        return np.empty(0, dtype=dtype)
+    return np.load(path, mmap_mode="r")
+
+
+def _empty_column(directory: str | None, table: str, column: str, dtype) -> np.ndarray:
+    return np.empty(0, dtype=dtype)
+
+
+def _write_column(directory: str, table: str, column: str, values: np.ndarray) -> None:
+    np.save(_column_path(directory, table, column), values)
+
+
+def _keep_column(previous: str | None, directory: str, table: str, column: str) -> None:
+    """Carry an unchanged column file over into the new version directory."""
+    if previous is None:
+        return
+    src = _column_path(previous, table, column)
+    if not os.path.exists(src):
+        return
+    dst = _column_path(directory, table, column)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def _remove_old_versions(keep: set[str]) -> None:
+    for name in os.listdir(settings.snapshot_dir):
+        path = os.path.join(settings.snapshot_dir, name)
+        if name in keep:
+            continue
+        if os.path.isdir(path) and name.startswith("v"):
+            shutil.rmtree(path, ignore_errors=True)
+        elif name.endswith(".npy"):
+            # Column files of the flat pre-versioning layout
+            os.remove(path)
+
+
+def _fetch_columns(
+    db: Session, stmt, columns: dict, convert: dict | None = None
+) -> dict[str, np.ndarray]:
+    """Stream rows from ``stmt`` into one array per column."""
+    convert = convert or {}
+    chunks: dict[str, list[np.ndarray]] = {name: [] for name in columns}
+    result = db.execute(stmt.execution_options(yield_per=FETCH_CHUNK))
+    for rows in result.partitions(FETCH_CHUNK):
+        for idx, (name, dtype) in enumerate(columns.items()):
+            fn = convert.get(name)
+            values = (fn(row[idx]) if fn else row[idx] for row in rows)
+            chunks[name].append(np.fromiter(values, dtype=dtype, count=len(rows)))
+    return {
+        name: np.concatenate(parts) if parts else np.empty(0, dtype=columns[name])
+        for name, parts in chunks.items()
+    }
+
+
+def refresh_snapshot(db: Session) -> dict:
+    """
+    Append orders and order items created since the last snapshot and patch
+    the status and owner of orders updated since then. Returns the new
+    snapshot meta.
+    """
+    os.makedirs(settings.snapshot_dir, exist_ok=True)
+    with _lock:
+        meta = _read_meta()
+        previous = meta["dir"]
+        if meta["version"] == 0:
+            # Fresh or outdated snapshot: drop any leftover column files
+            _remove_old_versions(set())
+        directory = _version_dir(meta["version"] + 1)
+        # A refresh that died half-way may have left this directory behind
+        shutil.rmtree(os.path.join(settings.snapshot_dir, directory), ignore_errors=True)
+        os.makedirs(os.path.join(settings.snapshot_dir, directory))
+        since = (
+            datetime.fromisoformat(meta["orders_updated_at"])
+            if meta["orders_updated_at"]
+            else None
+        )
+        started_at = datetime.utcnow()
+
+        # New orders
+        new_orders = _fetch_columns(
+            db,
+            select(
+                models.Order.id,
+                models.Order.owner_id,
+                models.Order.customer_id,
+                models.Order.created_at,
+                models.Order.total_amount,
+                models.Order.status,
+            )
+            .where(models.Order.id > meta["last_order_id"])
+            .order_by(models.Order.id),
+            ORDER_COLUMNS,
+            convert={
+                "owner_id": lambda v: v or 0,
+                "created_at": _to_epoch,
+                "total_amount": lambda v: v or 0.0,
+                "status": STATUS_CODES.__getitem__,
+            },
+        )
+
+        # Status (or owner) changes on orders already in the snapshot
+        changed: list[tuple[int, int, float, int]] = []
+        if since is not None and meta["last_order_id"]:
+            changed = [
+                (oid, STATUS_CODES[status], amount or 0.0, owner_id or 0)
+                for oid, status, amount, owner_id in db.execute(
+                    select(
+                        models.Order.id,
+                        models.Order.status,
+                        models.Order.total_amount,
+                        models.Order.owner_id,
+                    ).where(
+                        models.Order.id <= meta["last_order_id"],
+                        models.Order.updated_at >= since,
+                    )
+                )
+            ]
+
+        new_items = _fetch_columns(
+            db,
+            select(
+                models.OrderItem.id,
+                models.OrderItem.order_id,
+                models.OrderItem.item_id,
+                models.OrderItem.quantity,
+                models.OrderItem.price_at_purchase,
+            )
+            .where(models.OrderItem.id > meta["last_order_item_id"])
+            .order_by(models.OrderItem.id),
+            ORDER_ITEM_COLUMNS,
+        )
+
+        # Orders
+        ids = _load_column(previous, "orders", "id", np.int64)
+        for name, dtype in ORDER_COLUMNS.items():
+            patch = changed and name in _PATCHED
+            if not len(new_orders[name]) and not patch:
+                _keep_column(previous, directory, "orders", name)
+                continue
+            existing = _load_column(previous, "orders", name, dtype)
+            merged = np.concatenate([existing, new_orders[name]]).astype(dtype)
+            if patch and len(ids):
+                changed_ids = np.array([c[0] for c in changed], dtype=np.int64)
+                pos = np.searchsorted(ids, changed_ids)
+                ok = (pos < len(ids)) & (ids[np.minimum(pos, len(ids) - 1)] == changed_ids)
+                src = _PATCHED[name]
+                values = np.array([c[src] for c in changed], dtype=dtype)
+                merged[pos[ok]] = values[ok]
+            _write_column(directory, "orders", name, merged)
+
+        # Order items
+        for name, dtype in ORDER_ITEM_COLUMNS.items():
+            if not len(new_items["id"]):
+                _keep_column(previous, directory, "order_items", name)
+                continue
+            existing = _load_column(previous, "order_items", name, dtype)
+            merged = np.concatenate([existing, new_items[name]])
+            _write_column(directory, "order_items", name, merged.astype(dtype))
+
+        order_ids = _load_column(directory, "orders", "id", np.int64)
+        item_ids = _load_column(directory, "order_items", "id", np.int64)
+        meta.update(
+            version=meta["version"] + 1,
+            dir=directory,
+            last_order_id=int(order_ids[-1]) if len(order_ids) else 0,
+            last_order_item_id=int(item_ids[-1]) if len(item_ids) else 0,
+            orders_updated_at=started_at.isoformat(),
+            snapshot_at=started_at.isoformat(),
+            order_rows=int(len(order_ids)),
+            order_item_rows=int(len(item_ids)),
+        )
+        # The switch: readers pick up the new directory from here on
+        _write_meta(meta)
+        _remove_old_versions({directory, previous})
+        return meta
+
+
+def run_snapshot_refresh() -> dict:
+    """Synchronous job entry point (cron / scheduler)."""
+    db = SessionLocal()
+    try:
+        meta = refresh_snapshot(db)
+        print(
+            f"✓ Analytics snapshot v{meta['version']}: "
+            f"{meta['order_rows']} orders, {meta['order_item_rows']} order items"
+        )
+        return meta
+    finally:
+        db.close()
+
+
+class OrderSnapshot:
+    """Read-only, memory-mapped view over the snapshot columns."""
+
+    def __init__(self, meta: dict):
+        self.meta = meta
+        # No snapshot yet (or one with an outdated column set): empty view
+        load = _load_column if meta["version"] else _empty_column
+        self.orders = {
+            name: load(meta["dir"], "orders", name, dtype)
+            for name, dtype in ORDER_COLUMNS.items()
+        }
+        self.order_items = {
+            name: load(meta["dir"], "order_items", name, dtype)
+            for name, dtype in ORDER_ITEM_COLUMNS.items()
+        }
+
+    def item_order_positions(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Position of each order item's parent order in the orders columns,
+        and whether that order is present at all (positions of items whose
+        order is missing are 0 and must be masked out).
+        """
+        ids = self.orders["id"]
+        order_ids = self.order_items["order_id"]
+        if not len(ids):
+            n = len(order_ids)
+            return np.zeros(n, dtype=np.int64), np.zeros(n, dtype=bool)
+        pos = np.minimum(np.searchsorted(ids, order_ids), len(ids) - 1)
+        found = ids[pos] == order_ids
+        return np.where(found, pos, 0), found
+
+
+def get_snapshot() -> OrderSnapshot:
+    """Return the current snapshot, remapping it if a refresh happened."""
+    global _loaded
+    meta = _read_meta()
+    if _loaded is None or (_loaded.meta["dir"], _loaded.meta["snapshot_at"]) != (
+        meta["dir"], meta["snapshot_at"]
+    ):
+        _loaded = OrderSnapshot(meta)
+    return _loaded
+
+
+METRICS = ("revenue", "orders", "quantity")
+GROUPINGS = ("none", "day", "month", "status", "customer", "item")
+
+
+def query_snapshot(
+    metric: str = "revenue",
+    group_by: str = "day",
+    start: datetime | None = None,
+    end: datetime | None = None,
+    status: models.OrderStatus | None = None,
+    item_id: int | None = None,
+    include_cancelled: bool = False,
+    owner_id: int | None = None,
+) -> list[dict]:
+    """
+    Filter, group and sum over the snapshot arrays.
+
+    Order-level metrics (revenue, orders) aggregate ``orders`` unless the
+    query is item-scoped (``group_by=item`` or ``item_id``), in which case
+    revenue is the sum of line amounts and ``orders`` counts the distinct
+    orders with a matching line. ``quantity`` is always item-level.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Invalid metric; use {'|'.join(METRICS)}")
+    if group_by not in GROUPINGS:
+        raise ValueError(f"Invalid group_by; use {'|'.join(GROUPINGS)}")
+
+    snap = get_snapshot()
+    item_level = metric == "quantity" or group_by == "item" or item_id is not None
+
+    if item_level:
+        pos, found = snap.item_order_positions()
+        oi = snap.order_items
+        created = snap.orders["created_at"][pos]
+        statuses = snap.orders["status"][pos]
+        customers = snap.orders["customer_id"][pos]
+        owners = snap.orders["owner_id"][pos]
+        mask = found
+        if item_id is not None:
+            mask &= oi["item_id"] == item_id
+        if metric == "quantity":
+            weights = oi["quantity"]
+        elif metric == "revenue":
+            weights = oi["quantity"] * oi["price_at_purchase"]
+        else:
+            weights = None
+    else:
+        created = snap.orders["created_at"]
+        statuses = snap.orders["status"]
+        customers = snap.orders["customer_id"]
+        owners = snap.orders["owner_id"]
+        mask = np.ones(len(created), dtype=bool)
+        weights = snap.orders["total_amount"] if metric == "revenue" else None
+
+    if owner_id is not None:
+        mask &= owners == owner_id
+    if start is not None:
+        mask &= created >= _to_epoch(start)
+    if end is not None:
+        mask &= created < _to_epoch(end)
+    if status is not None:
+        mask &= statuses == STATUS_CODES[status]
+    elif not include_cancelled:
+        mask &= statuses != STATUS_CODES[models.OrderStatus.cancelled]
+
+    if group_by == "none":
+        keys = np.zeros(int(mask.sum()), dtype=np.int64)
+    elif group_by == "day":
+        keys = created[mask].astype("datetime64[s]").astype("datetime64[D]")
+    elif group_by == "month":
+        keys = created[mask].astype("datetime64[s]").astype("datetime64[M]")
+    elif group_by == "status":
+        keys = statuses[mask]
+    elif group_by == "customer":
+        keys = customers[mask]
+    else:
+        keys = snap.order_items["item_id"][mask]
+
+    if not len(keys):
+        return []
+    uniq, inverse = np.unique(keys, return_inverse=True)
+    if weights is None and item_level:
+        # Orders, not lines: an order with several matching lines counts once
+        pairs = np.unique(
+            np.column_stack([inverse, snap.order_items["order_id"][mask]]), axis=0
+        )
+        totals = np.bincount(pairs[:, 0], minlength=len(uniq))
+    elif weights is None:
+        totals = np.bincount(inverse, minlength=len(uniq))
+    else:
+        totals = np.bincount(inverse, weights=np.asarray(weights)[mask], minlength=len(uniq))
+
+    if group_by == "status":
+        labels = [STATUSES[int(code)].value for code in uniq]
+    elif group_by in ("day", "month"):
+        labels = [str(k) for k in uniq]
+    elif group_by == "none":
+        labels = ["all"]
+    else:
+        labels = [int(k) for k in uniq]
+
+    if metric == "revenue":
+        values = [round(float(v), 2) for v in totals]
+    else:
+        values = [int(v) for v in totals]
+    return [{"key": k, "value": v} for k, v in zip(labels, values)]
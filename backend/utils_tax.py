@@ -0,0 +1,92 @@
+"""
+Tax period and deadline helpers shared by the taxes router and alert runs.
+"""
+from datetime import datetime, date
+from . import models
+from .settings import settings
+
+
+def _month_bounds(ref: date) -> tuple[datetime, datetime]:
+    start = datetime(ref.year, ref.month, 1)
+    if ref.month == 12:
+        end = datetime(ref.year + 1, 1, 1)
+    else:
+        end = datetime(ref.year, ref.month + 1, 1)
+    return start, end
+
+
+def _quarter_bounds(ref: date) -> tuple[datetime, datetime]:
+    """Get start and end of quarter for a given date."""
+    quarter = (ref.month - 1) // 3
+    start_month = quarter * 3 + 1
+    end_month = start_month + 3
+    start = datetime(ref.year, start_month, 1)
+    if end_month > 12:
+        end = datetime(ref.year + 1, 1, 1)
+    else:
+        end = datetime(ref.year, end_month, 1)
+    return start, end
+
+
+def get_next_tax_deadline(today: date | None = None) -> date:
+    """Get next quarterly tax deadline (29th of every 3rd month: Mar, Jun, Sep, Dec)."""
+    if today is None:
+        today = datetime.utcnow().date()
+    
+    # Quarterly deadlines: March 29, June 29, September 29, December 29
+    deadlines = [
+        date(today.year, 3, 29),
+        date(today.year, 6, 29),
+        date(today.year, 9, 29),
+        date(today.year, 12, 29),
+    ]
+    
+    # Find next deadline
+    for deadline in deadlines:
+        if deadline >= today:
+            return deadline
+    
+    # If all deadlines passed this year, return first of next year
+    return date(today.year + 1, 3, 29)
+
+
+def get_current_quarter_deadline(today: date | None = None) -> date:
+    """Get current quarter's tax deadline."""
+    if today is None:
+        today = datetime.utcnow().date()
+    
+    month = today.month
+    if month <= 3:
+        return date(today.year, 3, 29)
+    elif month <= 6:
+        return date(today.year, 6, 29)
+    elif month <= 9:
+        return date(today.year, 9, 29)
+    else:
+        return date(today.year, 12, 29)
+
+
+def calculate_commercial_tax(ledger: dict, owner: models.Owner | None = None) -> dict:
+    """
+    Tax figures for a period from the tax_lines ledger totals (see
+    crud.tax_between). Lines are captured at purchase time at the
+    configured rate, split evenly into CGST and SGST.
+    """
+    tax_rate = settings.total_tax_rate_percent  # 10%
+    
+    has_gst = owner and owner.gst_number and len(owner.gst_number.strip()) > 0
+    
+    return {
+        "gst_registered": has_gst,
+        "tax_rate": tax_rate,
+        "taxable_amount": ledger["taxable"],
+        "total_tax": ledger["tax"],
+        "breakdown": {
+            f"CGST ({tax_rate / 2:g}%)": ledger["cgst"],
+            f"SGST ({tax_rate / 2:g}%)": ledger["sgst"],
+        }
+    }
+
+
+def quarter_label(today: date) -> str:
+    return f"Q{(today.month - 1) // 3 + 1} {today.year}"
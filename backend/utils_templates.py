@@ -0,0 +1,129 @@
+"""
+Compiled email templates.
+
+Templates under ``backend/templates/email`` are compiled once by a shared
+Jinja2 environment; ``load_templates`` runs at startup. Static fragments
+(alert headings and closings, the footer and per-status copy) are rendered
+once from ``fragments.html`` and handed to templates as finished markup.
+``render_batch`` renders one compiled template for many recipients in a
+single call: when the per-recipient fields are only output verbatim, the
+template is rendered once with markers in their place and each body is
+assembled by splicing the escaped values between the static segments.
+"""
+import os
+import re
+from functools import lru_cache
+
+from jinja2 import Environment, FileSystemLoader, nodes, select_autoescape
+from markupsafe import Markup, escape
+
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "templates", "email")
+
+ALERT_KINDS = ("manual", "15_weeks", "1_week")
+ORDER_STATUSES = ("placed", "processing", "dispatched", "delivered", "cancelled")
+
+
+def _money(value: float) -> str:
+    return f"{value or 0:,.2f}"
+
+
+def _nl2br(text: str | None) -> Markup:
+    return Markup("<br>").join(escape(text or "").split("\n"))
+
+
+env = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    autoescape=select_autoescape(["html"]),
+    auto_reload=False,
+    cache_size=-1,
+)
+env.filters["money"] = _money
+env.filters["nl2br"] = _nl2br
+
+_loaded = False
+
+
+def load_templates() -> None:
+    """Compile every template and pre-render the static fragments."""
+    global _loaded
+    if _loaded:
+        return
+    for name in env.list_templates():
+        env.get_template(name)
+    macros = env.get_template("fragments.html").module
+    env.globals["fragments"] = {
+        "footer": Markup(macros.footer()),
+        "alert_heading": {k: Markup(macros.alert_heading(k)) for k in ALERT_KINDS},
+        "alert_closing": {k: Markup(macros.alert_closing(k)) for k in ALERT_KINDS},
+        "status_message": {
+            s: str(macros.status_message(s)) for s in ORDER_STATUSES + ("",)
+        },
+    }
+    _loaded = True
+    print(f"✓ Email templates compiled ({len(env.list_templates())} template(s))")
+
+
+def status_message(status: str) -> str:
+    """Pre-rendered customer copy for an order status."""
+    load_templates()
+    messages = env.globals["fragments"]["status_message"]
+    return messages.get((status or "").lower(), messages[""])
+
+
+def render(name: str, **context) -> str:
+    load_templates()
+    return env.get_template(name).render(context)
+
+
+@lru_cache(maxsize=None)
+def _verbatim_fields(name: str) -> frozenset[str]:
+    """Variables that ``name`` and its parents only ever output as ``{{ var }}``."""
+    outputs: dict[str, int] = {}
+    loads: dict[str, int] = {}
+    pending = [name]
+    while pending:
+        source = env.loader.get_source(env, pending.pop())[0]
+        tree = env.parse(source)
+        for node in tree.find_all(nodes.Output):
+            for child in node.nodes:
+                if isinstance(child, nodes.Name):
+                    outputs[child.name] = outputs.get(child.name, 0) + 1
+        for node in tree.find_all(nodes.Name):
+            if node.ctx == "load":
+                loads[node.name] = loads.get(node.name, 0) + 1
+        for node in tree.find_all(nodes.Extends):
+            if isinstance(node.template, nodes.Const):
+                pending.append(node.template.value)
+    return frozenset(k for k, n in outputs.items() if loads.get(k) == n)
+
+
+_MARKER = re.compile(r"\x00(\d+)\x00")
+
+
+def render_batch(name: str, rows: list[dict], **shared) -> list[str]:
+    """Render ``name`` once per row; ``shared`` holds the common context."""
+    load_templates()
+    template = env.get_template(name)
+    if not rows:
+        return []
+    fields = sorted(rows[0])
+    if any(sorted(row) != fields for row in rows) or not set(fields) <= _verbatim_fields(name):
+        return [template.render({**shared, **row}) for row in rows]
+
+    skeleton = template.render(
+        {**shared, **{f: f"\x00{i}\x00" for i, f in enumerate(fields)}}
+    )
+    parts = _MARKER.split(skeleton)
+    statics = parts[0::2]
+    slots = [fields[int(i)] for i in parts[1::2]]
+    quote = (lambda v: str(escape(v))) if env.autoescape(name) else str
+    bodies = []
+    for row in rows:
+        values = [quote(row[f]) for f in slots]
+        out = [statics[0]]
+        for value, static in zip(values, statics[1:]):
+            out.append(value)
+            out.append(static)
+        bodies.append("".join(out))
+    return bodies
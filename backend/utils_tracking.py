@@ -0,0 +1,276 @@
+"""
+Rider GPS ping ingestion.
+
+Riders' phones post pings every few seconds; a transaction per ping would
+queue every request behind SQLite's write lock. ``PingBuffer`` keeps
+accepted pings in memory and a flusher thread writes them to
+``tracking_events`` with one bulk INSERT once ``flush_size`` are waiting or
+``flush_seconds`` have passed. ``stop`` flushes what is left, so only a
+crash loses pings (at most one interval's worth).
+
+The latest position of each order lives in a bounded LRU map updated as
+pings arrive, so reading it does not touch ``tracking_events``. Another
+worker process may have taken newer pings for the same order, so an entry
+is trusted for ``positions_ttl`` seconds; after that (or once the order
+dropped out of the map) the newest row is read again through the
+(order_id, ts) index and the newer of the two positions kept.
+
+``TrackingCache`` keeps recent lookups by tracking code; writers that
+change what a lookup returns invalidate its code after they commit.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, NamedTuple
+
+from sqlalchemy import insert, select
+
+from . import models
+from .database import engine
+from .settings import settings
+
+
+Event = models.TrackingEvent
+
+
+class Position(NamedTuple):
+    lat: float
+    lng: float
+    ts: datetime
+
+
+def naive_utc(ts: datetime) -> datetime:
+    """Timestamps are stored as naive UTC, like the rest of the schema."""
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def valid_coords(lat: float, lng: float) -> bool:
+    return -90.0 <= lat <= 90.0 and -180.0 <= lng <= 180.0
+
+
+class PingBuffer:
+    def __init__(
+        self,
+        flush_size: int = 500,
+        flush_seconds: float = 2.0,
+        max_pending: int = 20000,
+        positions_max: int = 50000,
+        positions_ttl: float = 10.0,
+    ):
+        self.flush_size = max(flush_size, 1)
+        self.flush_seconds = flush_seconds
+        self.max_pending = max(max_pending, self.flush_size)
+        self.positions_max = max(positions_max, 1)
+        self.positions_ttl = positions_ttl
+        self._pending: list[dict] = []
+        # order_id -> (newest position seen, monotonic time it was checked)
+        self._positions: OrderedDict[int, tuple[Position, float]] = OrderedDict()
+        self._lock = threading.Lock()  # guards _pending and _positions
+        self._flush_lock = threading.Lock()  # one bulk insert at a time
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.received = 0
+        self.written = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.dropped = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="tracking-pings", daemon=True
+        )
+        self._thread.start()
+        print(f"✓ Tracking ping buffer started (flush every {self.flush_size} ping(s) or {self.flush_seconds:g}s)")
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self.flush()
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """Stop the flusher and write the pings still buffered."""
+        if self.running:
+            self._stopping.set()
+            self._wake.set()
+            self._thread.join(timeout)
+        self._thread = None
+        self.flush()
+
+    def _remember(self, order_id: int, position: Position | None) -> Position | None:
+        # Caller holds _lock. Pings can arrive out of order: keep the newest.
+        current = self._positions.get(order_id)
+        if current is not None and (position is None or current[0].ts > position.ts):
+            position = current[0]
+        if position is None:
+            return None
+        self._positions[order_id] = (position, time.monotonic())
+        self._positions.move_to_end(order_id)
+        while len(self._positions) > self.positions_max:
+            self._positions.popitem(last=False)
+        return position
+
+    def add(self, pings: list[tuple[int, float, float, datetime]]) -> None:
+        """Buffer validated ``(order_id, lat, lng, ts)`` pings."""
+        if not pings:
+            return
+        now = datetime.utcnow()
+        rows = [
+            {"order_id": order_id, "lat": lat, "lng": lng, "ts": ts, "received_at": now}
+            for order_id, lat, lng, ts in pings
+        ]
+        with self._lock:
+            self._pending.extend(rows)
+            for order_id, lat, lng, ts in pings:
+                self._remember(order_id, Position(lat, lng, ts))
+            self.received += len(rows)
+            pending = len(self._pending)
+        if pending >= self.max_pending or not self.running:
+            # Backpressure: the flusher is behind (or not running), so the
+            # request that overfilled the buffer writes it
+            self.flush()
+        elif pending >= self.flush_size:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """Bulk-insert the buffered pings; returns how many were written."""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._pending = self._pending, []
+            if not rows:
+                return 0
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(Event), rows)
+            except Exception as e:
+                with self._lock:
+                    # Retry with the next flush; past max_pending the oldest go
+                    self._pending[:0] = rows
+                    excess = len(self._pending) - self.max_pending
+                    if excess > 0:
+                        del self._pending[:excess]
+                        self.dropped += excess
+                self.failed_flushes += 1
+                print(f"⚠ Tracking ping flush failed, {len(rows)} ping(s) kept for retry: {e}")
+                return 0
+            self.written += len(rows)
+            self.flushes += 1
+            return len(rows)
+
+    def peek(self, order_id: int) -> Position | None:
+        """The remembered position, without falling back to the table."""
+        with self._lock:
+            entry = self._positions.get(order_id)
+            return entry[0] if entry else None
+
+    def last_position(self, order_id: int) -> Position | None:
+        with self._lock:
+            entry = self._positions.get(order_id)
+            if entry is not None and time.monotonic() - entry[1] < self.positions_ttl:
+                self._positions.move_to_end(order_id)
+                return entry[0]
+        with engine.connect() as conn:
+            row = conn.execute(
+                select(Event.lat, Event.lng, Event.ts)
+                .where(Event.order_id == order_id)
+                .order_by(Event.ts.desc())
+                .limit(1)
+            ).first()
+        position = Position(row.lat, row.lng, row.ts) if row is not None else None
+        with self._lock:
+            return self._remember(order_id, position)
+
+    def clear(self) -> None:
+        """Forget the remembered positions (buffered pings are kept)."""
+        with self._lock:
+            self._positions.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = len(self._pending)
+            positions = len(self._positions)
+        return {
+            "running": self.running,
+            "pending": pending,
+            "positions": positions,
+            "received": self.received,
+            "written": self.written,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "dropped": self.dropped,
+        }
+
+
+class TrackingCache:
+    """Read-through LRU of lookups by tracking code, with a short TTL."""
+
+    def __init__(self, ttl: float = 30.0, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max(max_entries, 1)
+        self._lock = threading.Lock()
+        # code -> (value, expires_at); None values cache unknown codes
+        self._entries: OrderedDict[str, tuple[Any, float]] = OrderedDict()
+        # Bumped by every invalidation; a load that overlapped one is not stored
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, code: str, load: Callable[[], Any]) -> Any:
+        with self._lock:
+            entry = self._entries.get(code)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(code)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            generation = self._generation
+        value = load()
+        with self._lock:
+            if generation != self._generation:
+                return value
+            self._entries[code] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(code)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, *codes: str | None) -> None:
+        with self._lock:
+            self._generation += 1
+            for code in codes:
+                if code is not None:
+                    self._entries.pop(code, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+ping_buffer = PingBuffer(
+    flush_size=settings.tracking_flush_size,
+    flush_seconds=settings.tracking_flush_seconds,
+    max_pending=settings.tracking_max_pending,
+    positions_max=settings.tracking_positions_max,
+    positions_ttl=settings.tracking_positions_ttl_seconds,
+)
+
+tracking_cache = TrackingCache(
+    ttl=settings.tracking_cache_ttl_seconds,
+    max_entries=settings.tracking_cache_size,
+)
@@ -0,0 +1,133 @@
+"""
+Shared fixtures. Settings are read from the environment when ``backend``
+is first imported, so the throwaway database and data directories (and
+empty SMTP / Gemini credentials, overriding any ``.env``) are set up here
+before anything imports the app.
+"""
+import os
+import tempfile
+
+_data_dir = tempfile.mkdtemp(prefix="sba-tests-")
+os.environ.update(
+    SQLITE_PATH=os.path.join(_data_dir, "app.db"),
+    SNAPSHOT_DIR=os.path.join(_data_dir, "snapshot"),
+    OUTBOX_DIR=os.path.join(_data_dir, "outbox"),
+    EBILL_DIR=os.path.join(_data_dir, "ebills"),
+    SMTP_USERNAME="",
+    SMTP_PASSWORD="",
+    EMAIL_FROM="shop@example.com",
+    OWNER_EMAIL="",
+    GEMINI_API_KEY="",
+    FAVICON_URL="",
+    SCHEDULER_ENABLED="false",
+    MAIL_DISPATCHER_ENABLED="false",
+    OUTBOX_ENABLED="false",
+    PDF_WORKERS="1",
+    ADMIN_TOKEN="test-admin-token",
+)
+
+import itertools
+import shutil
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.database import Base, SessionLocal, engine
+from backend.main import app
+from backend.settings import settings
+from backend.utils_cache import report_cache
+from backend.utils_tracking import ping_buffer, tracking_cache
+
+
+_owner_seq = itertools.count(1)
+
+ADMIN = {"Authorization": "Bearer test-admin-token"}
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    """Every test starts from empty tables and empty in-process caches."""
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+    shutil.rmtree(settings.snapshot_dir, ignore_errors=True)
+    report_cache.clear()
+    tracking_cache.clear()
+    ping_buffer.flush()
+    ping_buffer.clear()
+    yield
+
+
+@pytest.fixture
+def data_dir() -> str:
+    return _data_dir
+
+
+@pytest.fixture
+def client() -> TestClient:
+    # No lifespan: background workers stay off and tests drive them directly
+    return TestClient(app)
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def register_owner(client: TestClient) -> dict:
+    """Register a fresh owner; returns its id, email and auth headers."""
+    n = next(_owner_seq)
+    r = client.post(
+        "/auth/register",
+        json={
+            "name": f"Owner {n}",
+            "email": f"owner{n}@example.com",
+            "password": "secret123",
+            "pan_card": f"ABCDE{n:04d}F",
+            "contact": "9876543210",
+        },
+    )
+    assert r.status_code == 200, r.text
+    body = r.json()
+    return {
+        "id": body["owner"]["id"],
+        "email": body["owner"]["email"],
+        "headers": {"Authorization": f"Bearer {body['access_token']}"},
+    }
+
+
+@pytest.fixture
+def owner(client) -> dict:
+    return register_owner(client)
+
+
+def seed_shop(client: TestClient, owner: dict, n_orders: int = 3, address: str = "12 MG Road, Pune 411001") -> list[int]:
+    """Three items of ``owner`` and ``n_orders`` storefront orders for them."""
+    item_ids = []
+    for i in range(3):
+        r = client.post(
+            "/items/",
+            json={"name": f"item{i}", "price": 100.0 * (i + 1), "stock_quantity": 1000},
+            headers=owner["headers"],
+        )
+        assert r.status_code == 200, r.text
+        item_ids.append(r.json()["id"])
+    order_ids = []
+    for k in range(n_orders):
+        r = client.post(
+            "/orders/",
+            json={
+                "customer": {"name": f"c{k % 3}", "email": f"c{k % 3}@example.com", "address": address},
+                "items": [
+                    {"item_id": item_ids[k % 3], "quantity": 2},
+                    {"item_id": item_ids[0], "quantity": 1},
+                ],
+            },
+        )
+        assert r.status_code == 200, r.text
+        order_ids.append(r.json()["id"])
+    return order_ids
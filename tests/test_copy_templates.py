@@ -0,0 +1,70 @@
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from backend import utils_gemini
+from backend.database import engine
+from backend.settings import settings
+from backend.utils_gemini import generate_order_status_email, get_copy_template
+
+TEMPLATE = "Hi [[customer_name]], order #[[order_id]] is on its way. Total [[total_amount]]."
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    """Fake generate_email_content that records calls and the pool's state."""
+    calls = []
+
+    def fake(prompt):
+        calls.append(engine.pool.checkedout())
+        time.sleep(0.05)
+        return TEMPLATE
+
+    monkeypatch.setattr(settings, "gemini_api_key", "test-key")
+    monkeypatch.setattr(utils_gemini, "generate_email_content", fake)
+    utils_gemini._copy_cache.clear()
+    yield calls
+    utils_gemini._copy_cache.clear()
+
+
+def test_template_is_generated_once_without_holding_a_connection(gemini):
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(get_copy_template("dispatched")))
+        for _ in range(4)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == [TEMPLATE] * 4
+    assert gemini == [0]
+
+    # Another worker process finds it in the table
+    utils_gemini._copy_cache.clear()
+    assert get_copy_template("dispatched") == TEMPLATE
+    assert len(gemini) == 1
+
+
+def test_filled_copy_and_fallback(gemini, monkeypatch):
+    body = generate_order_status_email(
+        customer_name="Asha",
+        order_id=7,
+        status="dispatched",
+        status_change_time=datetime(2026, 10, 1, 9, 30),
+        total_amount=250.0,
+    )
+    assert body == "Hi Asha, order #7 is on its way. Total ₹250.00."
+
+    monkeypatch.setattr(utils_gemini, "generate_email_content", lambda prompt: "no placeholders")
+    assert get_copy_template("delivered") is None
+    fallback = generate_order_status_email(
+        customer_name="Asha",
+        order_id=7,
+        status="delivered",
+        status_change_time=datetime(2026, 10, 1, 9, 30),
+    )
+    assert "Asha" in fallback and "7" in fallback
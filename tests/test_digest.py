@@ -0,0 +1,43 @@
+from sqlalchemy import select
+
+from backend import models
+from backend.settings import settings
+from backend.utils_digest import notify_owner, send_owner_digests
+
+
+def _outbox(db) -> list:
+    return db.execute(select(models.EmailOutbox).order_by(models.EmailOutbox.id)).scalars().all()
+
+
+def _notify(db, kind: str, n: int = 1) -> None:
+    notify_owner(db, "owner@example.com", kind, f"{kind} {n}", "<p>body</p>", f"{kind} #{n}")
+
+
+def test_digest_mode_collects_events_but_sends_stock_outs_now(db, monkeypatch):
+    monkeypatch.setattr(settings, "owner_digest_mode", "minutes")
+    assert settings.owner_digest_urgent_kinds == ["out_of_stock"]
+
+    for n in range(3):
+        _notify(db, "new_order", n)
+    _notify(db, "order_cancelled")
+    _notify(db, "out_of_stock")
+    db.commit()
+
+    assert [row.subject for row in _outbox(db)] == ["out_of_stock 1"]
+    assert len(db.execute(select(models.OwnerEvent)).scalars().all()) == 4
+
+    assert send_owner_digests() == {"digests": 1, "events": 4}
+    digest = _outbox(db)[-1]
+    assert digest.subject == "Shop summary: 3 new orders, 1 cancelled orders"
+    assert "new_order #2" in digest.body_html
+    # Summarized once
+    assert send_owner_digests() == {"digests": 0, "events": 0}
+
+
+def test_immediate_mode_sends_every_event(db, monkeypatch):
+    monkeypatch.setattr(settings, "owner_digest_mode", "immediate")
+    _notify(db, "new_order")
+    _notify(db, "order_cancelled")
+    db.commit()
+    assert len(_outbox(db)) == 2
+    assert db.execute(select(models.OwnerEvent)).first() is None
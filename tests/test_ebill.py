@@ -0,0 +1,94 @@
+import os
+import time
+
+from backend.settings import settings
+from backend.utils_ebill import purge_ebills
+
+from conftest import seed_shop
+
+
+def _old(path: str) -> None:
+    past = time.time() - 7200
+    os.utime(path, (past, past))
+
+
+def test_download_supports_etag_and_ranges(client, owner):
+    order_id = seed_shop(client, owner, n_orders=1)[0]
+    url = f"/orders/{order_id}/ebill"
+    headers = owner["headers"]
+
+    full = client.get(url, headers=headers)
+    assert full.status_code == 200
+    pdf = full.content
+    assert pdf.startswith(b"%PDF")
+    etag = full.headers["etag"]
+    assert full.headers["accept-ranges"] == "bytes"
+
+    assert client.get(url, headers={**headers, "If-None-Match": etag}).status_code == 304
+
+    part = client.get(url, headers={**headers, "Range": "bytes=0-99"})
+    assert part.status_code == 206
+    assert part.content == pdf[:100]
+    assert part.headers["content-range"] == f"bytes 0-99/{len(pdf)}"
+
+    tail = client.get(url, headers={**headers, "Range": "bytes=-50"})
+    assert tail.status_code == 206 and tail.content == pdf[-50:]
+
+    beyond = client.get(url, headers={**headers, "Range": f"bytes={len(pdf)}-"})
+    assert beyond.status_code == 416
+    assert beyond.headers["content-range"] == f"bytes */{len(pdf)}"
+
+    # A range against an older version gets the whole current file
+    stale = client.get(url, headers={**headers, "Range": "bytes=0-99", "If-Range": '"old"'})
+    assert stale.status_code == 200 and stale.content == pdf
+
+    # A status change is a new e-bill with a new ETag
+    client.patch(f"/orders/{order_id}/status", json={"status": "dispatched"}, headers=headers)
+    changed = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+
+def test_customer_downloads_by_tracking_code(client, owner):
+    seed_shop(client, owner, n_orders=0)
+    item_id = client.get("/items/", headers=owner["headers"]).json()[0]["id"]
+    # Anonymous checkout: the code in its response is all the customer has
+    placed = client.post(
+        "/orders/",
+        json={
+            "customer": {"name": "Asha", "email": "asha@example.com", "address": "Pune 411001"},
+            "items": [{"item_id": item_id, "quantity": 1}],
+        },
+    ).json()
+    url = f"/tracking/by-code/{placed['tracking_id']}/ebill"
+
+    r = client.get(url)
+    assert r.status_code == 200 and r.content.startswith(b"%PDF")
+    owners_copy = client.get(f"/orders/{placed['id']}/ebill", headers=owner["headers"])
+    assert r.headers["etag"] == owners_copy.headers["etag"]
+    part = client.get(url, headers={"Range": "bytes=0-9"})
+    assert part.status_code == 206 and part.content == r.content[:10]
+
+    assert client.get(f"/orders/{placed['id']}/ebill").status_code == 401
+    assert client.get(f"/tracking/by-code/{placed['id']}/ebill").status_code == 404
+
+
+def test_purge_keeps_current_and_recent_ebills(client, owner):
+    order_id = seed_shop(client, owner, n_orders=1)[0]
+    url = f"/orders/{order_id}/ebill"
+    placed = client.get(url, headers=owner["headers"]).headers["etag"].strip('"')
+    client.patch(f"/orders/{order_id}/status", json={"status": "dispatched"}, headers=owner["headers"])
+    current = client.get(url, headers=owner["headers"]).headers["etag"].strip('"')
+
+    def stored() -> set[str]:
+        return {name.split(".")[0] for name in os.listdir(settings.ebill_dir)}
+
+    assert {placed, current} <= stored()
+    # Younger than an hour: kept even though nothing references it
+    assert purge_ebills() == 0
+
+    for name in os.listdir(settings.ebill_dir):
+        _old(os.path.join(settings.ebill_dir, name))
+    assert purge_ebills() >= 1
+    assert current in stored()
+    assert placed not in stored()
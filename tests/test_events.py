@@ -0,0 +1,77 @@
+import asyncio
+
+from backend import routers_events
+from backend.utils_events import EventHub
+
+from conftest import ADMIN, register_owner, seed_shop
+
+
+async def _take(frames, n: int) -> list[str]:
+    return [await asyncio.wait_for(anext(frames), 1) for _ in range(n)]
+
+
+def _events(frames: list[str]) -> list[str]:
+    return [f.split("\n")[1] for f in frames if f.startswith("id:")]
+
+
+def test_stream_resumes_after_the_last_event_id():
+    async def scenario():
+        hub = EventHub(history=4, client_buffer=10, keepalive_seconds=60)
+        hub.start()
+        first = hub.publish("order.created", 1, 10, {"id": 10})
+        hub.publish("order.created", 2, 20, {"id": 20})  # another owner's
+        hub.publish("order.status", 1, 10, {"id": 10})
+
+        frames = hub.stream(1, cursor=f"{hub.epoch}-{first.seq}")
+        replayed = await _take(frames, 2)
+        assert replayed[0].startswith("retry:")
+        assert _events(replayed) == ["event: order.status"]
+
+        # Live events follow the backlog, for this owner only
+        hub.publish("order.status", 2, 20, {"id": 20})
+        hub.publish("tracking.assigned", 1, 10, {"id": 10})
+        live = await _take(frames, 1)
+        assert live[0].startswith(f"id: {hub.epoch}-5\nevent: tracking.assigned")
+
+        # A cursor from another process start, or older than the history
+        for cursor in ("0-1", f"{hub.epoch}-0"):
+            assert _events(await _take(hub.stream(1, cursor=cursor), 2)) == ["event: reset"]
+
+        # The admin stream sees every owner
+        everything = hub.stream(None, cursor=f"{hub.epoch}-3")
+        assert len(_events(await _take(everything, 3))) == 2
+
+        await hub.stop()
+        assert [f async for f in frames] == []
+
+    asyncio.run(scenario())
+
+
+def test_stream_requires_a_token_and_the_callers_order(client, owner, monkeypatch):
+    order_id = seed_shop(client, owner, n_orders=1)[0]
+    other = register_owner(client)
+    opened = []
+
+    async def finite(*args):
+        yield "retry: 1000\n\n"
+
+    def stream(owner_id, order_id=None, cursor=None):
+        opened.append((owner_id, order_id))
+        return finite()
+
+    monkeypatch.setattr(routers_events.event_hub, "stream", stream)
+
+    assert client.get("/events").status_code == 401
+    assert client.get("/events", params={"access_token": "nope"}).status_code == 401
+    r = client.get("/events", params={"order_id": order_id}, headers=other["headers"])
+    assert r.status_code == 404
+    assert opened == []
+
+    token = owner["headers"]["Authorization"].split()[1]
+    assert client.get("/events", params={"order_id": order_id, "access_token": token}).status_code == 200
+    assert client.get("/events", headers=ADMIN).status_code == 200
+    assert opened == [(owner["id"], order_id), (None, None)]
+
+    assert client.get("/events/stats").status_code == 401
+    assert client.get("/events/stats", headers=owner["headers"]).status_code == 403
+    assert "subscribers" in client.get("/events/stats", headers=ADMIN).json()
@@ -0,0 +1,143 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from backend.settings import settings
+from backend.utils_gemini import GeminiClient
+
+from conftest import ADMIN
+
+
+class FakeGemini(ThreadingHTTPServer):
+    """Local stand-in for generateContent: ``mode`` is ok, error or slow."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.mode = "ok"
+        self.hits = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        server.hits += 1
+        self.rfile.read(int(self.headers["Content-Length"]))
+        if server.mode == "slow":
+            time.sleep(1.0)
+        if server.mode == "error":
+            self.send_response(500)
+            self.end_headers()
+            return
+        body = json.dumps(
+            {"candidates": [{"content": {"parts": [{"text": "generated copy"}]}}]}
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def gemini_server(monkeypatch):
+    server = FakeGemini()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(settings, "gemini_api_key", "test-key")
+    monkeypatch.setattr(settings, "gemini_base_url", server.url)
+    monkeypatch.setattr(settings, "gemini_model", "gemini-pro")
+    monkeypatch.setattr(settings, "gemini_timeout_seconds", 0.2)
+    monkeypatch.setattr(settings, "gemini_deadline_seconds", 0.5)
+    monkeypatch.setattr(settings, "gemini_breaker_threshold", 2)
+    monkeypatch.setattr(settings, "gemini_breaker_cooldown_seconds", 0.3)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client_on_loop():
+    """A GeminiClient started on its own loop thread, as in the app."""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    gemini = GeminiClient()
+
+    async def _start():
+        gemini.start()
+
+    asyncio.run_coroutine_threadsafe(_start(), loop).result()
+    yield gemini
+    asyncio.run_coroutine_threadsafe(gemini.stop(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def test_generates_through_the_shared_client(gemini_server, client_on_loop):
+    assert client_on_loop.generate_sync("prompt") == "generated copy"
+    assert client_on_loop.stats()["breaker"] == "closed"
+    assert gemini_server.hits == 1
+
+
+def test_errors_fall_through_models_and_count_once(gemini_server, client_on_loop):
+    gemini_server.mode = "error"
+    assert client_on_loop.generate_sync("prompt") is None
+    # gemini-pro, then gemini-1.5-pro: one failed call
+    assert gemini_server.hits == 2
+    assert client_on_loop.breaker.failures == 1
+
+
+def test_slow_model_is_cut_off_at_the_deadline(gemini_server, client_on_loop):
+    gemini_server.mode = "slow"
+    started = time.monotonic()
+    assert client_on_loop.generate_sync("prompt") is None
+    assert time.monotonic() - started < 1.0
+    assert client_on_loop.breaker.failures == 1
+
+
+def test_abandoned_call_is_one_failure_and_frees_the_trial(gemini_server, client_on_loop, monkeypatch):
+    async def hang(*args):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(settings, "gemini_deadline_seconds", 0.1)
+    monkeypatch.setattr(client_on_loop, "_generate", hang)
+    assert client_on_loop.generate_sync("prompt") is None
+    time.sleep(0.1)  # the cancellation runs on the loop thread
+    assert client_on_loop.breaker.failures == 1
+    assert not client_on_loop.breaker._trial
+
+
+def test_breaker_opens_skips_and_recovers(gemini_server, client_on_loop):
+    gemini_server.mode = "error"
+    for _ in range(2):
+        client_on_loop.generate_sync("prompt")
+    assert client_on_loop.stats()["breaker"] == "open"
+
+    hits = gemini_server.hits
+    assert client_on_loop.generate_sync("prompt") is None
+    assert gemini_server.hits == hits
+    assert client_on_loop.stats()["skipped"] == 1
+
+    time.sleep(0.35)
+    gemini_server.mode = "ok"
+    assert client_on_loop.generate_sync("prompt") == "generated copy"
+    assert client_on_loop.stats()["breaker"] == "closed"
+
+
+def test_gemini_stats_is_admin_only(client):
+    assert client.get("/gemini/stats").status_code == 401
+    assert client.get("/gemini/stats", headers=ADMIN).status_code == 200
@@ -0,0 +1,132 @@
+"""
+Geocoding against the bundled gazetteer and a small India Post directory
+sample (tests/fixtures/india_post_sample.csv: real offices, approximate
+coordinates, one row without coordinates).
+"""
+import csv
+import gzip
+import os
+import shutil
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from backend.utils_geocoding import (
+    DIRECTORY_COLUMNS,
+    Gazetteer,
+    PinDistanceTable,
+    compact_india_post,
+    delivery_days,
+    fetch_india_post,
+    geocode,
+    load_gazetteer,
+)
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+SAMPLE = os.path.join(FIXTURES, "india_post_sample.csv")
+
+
+@pytest.fixture
+def directory():
+    yield load_gazetteer(SAMPLE)
+    load_gazetteer("")
+
+
+@pytest.mark.parametrize(
+    "address, name",
+    [
+        ("Delhi Road, Meerut", "Meerut"),
+        ("45 Ajmer Road, Jaipur", "Jaipur"),
+        ("Delhi Gate, Agra, Uttar Pradesh", "Agra"),
+        ("Meerut, Delhi Road", "Meerut"),
+        # Nothing but the street name: better than no match
+        ("Delhi Road", "Delhi"),
+    ],
+)
+def test_street_names_do_not_outrank_the_place(address, name):
+    assert geocode(address).name == name
+
+
+def test_directory_adds_pins_and_districts(directory):
+    # A full PIN beats every name, street or not
+    place = geocode("Delhi Road, Partapur 250103")
+    assert (place.kind, place.pincode) == ("pin", "250103")
+    # Only the directory knows this district
+    assert geocode("MG Road, Bengaluru Urban").kind == "district"
+    # The office without coordinates adds nothing: its PIN falls back to the prefix
+    assert geocode("Kozhikode 673002").kind == "city"
+    # ~250 km from the shop in Jaipur: the second band
+    assert delivery_days("Partapur, Meerut 250103") == 2
+
+
+@pytest.fixture
+def http_dir(tmp_path):
+    shutil.copy(SAMPLE, tmp_path / "directory.csv")
+    with open(SAMPLE, "rb") as src, gzip.open(tmp_path / "directory.csv.gz", "wb") as dst:
+        dst.write(src.read())
+    handler = partial(SimpleHTTPRequestHandler, directory=str(tmp_path))
+    handler.func.log_message = lambda *args: None
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("name", ["directory.csv", "directory.csv.gz"])
+def test_fetch_compacts_the_directory(http_dir, tmp_path, name):
+    out = str(tmp_path / "out" / "india_post.csv.gz")
+    assert fetch_india_post(f"{http_dir}/{name}", out) == 12
+    with gzip.open(out, "rt", newline="") as f:
+        rows = list(csv.reader(f))
+    assert tuple(rows[0]) == DIRECTORY_COLUMNS
+    assert rows[1] == ["250002", "MEERUT", "UTTAR PRADESH", "28.9845", "77.7064"]
+    assert not [p for p in os.listdir(tmp_path / "out") if p != "india_post.csv.gz"]
+
+    try:
+        gazetteer = load_gazetteer(out)
+        assert "250103" in gazetteer.by_pin
+    finally:
+        load_gazetteer("")
+
+
+def test_fetch_rejects_a_file_that_is_not_the_directory(http_dir, tmp_path):
+    (tmp_path / "other.csv").write_text("name,value\na,1\n")
+    with pytest.raises(ValueError):
+        fetch_india_post(f"{http_dir}/other.csv", str(tmp_path / "out.csv.gz"))
+    assert not os.path.exists(tmp_path / "out.csv.gz")
+
+
+def test_directory_rows_without_a_valid_pin_are_skipped(tmp_path):
+    path = tmp_path / "directory.csv"
+    rows = [",".join(DIRECTORY_COLUMNS)] + [
+        f"{pin},Meerut,UTTAR PRADESH,28.98,77.70"
+        for pin in ("250002", "012345", "25000", "2500021", "25O002", "", "000000")
+    ]
+    path.write_text("\n".join(rows) + "\n")
+    try:
+        gazetteer = load_gazetteer(str(path))
+        assert [k for k in gazetteer.by_pin if len(k) == 6] == ["250002"]
+    finally:
+        load_gazetteer("")
+
+    out = str(tmp_path / "compact.csv.gz")
+    assert compact_india_post(str(path), out) == 1
+
+
+def test_pin_table_falls_back_to_the_prefix(directory):
+    table = directory.distances
+    meerut = table.km_to_pin("250002")
+    # Same 3-digit prefix, no centroid of its own: the prefix's distance
+    assert table.km_to_pin("250999") == table.km_to_pin("250000")
+    assert 200 < meerut < 300
+    assert table.days_for_pin("250002") == table.days_for_km(meerut) == 2
+    assert table.days_for_pin("999999") is None
+
+
+@pytest.mark.parametrize("band_km", [[50, 400, 400, 1800], [400, 50, 1000, 1800]])
+def test_delivery_bands_must_increase(band_km):
+    with pytest.raises(ValueError, match="strictly increasing"):
+        PinDistanceTable(Gazetteer(), 26.9, 75.8, band_km, [1, 2, 3, 4, 5])
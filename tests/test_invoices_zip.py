@@ -0,0 +1,64 @@
+import io
+import time
+import zipfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from backend import crud, models
+from backend.database import engine
+from backend.utils_ebill import stream_ebill_zip
+
+from conftest import register_owner, seed_shop
+
+START = datetime(2026, 1, 1)
+END = datetime(2100, 1, 1)
+
+
+def _same_created_at(order_ids: list[int]) -> None:
+    with engine.begin() as conn:
+        conn.execute(
+            update(models.Order)
+            .where(models.Order.id.in_(order_ids))
+            .values(created_at=datetime(2026, 10, 1, 12, 0))
+        )
+
+
+def test_keyset_batches_cover_ties_once(client, owner, db):
+    order_ids = seed_shop(client, owner, n_orders=5)
+    _same_created_at(order_ids[1:4])
+
+    batches = list(crud.iter_order_ids_between(db, START, END, owner["id"], batch_size=2))
+    assert [len(b) for b in batches] == [2, 2, 1]
+    assert sorted(i for b in batches for i in b) == sorted(order_ids)
+
+
+def test_paused_download_holds_no_connection(client, owner):
+    order_ids = seed_shop(client, owner, n_orders=3)
+    stream = stream_ebill_zip(START, END, owner["id"], batch_size=1)
+    first = next(stream)
+    assert first
+
+    # Mid-download: the pool is free and a writer commits at once
+    assert engine.pool.checkedout() == 0
+    started = time.monotonic()
+    with engine.begin() as conn:
+        conn.execute(update(models.Item).values(stock_quantity=models.Item.stock_quantity + 1))
+    assert time.monotonic() - started < 1.0
+
+    archive = zipfile.ZipFile(io.BytesIO(first + b"".join(stream)))
+    assert archive.namelist() == [f"Order_{i}_E-Bill.pdf" for i in order_ids]
+
+
+def test_zip_endpoint_is_scoped_to_the_owner(client, owner):
+    mine = seed_shop(client, owner, n_orders=2)
+    other = register_owner(client)
+    seed_shop(client, other, n_orders=2)
+    today = datetime.utcnow().date()
+    params = {"from": str(today - timedelta(days=1)), "to": str(today + timedelta(days=1))}
+
+    assert client.get("/reports/invoices.zip", params=params).status_code == 401
+    r = client.get("/reports/invoices.zip", params=params, headers=owner["headers"])
+    assert r.status_code == 200
+    names = zipfile.ZipFile(io.BytesIO(r.content)).namelist()
+    assert names == [f"Order_{i}_E-Bill.pdf" for i in mine]
@@ -0,0 +1,105 @@
+import socket
+from email.message import EmailMessage
+
+import pytest
+
+from backend.utils_mailer import MailDispatcher
+
+from conftest import ADMIN
+
+controller = pytest.importorskip("aiosmtpd.controller")
+
+
+class Sink:
+    def __init__(self):
+        self.recipients = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.recipients.extend(envelope.rcpt_tos)
+        return "250 OK"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _message(i: int) -> EmailMessage:
+    msg = EmailMessage()
+    msg["From"] = "shop@example.com"
+    msg["To"] = f"customer{i}@example.com"
+    msg["Subject"] = f"Order #{i}"
+    msg.set_content("On its way.")
+    return msg
+
+
+class SmtpSink:
+    def __init__(self):
+        self.sink = Sink()
+        self.port = _free_port()
+        self.server = None
+
+    def start(self):
+        self.server = controller.Controller(self.sink, hostname="127.0.0.1", port=self.port)
+        self.server.start()
+
+    def stop(self):
+        if self.server is not None:
+            self.server.stop()
+            self.server = None
+
+
+@pytest.fixture
+def smtp_sink():
+    sink = SmtpSink()
+    sink.start()
+    yield sink
+    sink.stop()
+
+
+@pytest.fixture
+def dispatcher(smtp_sink):
+    mailer = MailDispatcher(
+        lambda: {"hostname": "127.0.0.1", "port": smtp_sink.port, "start_tls": False, "timeout": 5},
+        pool_size=2,
+    )
+    mailer.start()
+    yield mailer
+    mailer.stop()
+
+
+def test_dispatcher_reuses_pooled_connections(smtp_sink, dispatcher):
+    futures = [dispatcher.submit(_message(i)) for i in range(20)]
+    for future in futures:
+        future.result(timeout=10)
+
+    assert sorted(smtp_sink.sink.recipients) == sorted(f"customer{i}@example.com" for i in range(20))
+    stats = dispatcher.stats()
+    assert stats["sent"] == 20 and stats["failed"] == 0
+    assert stats["connects"] <= 2
+
+
+def test_dispatcher_reconnects_after_the_server_drops(smtp_sink, dispatcher):
+    dispatcher.submit(_message(0)).result(timeout=10)
+    connects = dispatcher.stats()["connects"]
+
+    # A restart drops the pooled session; the next send opens a new one
+    smtp_sink.stop()
+    smtp_sink.start()
+    dispatcher.submit(_message(1)).result(timeout=10)
+
+    assert "customer1@example.com" in smtp_sink.sink.recipients
+    assert dispatcher.stats()["connects"] == connects + 1
+    assert dispatcher.stats()["failed"] == 0
+
+
+def test_submit_fails_when_not_running():
+    mailer = MailDispatcher(lambda: {})
+    with pytest.raises(RuntimeError):
+        mailer.submit(_message(0)).result(timeout=1)
+
+
+def test_mail_stats_is_admin_only(client):
+    assert client.get("/mail/stats").status_code == 401
+    assert client.get("/mail/stats", headers=ADMIN).status_code == 200
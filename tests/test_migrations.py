@@ -0,0 +1,134 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import inspect, text
+
+from backend.database import Base, SessionLocal, engine
+from backend.migrations import (
+    assign_legacy_rows,
+    migrate_add_expected_delivery_date,
+    migrate_add_owner_scoping,
+    migrate_add_tracking_id_index,
+    migrate_backfill_tax_lines,
+)
+from backend.utils_snapshot import query_snapshot, refresh_snapshot
+
+from conftest import ADMIN, register_owner
+
+# items, customers, orders and order_items as they were before owner scoping
+LEGACY_SCHEMA = [
+    """CREATE TABLE items (
+        id INTEGER PRIMARY KEY, name VARCHAR(200), description TEXT,
+        price FLOAT NOT NULL, discount_percent FLOAT, image_url VARCHAR(500),
+        stock_quantity INTEGER, is_active BOOLEAN, created_at DATETIME,
+        updated_at DATETIME
+    )""",
+    "CREATE UNIQUE INDEX ix_items_name ON items (name)",
+    """CREATE TABLE customers (
+        id INTEGER PRIMARY KEY, name VARCHAR(200), email VARCHAR(320),
+        address TEXT, phone VARCHAR(50), created_at DATETIME
+    )""",
+    """CREATE TABLE orders (
+        id INTEGER PRIMARY KEY, customer_id INTEGER REFERENCES customers(id),
+        status VARCHAR(10), total_amount FLOAT, tracking_id VARCHAR(200),
+        tracking_url VARCHAR(500), created_at DATETIME, updated_at DATETIME
+    )""",
+    """CREATE TABLE order_items (
+        id INTEGER PRIMARY KEY, order_id INTEGER REFERENCES orders(id),
+        item_id INTEGER REFERENCES items(id), quantity INTEGER,
+        price_at_purchase FLOAT
+    )""",
+]
+
+PLACED = datetime.utcnow().replace(microsecond=0)
+
+
+@pytest.fixture
+def legacy_db():
+    """Only the owners table is current; everything else is pre-031."""
+    def drop_all_but_owners(conn):
+        for table in reversed(Base.metadata.sorted_tables):
+            if table.name != "owners":
+                conn.execute(text(f"DROP TABLE IF EXISTS {table.name}"))
+
+    with engine.begin() as conn:
+        drop_all_but_owners(conn)
+        for statement in LEGACY_SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(text(
+            "INSERT INTO items (id, name, price, discount_percent, stock_quantity, is_active, created_at, updated_at) "
+            "VALUES (1, 'Kurta', 500.0, 0, 10, 1, :ts, :ts), (2, 'Dupatta', 250.0, 0, 10, 1, :ts, :ts)"
+        ), {"ts": PLACED})
+        conn.execute(text(
+            "INSERT INTO customers (id, name, email, address, created_at) "
+            "VALUES (1, 'Asha', 'asha@example.com', 'Pune 411001', :ts)"
+        ), {"ts": PLACED})
+        conn.execute(text(
+            "INSERT INTO orders (id, customer_id, status, total_amount, created_at, updated_at) "
+            "VALUES (1, 1, 'placed', 1250.0, :ts, :ts), (2, 1, 'delivered', 500.0, :ts, :ts)"
+        ), {"ts": PLACED})
+        conn.execute(text(
+            "INSERT INTO order_items (order_id, item_id, quantity, price_at_purchase) "
+            "VALUES (1, 1, 2, 500.0), (1, 2, 1, 250.0), (2, 1, 1, 500.0)"
+        ))
+    yield
+    with engine.begin() as conn:
+        drop_all_but_owners(conn)
+    Base.metadata.create_all(bind=engine)
+
+
+def _upgrade():
+    """What create_app runs on start."""
+    Base.metadata.create_all(bind=engine)
+    migrate_add_expected_delivery_date()
+    migrate_add_owner_scoping()
+    migrate_backfill_tax_lines()
+    migrate_add_tracking_id_index()
+
+
+def _sees(client, owner) -> tuple[list[int], float, float]:
+    orders = client.get("/orders/", headers=owner["headers"]).json()
+    tax = client.get("/reports/revenue/tax", params={"period": "month"}, headers=owner["headers"]).json()
+    return sorted(o["id"] for o in orders), tax["total_revenue"], tax["total_tax_due"]
+
+
+def test_sole_owner_keeps_their_data_after_the_upgrade(client, legacy_db):
+    owner = register_owner(client)
+    _upgrade()
+
+    order_ids, revenue, tax_due = _sees(client, owner)
+    assert (order_ids, revenue) == ([1, 2], 1750.0)
+    assert tax_due > 0
+    items = client.get("/items/", headers=owner["headers"]).json()
+    assert sorted(i["name"] for i in items) == ["Dupatta", "Kurta"]
+    names = {ix["name"] for ix in inspect(engine).get_indexes("items")}
+    assert "ix_items_name" not in names and "ix_items_owner_name" in names
+
+    _upgrade()  # a restart changes nothing
+    assert _sees(client, owner) == (order_ids, revenue, tax_due)
+
+
+def test_rows_wait_for_a_claim_when_owners_are_ambiguous(client, legacy_db, capsys):
+    first, second = register_owner(client), register_owner(client)
+    _upgrade()
+    assert "assign-legacy-rows" in capsys.readouterr().out
+
+    assert _sees(client, second) == ([], 0.0, 0.0)
+    assert len(client.get("/orders/", headers=ADMIN).json()) == 2
+    with SessionLocal() as db:
+        refresh_snapshot(db)
+    assert query_snapshot(group_by="none", owner_id=second["id"]) == []
+
+    assert assign_legacy_rows(second["id"]) == {"items": 2, "customers": 1, "orders": 2, "tax_lines": 3}
+    order_ids, revenue, tax_due = _sees(client, second)
+    assert (order_ids, revenue) == ([1, 2], 1750.0) and tax_due > 0
+    # The next snapshot refresh patches the owner of the claimed orders
+    with SessionLocal() as db:
+        refresh_snapshot(db)
+    assert query_snapshot(group_by="none", owner_id=second["id"]) == [{"key": "all", "value": 1750.0}]
+    assert _sees(client, first) == ([], 0.0, 0.0)
+    # Nothing left to claim
+    assert set(assign_legacy_rows(first["id"]).values()) == {0}
+
+    with pytest.raises(ValueError):
+        assign_legacy_rows(999)
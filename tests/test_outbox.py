@@ -0,0 +1,110 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select, update
+
+from backend import models, utils_outbox
+from backend.database import engine
+from backend.settings import settings
+from backend.utils_outbox import OutboxWorker, enqueue_email
+
+from conftest import ADMIN, seed_shop
+
+
+class FakeSmtp:
+    """Stands in for the SMTP senders; fails while ``down`` is set."""
+
+    def __init__(self):
+        self.down = False
+        self.sent = []
+
+    async def send(self, subject, to_email, body_html, body_text=None):
+        if self.down:
+            raise ConnectionError("SMTP unreachable")
+        self.sent.append({"subject": subject, "to": to_email, "html": body_html})
+
+    async def send_pdf(self, subject, to_email, body_html, data, filename, body_text=None):
+        await self.send(subject, to_email, body_html)
+        self.sent[-1].update(pdf=data, filename=filename)
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    fake = FakeSmtp()
+    monkeypatch.setattr(utils_outbox, "send_email_async", fake.send)
+    monkeypatch.setattr(utils_outbox, "send_email_with_pdf_async", fake.send_pdf)
+    return fake
+
+
+def _drain() -> int:
+    return asyncio.run(OutboxWorker(batch_size=100).drain_once())
+
+
+def _rows() -> list:
+    with engine.connect() as conn:
+        return conn.execute(select(models.EmailOutbox).order_by(models.EmailOutbox.id)).all()
+
+
+def _make_due() -> None:
+    with engine.begin() as conn:
+        conn.execute(update(models.EmailOutbox).values(next_attempt_at=datetime.utcnow()))
+
+
+def test_failed_send_backs_off_then_dead_letters_and_requeues(client, db, smtp, monkeypatch):
+    monkeypatch.setattr(settings, "outbox_max_attempts", 2)
+    enqueue_email(db, "Hello", "c@example.com", "<p>hi</p>")
+    db.commit()
+
+    smtp.down = True
+    assert _drain() == 1
+    row = _rows()[0]
+    assert (row.status, row.attempts, row.last_error) == ("pending", 1, "SMTP unreachable")
+    assert row.next_attempt_at > datetime.utcnow()
+    assert _drain() == 0  # not due yet
+
+    _make_due()
+    _drain()
+    assert (_rows()[0].status, _rows()[0].attempts) == ("dead", 2)
+
+    dead = client.get("/mail/outbox/dead", headers=ADMIN).json()
+    assert [d["id"] for d in dead] == [row.id]
+    assert client.post(f"/mail/outbox/{row.id}/retry").status_code == 401
+    assert client.post(f"/mail/outbox/{row.id}/retry", headers=ADMIN).status_code == 200
+    assert client.post(f"/mail/outbox/{row.id}/retry", headers=ADMIN).status_code == 404
+
+    smtp.down = False
+    _drain()
+    assert _rows()[0].status == "sent"
+    assert [m["to"] for m in smtp.sent] == ["c@example.com"]
+    assert client.get("/mail/outbox", headers=ADMIN).json()["sent"] == 1
+
+
+def test_order_email_is_composed_at_send_time(client, owner, smtp):
+    order_id = seed_shop(client, owner, n_orders=1)[0]
+
+    # The order commits a bare row: no body, no e-bill yet
+    customer_row = next(r for r in _rows() if r.order_id == order_id)
+    assert customer_row.order_status == "placed"
+    assert customer_row.body_html == ""
+    assert customer_row.attachment_path is None
+
+    r = client.patch(
+        f"/orders/{order_id}/status", json={"status": "dispatched"}, headers=owner["headers"]
+    )
+    assert r.status_code == 200, r.text
+    _drain()
+
+    emails = {m["subject"]: m for m in smtp.sent if m["to"] == "c0@example.com"}
+    placed = emails[f"Order #{order_id} Confirmation - E-Bill Attached"]
+    dispatched = emails[f"Order #{order_id} Has Been Dispatched - E-Bill Attached"]
+    assert "c0" in placed["html"] and "c0" in dispatched["html"]
+    assert dispatched["pdf"].startswith(b"%PDF")
+    assert dispatched["filename"] == f"Order_{order_id}_E-Bill.pdf"
+    assert all(r.status == "sent" for r in _rows())
+
+
+def test_outbox_endpoints_are_admin_only(client, owner):
+    assert client.get("/mail/outbox").status_code == 401
+    assert client.get("/mail/outbox/dead", headers=owner["headers"]).status_code == 403
+    assert client.get("/mail/outbox", headers=ADMIN).status_code == 200
@@ -0,0 +1,62 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from backend import crud, schemas
+
+from conftest import ADMIN, register_owner, seed_shop
+
+
+@pytest.mark.parametrize(
+    "method, path",
+    [
+        ("get", "/orders/"),
+        ("get", "/orders/1"),
+        ("patch", "/orders/1/status"),
+        ("get", "/items/"),
+        ("post", "/items/"),
+        ("patch", "/items/1"),
+        ("post", "/tracking/1/assign?tracking_id=X"),
+        ("get", "/reports/revenue/tax?period=month"),
+        ("get", "/reports/customers/rfm"),
+    ],
+)
+def test_tenant_endpoints_require_a_token(client, method, path):
+    body = {} if method == "get" else {"json": {}}
+    r = client.request(method.upper(), path, **body)
+    assert r.status_code == 401
+
+
+def test_owners_only_see_their_own_orders(client):
+    a, b = register_owner(client), register_owner(client)
+    a_orders = seed_shop(client, a, n_orders=2)
+    b_orders = seed_shop(client, b, n_orders=1)
+
+    listed = client.get("/orders/", headers=a["headers"]).json()
+    assert sorted(o["id"] for o in listed) == sorted(a_orders)
+    assert client.get(f"/orders/{b_orders[0]}", headers=a["headers"]).status_code == 404
+    r = client.patch(f"/orders/{b_orders[0]}/status", json={"status": "cancelled"}, headers=a["headers"])
+    assert r.status_code == 404
+
+
+def test_platform_scope_needs_the_admin_token(client):
+    a, b = register_owner(client), register_owner(client)
+    orders = seed_shop(client, a, n_orders=1) + seed_shop(client, b, n_orders=1)
+
+    assert sorted(o["id"] for o in client.get("/orders/", headers=ADMIN).json()) == sorted(orders)
+    forged = {"Authorization": "Bearer not-the-admin-token"}
+    assert client.get("/orders/", headers=forged).status_code == 401
+    assert client.post("/reports/analytics/snapshot", headers=a["headers"]).status_code == 403
+    assert client.post("/reports/analytics/snapshot", headers=ADMIN).status_code == 200
+
+
+def test_storefront_checkout_stays_anonymous(client, owner):
+    # seed_shop places its orders without a token
+    assert len(seed_shop(client, owner, n_orders=1)) == 1
+
+
+def test_item_names_are_unique_among_platform_items(db):
+    item = schemas.ItemCreate(name="Tea", price=10.0)
+    crud.create_item(db, item)
+    db.commit()
+    with pytest.raises(IntegrityError):
+        crud.create_item(db, item)
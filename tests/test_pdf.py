@@ -0,0 +1,109 @@
+import re
+import zlib
+from io import BytesIO
+
+from reportlab import rl_config
+from reportlab.pdfgen import canvas
+
+from backend import utils_pdf
+from backend.utils_pdf import generate_ebill_pdf, generate_revenue_report_pdf
+
+_STREAM = re.compile(rb"/Length (\d+)\s*>>\s*stream\r?\n")
+
+
+def _pages(pdf: bytes) -> list[str]:
+    """Decompressed content streams (one per page; fonts are not embedded)."""
+    return [
+        zlib.decompress(pdf[m.end():m.end() + int(m.group(1))]).decode("latin-1")
+        for m in _STREAM.finditer(pdf)
+    ]
+
+
+def sample_order(order_id: int, lines: int = 8) -> dict:
+    items = [
+        {
+            "id": n,
+            "item_id": n + 1,
+            "quantity": 1 + n % 3,
+            "price_at_purchase": 99.0 + n,
+            "item": {"name": f"Catalogue item {n + 1}", "discount_percent": 5.0 * (n % 2)},
+        }
+        for n in range(lines)
+    ]
+    return {
+        "id": order_id,
+        "status": "placed",
+        "total_amount": sum(i["quantity"] * i["price_at_purchase"] for i in items),
+        "created_at": "2026-10-01 10:30:00",
+        "customer": {"name": "Asha", "email": "asha@example.com", "address": "Pune 411001", "phone": None},
+        "items": items,
+        "tax_lines": [],
+    }
+
+
+def _strings(content: str) -> list[str]:
+    return re.findall(r"\((.*?)\) Tj", content)
+
+
+def test_ebill_draws_static_parts_once_per_page_and_every_item():
+    order = sample_order(7, lines=96)
+    pdf = generate_ebill_pdf(order)
+    pages = _pages(pdf)
+    assert len(pages) > 1
+    assert pdf.count(b"/Type /Page\n") == len(pages)
+
+    first = _strings(pages[0])
+    assert first.count("E-BILL / INVOICE") == 1
+    assert "Bill To:" in first and "Order ID: #7" in first
+    assert ["Item", "Qty", "Price", "Disc%", "Total"] == [
+        s for s in first if s in ("Item", "Qty", "Price", "Disc%", "Total")
+    ]
+    # Continuation pages carry only rows (and the summary on the last one)
+    assert all("E-BILL / INVOICE" not in _strings(p) for p in pages[1:])
+    assert "Thank you for your order!" in _strings(pages[-1])
+
+    drawn = [s for p in pages for s in _strings(p)]
+    for item in order["items"]:
+        assert item["item"]["name"][:30] in drawn
+
+
+def test_layout_fragments_are_cached_across_renders():
+    generate_ebill_pdf(sample_order(1))
+    cached = dict(utils_pdf._fragments)
+    assert ("ebill", "header") in cached
+
+    generate_ebill_pdf(sample_order(2))
+    assert utils_pdf._fragments == cached
+
+
+def test_revenue_report_lists_the_breakdown():
+    pdf = generate_revenue_report_pdf("Q3 2026", 1234.5, [("Week 1", 1000.0), ("Week 2", 234.5)])
+    drawn = [s for p in _pages(pdf) for s in _strings(p)]
+    assert "Revenue Report - Q3 2026" in drawn
+    assert "Breakdown:" in drawn
+    assert any("Week 2" in s for s in drawn)
+
+
+def test_flate_only_streams_are_scoped_to_these_documents():
+    default = rl_config.useA85
+    assert default  # reportlab's default, untouched by importing utils_pdf
+    assert b"/ASCII85Decode" not in generate_ebill_pdf(sample_order(3))
+    assert rl_config.useA85 == default
+
+    buf = BytesIO()
+    other = canvas.Canvas(buf)
+    other.drawString(100, 100, "Another document")
+    other.showPage()
+    other.save()
+    assert b"/ASCII85Decode" in buf.getvalue()
+
+
+def test_reportlab_canvas_still_keeps_operators_in_a_list():
+    """Fragments are read from and spliced into Canvas._code, which is private."""
+    c = canvas.Canvas(BytesIO())
+    assert isinstance(c._code, list)
+    start = len(c._code)
+    c.line(0, 0, 10, 10)
+    assert c._code[start:] and all(isinstance(op, str) for op in c._code[start:])
+    c.addLiteral("q Q")
+    assert c._code[-1] == "q Q"
@@ -0,0 +1,63 @@
+import time
+
+import pytest
+
+from backend import routers_orders
+from backend.settings import settings
+from backend.utils_render import PdfRenderer, RenderQueueFull
+
+from conftest import ADMIN, seed_shop
+
+
+@pytest.fixture
+def renderer():
+    pool = PdfRenderer(workers=1, max_queue=1)
+    yield pool
+    pool.shutdown()
+
+
+def test_full_queue_rejects_after_the_timeout(renderer):
+    busy = renderer.submit(time.sleep, 0.5)
+    with pytest.raises(RenderQueueFull):
+        renderer.submit(time.sleep, 0, timeout=0.05)
+    assert renderer.stats()["rejected"] == 1
+
+    # The slot comes back once the render is done
+    busy.result()
+    renderer.submit(time.sleep, 0, timeout=1).result()
+    assert renderer.stats()["submitted"] == 2
+
+
+def test_bulk_renders_only_missing_ebills(client, owner, monkeypatch):
+    order_ids = seed_shop(client, owner, n_orders=3)
+    payload = {"order_ids": order_ids + [order_ids[0], 999999]}
+
+    first = client.post("/orders/ebills", json=payload, headers=owner["headers"]).json()
+    assert first["requested"] == 4
+    assert first["rendered"] + first["cached"] == 3
+    assert first["missing"] == [999999]
+
+    second = client.post("/orders/ebills", json=payload, headers=owner["headers"]).json()
+    assert (second["rendered"], second["cached"]) == (0, 3)
+    assert second["ebills"] == first["ebills"]
+
+    monkeypatch.setattr(settings, "pdf_bulk_max_orders", 2)
+    r = client.post("/orders/ebills", json=payload, headers=owner["headers"])
+    assert r.status_code == 400
+
+
+def test_busy_renderer_is_a_503_on_download(client, owner, monkeypatch):
+    order_id = seed_shop(client, owner, n_orders=1)[0]
+
+    def full(*args, **kwargs):
+        raise RenderQueueFull("full")
+
+    monkeypatch.setattr(routers_orders, "get_or_render_ebill", full)
+    r = client.get(f"/orders/{order_id}/ebill", headers=owner["headers"])
+    assert r.status_code == 503
+    assert r.headers["retry-after"] == "5"
+
+
+def test_pdf_stats_is_admin_only(client):
+    assert client.get("/pdf/stats").status_code == 401
+    assert client.get("/pdf/stats", headers=ADMIN).json()["max_queue"] == settings.pdf_max_queue
@@ -0,0 +1,61 @@
+import threading
+import time
+from datetime import datetime
+
+from backend.utils_cache import ReportCache, bump_generation, read_generation
+
+from conftest import seed_shop
+
+
+CLOSED = (datetime(2024, 1, 1), datetime(2024, 2, 1))
+
+
+def test_concurrent_misses_compute_once():
+    cache = ReportCache(open_ttl=60, closed_ttl=3600)
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.1)
+        return 42
+
+    threads = [
+        threading.Thread(target=cache.get_or_compute, args=("k", *CLOSED, slow))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert cache.stats()["coalesced"] == 7
+
+
+def test_closed_periods_expire():
+    cache = ReportCache(open_ttl=60, closed_ttl=0)
+    assert cache.get_or_compute("k", *CLOSED, lambda: 1) == 1
+    assert cache.get_or_compute("k", *CLOSED, lambda: 2) == 2
+
+
+def test_generation_bump_invalidates_every_process_cache(db):
+    worker_a = ReportCache(open_ttl=60, closed_ttl=3600)
+    worker_b = ReportCache(open_ttl=60, closed_ttl=3600)
+    for cache in (worker_a, worker_b):
+        cache.get_or_compute("k", *CLOSED, lambda: "old", generation=read_generation(db))
+
+    bump_generation(db)
+    db.commit()
+
+    generation = read_generation(db)
+    assert worker_b.get_or_compute("k", *CLOSED, lambda: "new", generation=generation) == "new"
+    assert worker_a.get_or_compute("k", *CLOSED, lambda: "new", generation=generation) == "new"
+
+
+def test_only_cancelling_or_restoring_bumps_the_generation(client, owner, db):
+    order_id = seed_shop(client, owner, n_orders=1)[0]
+    generations = [read_generation(db)]
+    for status in ("processing", "cancelled", "cancelled", "placed"):
+        r = client.patch(f"/orders/{order_id}/status", json={"status": status}, headers=owner["headers"])
+        assert r.status_code == 200, r.text
+        generations.append(read_generation(db))
+    assert generations == [0, 0, 1, 1, 2]
@@ -0,0 +1,93 @@
+from sqlalchemy import delete, select, update
+
+from backend import models
+from backend.utils_rfm import list_customer_scores, refresh_customer_scores
+
+from conftest import register_owner
+
+
+def _shop(client, owner, price, spends):
+    r = client.post(
+        "/items/",
+        json={"name": "widget", "price": price, "stock_quantity": 1000},
+        headers=owner["headers"],
+    )
+    item_id = r.json()["id"]
+    for k, quantity in enumerate(spends):
+        r = client.post(
+            "/orders/",
+            json={
+                "customer": {"name": f"c{k}", "email": f"o{owner['id']}c{k}@example.com"},
+                "items": [{"item_id": item_id, "quantity": quantity}],
+            },
+        )
+        assert r.status_code == 200, r.text
+
+
+def _monetary_scores(db, owner):
+    return {
+        row["monetary"]: row["monetary_score"]
+        for row in list_customer_scores(db, owner_id=owner["id"])
+    }
+
+
+def test_scores_rank_customers_within_their_own_shop(client, db):
+    small, big = register_owner(client), register_owner(client)
+    _shop(client, small, 1.0, [1, 2, 3, 4, 5])
+    _shop(client, big, 1000.0, [1, 2, 3, 4, 5])
+
+    refresh_customer_scores(db, full=True)
+
+    # Platform-wide quintiles would put every customer of the small shop
+    # in the bottom half and every customer of the big one in the top half
+    expected = [1, 2, 3, 4, 5]
+    assert [score for _, score in sorted(_monetary_scores(db, small).items())] == expected
+    assert [score for _, score in sorted(_monetary_scores(db, big).items())] == expected
+
+
+def test_incremental_run_scores_against_the_same_shop(client, db):
+    small, big = register_owner(client), register_owner(client)
+    _shop(client, small, 1.0, [1, 2, 3, 4])
+    _shop(client, big, 1000.0, [1, 2, 3, 4])
+    refresh_customer_scores(db, full=True)
+
+    item_id = client.get("/items/", headers=small["headers"]).json()[0]["id"]
+    r = client.post(
+        "/orders/",
+        json={
+            "customer": {"name": "new", "email": "new@example.com"},
+            "items": [{"item_id": item_id, "quantity": 9}],
+        },
+    )
+    assert r.status_code == 200, r.text
+    result = refresh_customer_scores(db)
+    assert result["mode"] == "incremental"
+    assert _monetary_scores(db, small)[9.0] == 5
+
+
+def test_full_run_drops_scores_of_customers_without_orders(client, owner, db):
+    _shop(client, owner, 10.0, [1, 2, 3])
+    refresh_customer_scores(db, full=True)
+    customers = sorted(db.execute(select(models.CustomerScore.customer_id)).scalars())
+    assert len(customers) == 3
+
+    # One customer's orders are all cancelled, another one's are gone
+    gone, cancelled = customers[0], customers[1]
+    db.execute(
+        update(models.Order)
+        .where(models.Order.customer_id == cancelled)
+        .values(status=models.OrderStatus.cancelled)
+    )
+    order_ids = select(models.Order.id).where(models.Order.customer_id == gone)
+    db.execute(delete(models.TaxLine).where(models.TaxLine.order_id.in_(order_ids)))
+    db.execute(delete(models.OrderItem).where(models.OrderItem.order_id.in_(order_ids)))
+    db.execute(delete(models.Order).where(models.Order.customer_id == gone))
+    db.commit()
+
+    assert refresh_customer_scores(db, full=True)["customers_scored"] == 1
+    assert [row["customer_id"] for row in list_customer_scores(db)] == [customers[2]]
+
+    db.execute(update(models.Order).values(status=models.OrderStatus.cancelled))
+    db.commit()
+    assert refresh_customer_scores(db, full=True)["customers_scored"] == 0
+    assert list_customer_scores(db) == []
@@ -0,0 +1,64 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+from backend import models
+from backend.database import engine
+from backend.utils_scheduler import Scheduler, job_stats
+
+from conftest import ADMIN
+
+
+def _workers(func=lambda: None):
+    workers = [Scheduler(tick_seconds=0.01, jitter_seconds=0) for _ in range(2)]
+    for worker in workers:
+        worker.register("job", func, 3600, timeout_seconds=60, jitter_seconds=0)
+        worker._ensure_rows()
+    return workers
+
+
+def _lease():
+    with engine.connect() as conn:
+        return conn.execute(select(models.JobLease).where(models.JobLease.name == "job")).one()
+
+
+def test_one_worker_claims_a_due_job():
+    a, b = _workers()
+    assert a._claim("job")
+    assert not b._claim("job")
+    lease = _lease()
+    assert lease.holder == a.worker_id
+    # The explicit timeout, not the hour-long interval, bounds the lease
+    assert lease.lease_until - lease.last_started_at == timedelta(seconds=60)
+
+
+def test_expired_lease_can_be_taken_over():
+    a, b = _workers()
+    assert a._claim("job")
+    past = datetime.utcnow() - timedelta(seconds=1)
+    with engine.begin() as conn:
+        conn.execute(update(models.JobLease).values(next_run_at=past, lease_until=past))
+    assert b._claim("job")
+    assert _lease().holder == b.worker_id
+
+
+def test_loop_runs_leased_and_local_jobs(client):
+    ran = []
+
+    async def main():
+        worker = _workers(lambda: ran.append("leased"))[0]
+        worker.register_local("local", lambda: ran.append("local"), 0)
+        worker.start()
+        await asyncio.sleep(0.3)
+        await worker.stop()
+        return worker
+
+    worker = asyncio.run(main())
+    assert ran.count("leased") == 1
+    assert ran.count("local") >= 2
+    assert not worker._running
+    # Local jobs have no lease row
+    assert [job["name"] for job in job_stats()] == ["job"]
+    assert client.get("/scheduler/jobs").status_code == 401
+    assert client.get("/scheduler/jobs", headers=ADMIN).json()[0]["run_count"] == 1
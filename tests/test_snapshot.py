@@ -0,0 +1,67 @@
+import os
+
+import numpy as np
+
+from backend import models
+from backend.settings import settings
+from backend.utils_snapshot import OrderSnapshot, get_snapshot, query_snapshot, refresh_snapshot
+
+from conftest import seed_shop
+
+
+def test_item_positions_mask_items_of_missing_orders():
+    snap = OrderSnapshot.__new__(OrderSnapshot)
+    snap.orders = {"id": np.array([2, 5, 9], dtype=np.int64)}
+    snap.order_items = {"order_id": np.array([5, 3, 9, 12, 2], dtype=np.int64)}
+    pos, found = snap.item_order_positions()
+    assert found.tolist() == [True, False, True, False, True]
+    assert pos[found].tolist() == [1, 2, 0]
+
+
+def test_item_level_query_ignores_items_without_order(client, owner, db):
+    seed_shop(client, owner, n_orders=2)
+    refresh_snapshot(db)
+    before = query_snapshot(metric="quantity", group_by="none")
+    # An order item whose order is not in the snapshot (e.g. committed
+    # between the two fetches of a refresh) must not count towards another order
+    snap = get_snapshot()
+    snap.order_items = {
+        name: np.concatenate([col, np.array([10**6], dtype=col.dtype)])
+        for name, col in snap.order_items.items()
+    }
+    assert query_snapshot(metric="quantity", group_by="none") == before
+
+
+def test_item_level_order_count_counts_orders_not_lines(client, owner, db):
+    # Lines per order: (item0, item0), (item1, item0), (item2, item0)
+    seed_shop(client, owner, n_orders=3)
+    refresh_snapshot(db)
+    items = sorted(i["id"] for i in client.get("/items/", headers=owner["headers"]).json())
+
+    by_item = query_snapshot(metric="orders", group_by="item")
+    assert by_item == [{"key": items[0], "value": 3}, {"key": items[1], "value": 1}, {"key": items[2], "value": 1}]
+    assert query_snapshot(metric="orders", group_by="none", item_id=items[0]) == [{"key": "all", "value": 3}]
+    per_day = query_snapshot(metric="orders", group_by="day", item_id=items[0])
+    assert [row["value"] for row in per_day] == [3]
+    # Line-level metrics still add up every line
+    assert query_snapshot(metric="quantity", group_by="item")[0] == {"key": items[0], "value": 5}
+
+
+def test_refresh_writes_a_new_version_directory(client, owner, db):
+    order_ids = seed_shop(client, owner, n_orders=2)
+    first = refresh_snapshot(db)
+    old = get_snapshot()
+    old_ids = np.array(old.orders["id"])
+
+    client.patch(f"/orders/{order_ids[0]}/status", json={"status": "cancelled"}, headers=owner["headers"])
+    second = refresh_snapshot(db)
+    assert second["dir"] != first["dir"]
+    # Readers of the previous version keep a consistent mapping
+    assert np.array_equal(old.orders["id"], old_ids)
+    assert get_snapshot().meta["dir"] == second["dir"]
+    cancelled = query_snapshot(metric="orders", group_by="status", include_cancelled=True)
+    assert {"key": models.OrderStatus.cancelled.value, "value": 1} in cancelled
+
+    third = refresh_snapshot(db)
+    kept = sorted(name for name in os.listdir(settings.snapshot_dir) if name.startswith("v"))
+    assert kept == sorted([second["dir"], third["dir"]])
@@ -0,0 +1,60 @@
+from datetime import date, timedelta
+
+from backend.utils_alerts import active_owners, alert_kind_for, plan_tax_alerts, release_alerts
+from backend.utils_tax import get_current_quarter_deadline
+
+from conftest import register_owner, seed_shop
+
+
+def _day_in_window(kind: str) -> date:
+    day = date(2026, 1, 1)
+    while alert_kind_for((get_current_quarter_deadline(day) - day).days) != kind:
+        day += timedelta(days=1)
+    return day
+
+
+def test_manual_run_renders_once_per_variant(client, db):
+    owners = [register_owner(client) for _ in range(3)]
+    seed_shop(client, owners[0], n_orders=2)
+
+    plan = plan_tax_alerts(db, active_owners(db), kind="manual")
+
+    assert sorted(to for _, to, _ in plan["messages"]) == sorted(o["email"] for o in owners)
+    # One revenue scope per owner, but the two owners without sales share a body
+    assert plan["revenue_scopes"] == 3
+    assert plan["variants"] == 2
+    # The shared body is personalised after rendering
+    for _, to, body in plan["messages"]:
+        owner_no = to.removeprefix("owner").split("@")[0]
+        assert f"Owner {owner_no}" in body
+
+
+def test_outside_alert_windows_nothing_is_planned(client, db):
+    register_owner(client)
+    day = _day_in_window(None)
+    plan = plan_tax_alerts(db, active_owners(db), today=day)
+    assert plan["kind"] is None
+    assert plan["messages"] == []
+
+
+def test_windowed_alerts_are_sent_once_per_owner_and_quarter(client, db):
+    owners = [register_owner(client) for _ in range(2)]
+    day = _day_in_window("1_week")
+
+    first = plan_tax_alerts(db, active_owners(db), today=day)
+    again = plan_tax_alerts(db, active_owners(db), today=day + timedelta(days=1))
+
+    assert first["kind"] == "1_week"
+    assert sorted(to for _, to, _ in first["messages"]) == sorted(o["email"] for o in owners)
+    assert again["messages"] == []
+
+
+def test_failed_sends_are_released_for_the_next_run(client, db):
+    owner = register_owner(client)
+    day = _day_in_window("1_week")
+    plan = plan_tax_alerts(db, active_owners(db), today=day)
+
+    release_alerts([owner["email"]], plan["quarter"], plan["kind"])
+
+    retry = plan_tax_alerts(db, active_owners(db), today=day)
+    assert [to for _, to, _ in retry["messages"]] == [owner["email"]]
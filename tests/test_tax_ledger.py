@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select, update
+
+from backend import crud, models
+from backend.migrations import migrate_backfill_tax_lines
+
+from conftest import seed_shop
+
+
+def _period(order: models.Order):
+    start = datetime(order.created_at.year, order.created_at.month, order.created_at.day)
+    return start, start + timedelta(days=1)
+
+
+def _ledger(db, order_id):
+    return db.execute(
+        select(models.TaxLine.kind, models.TaxLine.taxable_amount, models.TaxLine.created_at)
+        .where(models.TaxLine.order_id == order_id)
+        .order_by(models.TaxLine.id)
+    ).all()
+
+
+def test_cancellation_leaves_the_placement_period_in_revenue_and_tax(client, owner, db):
+    order_id = seed_shop(client, owner, n_orders=1)[0]
+    order = db.get(models.Order, order_id)
+    # Placed yesterday, cancelled today
+    yesterday = order.created_at - timedelta(days=1)
+    db.execute(update(models.Order).where(models.Order.id == order_id).values(created_at=yesterday))
+    db.execute(update(models.TaxLine).where(models.TaxLine.order_id == order_id).values(created_at=yesterday))
+    db.commit()
+    db.refresh(order)
+    start, end = _period(order)
+    assert crud.tax_between(db, start, end, owner["id"])["taxable"] == order.total_amount
+
+    r = client.patch(f"/orders/{order_id}/status", json={"status": "cancelled"}, headers=owner["headers"])
+    assert r.status_code == 200
+
+    assert crud.revenue_between(db, start, end, owner["id"]) == 0.0
+    assert crud.tax_between(db, start, end, owner["id"])["taxable"] == 0.0
+    assert all(created_at == yesterday for _, _, created_at in _ledger(db, order_id))
+
+
+def test_backfill_posts_cancelled_orders_so_they_can_be_restored(client, owner, db):
+    order_id = seed_shop(client, owner, n_orders=1)[0]
+    total = db.get(models.Order, order_id).total_amount
+    # A cancelled order from before the ledger existed
+    db.execute(delete(models.TaxLine))
+    db.execute(
+        update(models.Order)
+        .where(models.Order.id == order_id)
+        .values(status=models.OrderStatus.cancelled)
+    )
+    db.commit()
+
+    migrate_backfill_tax_lines()
+    migrate_backfill_tax_lines()  # idempotent
+
+    lines = _ledger(db, order_id)
+    assert sorted({kind for kind, _, _ in lines}) == ["reversal", "sale"]
+    assert round(sum(amount for _, amount, _ in lines), 2) == 0.0
+
+    r = client.patch(f"/orders/{order_id}/status", json={"status": "placed"}, headers=owner["headers"])
+    assert r.status_code == 200
+    assert round(sum(amount for _, amount, _ in _ledger(db, order_id)), 2) == total
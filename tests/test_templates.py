@@ -0,0 +1,49 @@
+from backend.utils_templates import _verbatim_fields, render, render_batch, status_message
+
+
+def _alert(owner_name: str, revenue: float) -> dict:
+    return {"owner_name": owner_name, "revenue": revenue}
+
+
+SHARED = {
+    "kind": "1_week",
+    "quarter": "Q3 2026",
+    "tax_rate": 10.0,
+    "breakdown": {"CGST": 50.0, "SGST": 50.0},
+    "total_tax": 100.0,
+    "deadline": "29 Sep 2026",
+    "days_until": 7,
+    "days_note": "",
+}
+
+
+def test_batch_splices_verbatim_fields_like_a_full_render():
+    rows = [{"owner_name": name} for name in ("Asha", "<b>Ravi & Sons</b>", "")]
+    assert "owner_name" in _verbatim_fields("tax_alert.html")
+
+    bodies = render_batch("tax_alert.html", rows, revenue=1000.0, **SHARED)
+
+    assert bodies == [render("tax_alert.html", **SHARED, revenue=1000.0, **row) for row in rows]
+    assert "&lt;b&gt;Ravi &amp; Sons&lt;/b&gt;" in bodies[1]
+    assert "<b>Ravi" not in bodies[1]
+
+
+def test_batch_falls_back_for_filtered_fields():
+    # revenue goes through |money, so it cannot be spliced in verbatim
+    assert "revenue" not in _verbatim_fields("tax_alert.html")
+    rows = [_alert("Asha", 1234.5), _alert("Ravi", 99.0)]
+
+    bodies = render_batch("tax_alert.html", rows, **SHARED)
+
+    assert bodies == [render("tax_alert.html", **SHARED, **row) for row in rows]
+    assert "1,234.50" in bodies[0] and "99.00" in bodies[1]
+
+
+def test_order_copy_is_escaped_and_keeps_line_breaks():
+    html = render("order_customer.html", content="Dear <Asha>,\nThanks!")
+    assert "Dear &lt;Asha&gt;,<br>Thanks!" in html
+
+
+def test_status_message_falls_back_for_unknown_status():
+    assert status_message("DISPATCHED") == status_message("dispatched")
+    assert status_message("lost") == status_message("")
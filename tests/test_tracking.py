@@ -0,0 +1,274 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, insert, inspect, select, text, update
+
+from backend import models, routers_tracking, utils_backfill
+from backend.database import engine
+from backend.migrations import migrate_add_tracking_id_index
+from backend.utils_backfill import backfill_delivery, backfill_status
+from backend.utils_geocoding import delivery_days, parse_address_for_coords
+from backend.utils_tracking import PingBuffer
+
+from conftest import ADMIN, register_owner, seed_shop
+
+T0 = datetime(2026, 10, 1, 12, 0)
+
+
+def _stored() -> int:
+    with engine.connect() as conn:
+        return conn.execute(select(func.count(models.TrackingEvent.id))).scalar_one()
+
+
+def _ping(order_id: int, minute: int, lat: float = 26.9) -> tuple:
+    return order_id, lat, 75.8, T0 + timedelta(minutes=minute)
+
+
+@pytest.fixture
+def pings():
+    buffer = PingBuffer(flush_size=3, flush_seconds=60)
+    yield buffer
+    buffer.stop()
+
+
+def test_backfill_is_admin_only(client, owner, monkeypatch):
+    seed_shop(client, owner, n_orders=2)
+    started = []
+    monkeypatch.setattr(routers_tracking, "start_backfill", lambda *args: started.append(args))
+
+    for method in (client.post, client.get):
+        assert method("/tracking/backfill").status_code == 401
+        assert method("/tracking/backfill", headers=owner["headers"]).status_code == 403
+        assert method("/tracking/backfill", headers={"Authorization": "Bearer nope"}).status_code == 403
+    assert started == []
+
+    r = client.post("/tracking/backfill", params={"recompute_all": True}, headers=ADMIN)
+    assert r.status_code == 202
+    assert started == [("all", None, False)]
+
+    assert client.get("/tracking/backfill", headers=ADMIN).status_code == 404
+    backfill_delivery("missing", progress=None)
+    status = client.get("/tracking/backfill", headers=ADMIN).json()
+    assert status["processed"] == status["total"]
+
+
+PUNE = "12 MG Road, Pune 411001"
+JAIPUR = "MI Road, Jaipur 302001"
+
+
+def _orders(order_ids: list[int]) -> dict[int, tuple]:
+    """order id -> (tracking_url, expected_delivery_date, created_at, address)"""
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(
+                models.Order.id,
+                models.Order.tracking_url,
+                models.Order.expected_delivery_date,
+                models.Order.created_at,
+                models.Customer.address,
+            )
+            .join(models.Customer, models.Order.customer_id == models.Customer.id)
+            .where(models.Order.id.in_(order_ids))
+        ).all()
+    return {row[0]: tuple(row[1:]) for row in rows}
+
+
+def _expected(created_at: datetime, address: str) -> tuple[str, datetime]:
+    lat, lng = parse_address_for_coords(address)
+    return f"https://www.google.com/maps?q={lat},{lng}", created_at + timedelta(days=delivery_days(address))
+
+
+@pytest.fixture
+def backfill_shop(client, owner, monkeypatch):
+    """Five orders by c0, c1, c2, c0, c1: two distinct addresses."""
+    order_ids = seed_shop(client, owner, n_orders=5)
+    with engine.begin() as conn:
+        for email, address in (("c0@example.com", PUNE), ("c1@example.com", JAIPUR), ("c2@example.com", PUNE)):
+            conn.execute(update(models.Customer).where(models.Customer.email == email).values(address=address))
+    geocoded = []
+
+    def counting(address):
+        geocoded.append(address)
+        return parse_address_for_coords(address)
+
+    monkeypatch.setattr(utils_backfill, "parse_address_for_coords", counting)
+    return order_ids, geocoded
+
+
+def test_interrupted_backfill_resumes_from_its_checkpoint(backfill_shop):
+    order_ids, geocoded = backfill_shop
+    missing = [order_ids[i] for i in (0, 1, 3, 4)]
+    with engine.begin() as conn:
+        conn.execute(
+            update(models.Order)
+            .where(models.Order.id.in_(missing))
+            .values(tracking_url=None, expected_delivery_date=None)
+        )
+    untouched = _orders([order_ids[2]])
+
+    def crash(progress):
+        raise RuntimeError("worker killed")
+
+    with pytest.raises(RuntimeError):
+        backfill_delivery("missing", chunk_size=2, progress=crash)
+    status = backfill_status("missing")
+    assert (status["total"], status["processed"], status["last_error"]) == (4, 2, "worker killed")
+    assert status["finished_at"] is None
+    stored = _orders(missing)
+    assert all(stored[i][0] and stored[i][1] for i in missing[:2])
+    assert all(stored[i][:2] == (None, None) for i in missing[2:])
+    assert geocoded == [PUNE, JAIPUR]
+
+    geocoded.clear()
+    result = backfill_delivery("missing", chunk_size=2, progress=None)
+    assert (result["processed"], result["updated"], result["addresses"]) == (4, 4, 2)
+    assert result["finished_at"] is not None and result["last_error"] is None
+    # Orders 4 and 5 only: the checkpoint skipped what was written, and
+    # each address was geocoded once
+    assert sorted(geocoded) == sorted([PUNE, JAIPUR])
+
+    for url, eta, created_at, address in _orders(missing).values():
+        assert (url, eta) == _expected(created_at, address)
+    assert _orders([order_ids[2]]) == untouched
+
+
+def test_recompute_all_keeps_the_link_of_dispatched_orders(client, owner, backfill_shop):
+    order_ids, geocoded = backfill_shop
+    r = client.patch(f"/orders/{order_ids[0]}/status", json={"status": "dispatched"}, headers=owner["headers"])
+    assert r.status_code == 200
+    carrier = "https://carrier.example.com/track/AWB1"
+    with engine.begin() as conn:
+        conn.execute(update(models.Order).values(tracking_url="stale", expected_delivery_date=T0))
+        conn.execute(update(models.Order).where(models.Order.id == order_ids[0]).values(tracking_url=carrier))
+
+    result = backfill_delivery("all", chunk_size=2, progress=None)
+    assert (result["processed"], result["updated"], result["addresses"]) == (5, 5, 2)
+    assert len(geocoded) == 2
+
+    stored = _orders(order_ids)
+    for order_id, (url, eta, created_at, address) in stored.items():
+        expected_url, expected_eta = _expected(created_at, address)
+        assert eta == expected_eta
+        assert url == (carrier if order_id == order_ids[0] else expected_url)
+
+
+def test_pings_are_written_in_bulk(client, owner, pings):
+    order_id = seed_shop(client, owner, n_orders=1)[0]
+    pings.start()
+    pings.add([_ping(order_id, 0), _ping(order_id, 1)])
+    assert (pings.stats()["pending"], _stored()) == (2, 0)
+
+    # flush_size reached: the flusher writes all three in one insert
+    pings.add([_ping(order_id, 2)])
+    deadline = time.monotonic() + 5
+    while pings.stats()["written"] < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert (_stored(), pings.stats()["flushes"]) == (3, 1)
+
+    # Stopping writes what is left; an older ping does not move the rider back
+    pings.add([_ping(order_id, -5, lat=20.0)])
+    pings.stop()
+    assert (_stored(), pings.stats()["pending"]) == (4, 0)
+    assert pings.last_position(order_id).ts == T0 + timedelta(minutes=2)
+
+
+def test_remembered_position_expires(client, owner, pings):
+    order_id = seed_shop(client, owner, n_orders=1)[0]
+    pings.add([_ping(order_id, 0)])
+    # A newer ping taken by another worker process
+    with engine.begin() as conn:
+        conn.execute(insert(models.TrackingEvent), [
+            {"order_id": order_id, "lat": 27.0, "lng": 75.8, "ts": T0 + timedelta(minutes=5)}
+        ])
+
+    assert pings.last_position(order_id).ts == T0
+    pings.positions_ttl = 0
+    assert pings.last_position(order_id).lat == 27.0
+    # A ping taken by this process replaces it at once
+    pings.positions_ttl = 60
+    pings.add([_ping(order_id, 9, lat=28.0)])
+    assert pings.last_position(order_id).lat == 28.0
+
+
+def test_order_tracking_is_scoped_to_the_owner(client, owner):
+    order_id = seed_shop(client, owner, n_orders=1)[0]
+    other = register_owner(client)
+    r = client.post(
+        "/tracking/pings",
+        json={"pings": [{"order_id": order_id, "lat": 26.9, "lng": 75.8, "ts": T0.isoformat()}]},
+        headers=other["headers"],
+    )
+    assert r.json() == {"accepted": 0, "rejected": 1}
+    r = client.post(
+        "/tracking/pings",
+        json={"pings": [{"order_id": order_id, "lat": 26.9, "lng": 75.8, "ts": T0.isoformat()}]},
+        headers=owner["headers"],
+    )
+    assert r.json() == {"accepted": 1, "rejected": 0}
+
+    assert client.get(f"/tracking/{order_id}").status_code == 401
+    assert client.get(f"/tracking/{order_id}", headers=other["headers"]).status_code == 404
+    body = client.get(f"/tracking/{order_id}", headers=owner["headers"]).json()
+    assert body["position"]["lat"] == 26.9
+    assert client.get(f"/tracking/{order_id}", headers=ADMIN).status_code == 200
+
+    assert client.get("/tracking/pings/stats").status_code == 401
+    assert client.get("/tracking/pings/stats", headers=owner["headers"]).status_code == 403
+    assert client.get("/tracking/pings/stats", headers=ADMIN).json()["written"] >= 1
+
+
+def _unique_index() -> bool:
+    indexes = inspect(engine).get_indexes("orders")
+    return next(ix["unique"] for ix in indexes if ix["name"] == "ix_orders_tracking_id")
+
+
+@pytest.fixture
+def shared_codes():
+    """An older database whose tracking id index is not unique yet."""
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_orders_tracking_id"))
+        conn.execute(text("CREATE INDEX ix_orders_tracking_id ON orders (tracking_id)"))
+    yield
+    with engine.begin() as conn:
+        conn.execute(update(models.Order).values(tracking_id=None))
+    migrate_add_tracking_id_index()
+    assert _unique_index()
+
+
+def test_lookup_by_code(client, owner):
+    order_id = seed_shop(client, owner, n_orders=1)[0]
+    code = client.get(f"/orders/{order_id}", headers=owner["headers"]).json()["tracking_id"]
+    assert len(code) >= 16 and code != str(order_id)
+    assert client.get(f"/tracking/by-code/{order_id}").status_code == 404
+
+    found = client.get(f"/tracking/by-code/{code}").json()
+    assert (found["order_id"], found["position"]) == (order_id, None)
+    client.post(
+        "/tracking/pings",
+        json={"pings": [{"order_id": order_id, "lat": 26.9, "lng": 75.8, "ts": T0.isoformat()}]},
+        headers=owner["headers"],
+    )
+    # Cached lookup, live position
+    assert client.get(f"/tracking/by-code/{code}").json()["position"]["lat"] == 26.9
+
+    assert client.get("/tracking/lookups/stats").status_code == 401
+    assert client.get("/tracking/lookups/stats", headers=owner["headers"]).status_code == 403
+    assert client.get("/tracking/lookups/stats", headers=ADMIN).json()["hits"] == 1
+
+
+def test_shared_code_is_not_served(client, owner, shared_codes):
+    order_ids = seed_shop(client, owner, n_orders=2)
+    with engine.begin() as conn:
+        conn.execute(update(models.Order).values(tracking_id="AWB123"))
+    assert client.get("/tracking/by-code/AWB123").status_code == 409
+
+    migrate_add_tracking_id_index()
+    assert not _unique_index()
+
+    # Reassigning one of them frees the code and lets the index become unique
+    r = client.post(f"/tracking/{order_ids[0]}/assign", params={"tracking_id": "AWB124"}, headers=owner["headers"])
+    assert r.status_code == 200
+    assert client.get("/tracking/by-code/AWB123").json()["order_id"] == order_ids[1]
+    migrate_add_tracking_id_index()
+    assert _unique_index()